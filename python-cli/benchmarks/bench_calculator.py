@@ -0,0 +1,166 @@
+"""Time each stage of Calculator parsing and evaluation over a fixed corpus.
+
+Stages are measured separately so a slowdown can be traced to one of them:
+
+    normalize      clean_expression (lexing and symbol rewriting)
+    special_cases  _handle_special_cases (factorials and percentages)
+    compile        parsing and compiling into an Expression
+    eval           evaluating the compiled Expression
+    format_output  formatting the result
+    calculate      Calculator.calculate end to end with an empty cache
+    cached         Calculator.calculate end to end with a warm cache
+
+Each stage runs over the whole corpus `--repeat` times and the fastest run is
+reported. Results can be saved as JSON and two saved runs compared.
+
+Usage:
+    python benchmarks/bench_calculator.py [--repeat N] [--output run.json]
+    python benchmarks/bench_calculator.py --compare before.json after.json [--threshold 10]
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+from scicalc.calculator import Calculator
+from scicalc.evaluator import Expression
+
+CORPUS = [
+    # Plain arithmetic
+    "2+2",
+    "12.5*4-3/7",
+    "(1+2)*(3+4)/(5-6)",
+    # Unicode operators and constants
+    "7×8÷2−1",
+    "2π",
+    "3e",
+    "6.02EE23×2",
+    # Superscripts, inverse functions and subscripts
+    "2³+3²",
+    "x²",
+    "sin⁻¹(0.5)",
+    "log₂(8)+log₁₀(1000)",
+    # Roots
+    "√16×3",
+    "∛27",
+    "3ʸ√27+√(2+2)",
+    # Percentages and factorials
+    "200+10%",
+    "50-20%",
+    "5!+3!",
+    # Functions, degrees and implicit multiplication
+    "sin(30)+cos(60)",
+    "2sin(45°)×cos(45°)",
+    "abs(-3)+log(100)×ln(e)",
+    # Auto-closed and nested brackets
+    "(1+2",
+    "((2+3)×(4−1",
+    "sqrt(sqrt(sqrt(256",
+    "(((((1+1)+1)+1)+1)+1)",
+    # Long expressions
+    "+".join(str(n) for n in range(1, 101)),
+    "×".join(["(1+0.01)"] * 40),
+    "−".join(f"sin({n})" for n in range(30)),
+]
+
+STAGES = ('normalize', 'special_cases', 'compile', 'eval', 'format_output', 'calculate', 'cached')
+
+
+def _best(func, items, repeat):
+    """Return the fastest time in seconds for calling func on every item."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(repeat):
+    """Time every stage over the corpus and return {stage: seconds per expression}."""
+    calc = Calculator()
+    variables = {'x': 3}
+    cleaned = [calc.clean_expression(e) for e in CORPUS]
+    prepared = [calc._handle_special_cases(e) for e in cleaned]
+    compiled = [Expression(e, calc.FUNCTIONS, calc.CONSTANTS, calc._limits) for e in prepared]
+    results = [e.evaluate(variables) for e in compiled]
+
+    def calculate_cold(expression):
+        calc.cache_clear()
+        calc.calculate(expression, 3)
+
+    timings = {
+        'normalize': _best(calc.clean_expression, CORPUS, repeat),
+        'special_cases': _best(calc._handle_special_cases, cleaned, repeat),
+        'compile': _best(lambda e: Expression(e, calc.FUNCTIONS, calc.CONSTANTS, calc._limits),
+                         prepared, repeat),
+        'eval': _best(lambda e: e.evaluate(variables), compiled, repeat),
+        'format_output': _best(calc.format_output, results, repeat),
+        'calculate': _best(calculate_cold, CORPUS, repeat),
+        'cached': _best(lambda e: calc.calculate(e, 3), CORPUS, repeat),
+    }
+    return {stage: seconds / len(CORPUS) for stage, seconds in timings.items()}
+
+
+def report(timings):
+    print(f"{'stage':>14}  {'us/op':>10}  {'ops/sec':>12}")
+    for stage in STAGES:
+        seconds = timings[stage]
+        print(f"{stage:>14}  {seconds * 1e6:10.2f}  {1 / seconds:12.0f}")
+
+
+def compare(before, after, threshold):
+    """
+    Print the change in every stage between two saved runs.
+
+    Returns:
+        The number of stages that got slower by more than `threshold` percent
+    """
+    regressions = 0
+    print(f"{'stage':>14}  {'before us':>10}  {'after us':>10}  {'change':>8}")
+    for stage in STAGES:
+        old, new = before['timings'][stage], after['timings'][stage]
+        change = (new - old) / old * 100
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{stage:>14}  {old * 1e6:10.2f}  {new * 1e6:10.2f}  {change:+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per stage; the fastest is kept')
+    parser.add_argument('--output', help='Save the timings to this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='Compare two saved runs instead of measuring')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percent slowdown reported as a regression (default: 10)')
+    args = parser.parse_args()
+
+    if args.compare:
+        runs = []
+        for path in args.compare:
+            with open(path) as f:
+                runs.append(json.load(f))
+        if compare(*runs, args.threshold):
+            sys.exit(1)
+        return
+
+    timings = run(args.repeat)
+    report(timings)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'corpus_size': len(CORPUS),
+                'repeat': args.repeat,
+                'timings': timings,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
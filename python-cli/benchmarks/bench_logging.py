@@ -0,0 +1,87 @@
+"""Compare /calculate throughput under the baseline and current logging setups.
+
+Each run posts the same requests to the current web app and changes only how
+logging is configured:
+
+    baseline    the configuration web.py used before logsetup: basicConfig
+                at DEBUG with the file and console handlers called
+                synchronously, and the flask and werkzeug loggers at DEBUG
+    sync-info   the current handlers at INFO, written inline
+    current     the current default: INFO, handed to a background
+                QueueListener
+
+The log calls themselves are the current ones in every run, so the gap
+between baseline and current is the configuration change alone; sync-info
+shows how much of it comes from the level and how much from the queue.
+
+Usage:
+    python benchmarks/bench_logging.py [--requests N]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from scicalc import web
+from scicalc.logsetup import LOG_FORMAT, configure_logging, stop_logging
+
+EXPRESSIONS = ["2+2", "sin(30)+cos(60)", "√16×3", "200+10%", "log₂(8)", "5!", "2π", "(1+2)*(3+4"]
+DEBUG_LOGGERS = ('flask', 'werkzeug')
+
+
+def baseline_logging(log_file, stream):
+    """Configure logging as web.setup_logging did before logsetup existed."""
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format=LOG_FORMAT,
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler(stream)
+        ],
+        force=True
+    )
+    for name in DEBUG_LOGGERS:
+        logging.getLogger(name).setLevel(logging.DEBUG)
+
+
+def reset_logging():
+    stop_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    for name in DEBUG_LOGGERS:
+        logging.getLogger(name).setLevel(logging.NOTSET)
+
+
+def run(label, requests, log_dir):
+    log_file = os.path.join(log_dir, f'{label}.log')
+    with open(os.devnull, 'w') as devnull:
+        if label == 'baseline':
+            baseline_logging(log_file, devnull)
+        else:
+            configure_logging([logging.FileHandler(log_file), logging.StreamHandler(devnull)],
+                              level=logging.INFO, use_queue=label == 'current')
+        client = web.app.test_client()
+        start = time.perf_counter()
+        for i in range(requests):
+            # Vary the input so the calculator cache doesn't hide the normalizer's logging
+            expression = f"{EXPRESSIONS[i % len(EXPRESSIONS)]}+{i}"
+            client.post('/calculate', json={'expression': expression})
+        elapsed = time.perf_counter() - start
+        reset_logging()
+    print(f"{label:>9}: {requests / elapsed:8.0f} req/s  ({elapsed * 1e6 / requests:6.1f} us/request)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as log_dir:
+        for label in ('baseline', 'sync-info', 'current'):
+            run(label, args.requests, log_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Measure how long a one-shot `scicalc EXPRESSION` run takes to start.
+
+The AAC grid starts a new scicalc process for every button press, so
+interpreter start-up and imports dominate its latency. Each command below is
+run `--runs` times in a fresh interpreter and the median wall time reported,
+along with the cost over a bare interpreter and the slowest imports.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N] [--max-ms MS]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = [
+    ('bare interpreter', [sys.executable, '-c', 'pass']),
+    ('import scicalc.cli', [sys.executable, '-c', 'import scicalc.cli']),
+    ('scicalc "2+2"', [sys.executable, '-m', 'scicalc.cli', '--log-level', 'WARNING', '2+2']),
+]
+
+
+def median_ms(command, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def slowest_imports(count=10):
+    """Return the `count` slowest imports of scicalc.cli as (cumulative us, module)."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import scicalc.cli'],
+                            check=True, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        imports.append((int(cumulative), module.rstrip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--max-ms', type=float,
+                        help='Exit 1 if a one-shot run takes longer than this over a bare interpreter')
+    args = parser.parse_args()
+
+    results = {label: median_ms(command, args.runs) for label, command in COMMANDS}
+    bare = results['bare interpreter']
+    for label, ms in results.items():
+        print(f"{label:>20}: {ms:7.1f} ms  (+{ms - bare:6.1f} ms)")
+
+    print("\nSlowest imports (cumulative):")
+    for cumulative, module in slowest_imports():
+        print(f"{cumulative / 1000:8.1f} ms  {module}")
+
+    overhead = results['scicalc "2+2"'] - bare
+    if args.max_ms is not None and overhead > args.max_ms:
+        print(f"\nOne-shot run takes {overhead:.1f} ms over the interpreter (limit {args.max_ms} ms)")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,122 @@
+import logging
 import math
 import re
-import numpy as np
-import pyperclip
+import threading
 import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+import sys
+from scicalc.evaluator import DEADLINE, Call, Expression, Function, LimitExceeded, Limits, compile_tree, parse
+from scicalc.formatting import compile_format
+from scicalc.lexer import NAME, SYMBOLS, Token, normalize, render, tokenize
+from scicalc.metrics import Metrics, error_category
+from scicalc.numeric import make_backend
+
+# numpy, pyperclip and asyncio are imported where they're used: a single
+# calculation from the command line needs none of them, and importing them
+# costs more than the calculation itself
+
+logger = logging.getLogger(__name__)
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+# Left-hand side of a definition: a name, or a name and its parameters
+_DEFINITION_RE = re.compile(r'\s*([A-Za-z_]+)\s*(?:\(([^()=]*)\))?\s*=([^=]*)\Z')
+
+
+def split_definition(expression):
+    """
+    Split a definition such as 'a = 3' or 'f(t) = t^2 + 1'.
+
+    Only the form is checked; Calculator also refuses names that are taken.
+
+    Returns:
+        (name, params, body), where params is a tuple of names, or None for a
+        variable; or None if the expression is not a definition
+    """
+    match = _DEFINITION_RE.match(expression)
+    if match is None:
+        return None
+    name, params, body = match.groups()
+    if params is not None:
+        params = tuple(param.strip() for param in params.split(',')) if params.strip() else ()
+    return name, params, body.strip()
+
+
+def _cbrt(x):
+    """Real cube root, exact for perfect cubes."""
+    if x == 0 or not math.isfinite(x):
+        return float(x)
+    root = math.copysign(abs(x) ** (1 / 3), x)
+    # One Newton step removes the error left by pow, e.g. 27 ** (1/3) == 3.0000000000000004
+    return root - (root ** 3 - x) / (3 * root ** 2)
+
+
+def _rand():
+    import random
+    return random.random()
+
+
+def _called(node, names=None):
+    """Return the set of function names a syntax tree calls."""
+    if names is None:
+        names = set()
+    if type(node) is Call:
+        names.add(node.name)
+    for child in node[1:]:
+        if isinstance(child, tuple):
+            _called(child, names)
+    return names
 
 class Calculator:
-    def __init__(self, decimal_places=None):
+    def __init__(self, decimal_places=None, cache_size=256, limits=None, metrics=None, numeric='float',
+                 precision=28, history=None, number_format='auto'):
+        """
+        Args:
+            decimal_places: Round float results to this many places
+            cache_size: Number of compiled expressions to keep
+            limits: Resource limits for expressions (see scicalc.evaluator.Limits);
+                defaults to Limits()
+            metrics: Optional scicalc.metrics.Metrics that records stage
+                timings and errors
+            numeric: Number type to calculate in: 'float', 'decimal' or
+                'fraction' (see scicalc.numeric)
+            precision: Significant digits when numeric is 'decimal'
+            history: Optional scicalc.history.History that successful
+                evaluate() calls are recorded in
+            number_format: How format_output writes results: a spec such as
+                'fixed:2,grouping' or a NumberFormat (see scicalc.formatting)
+        
+        Raises:
+            ValueError: If numeric is not a known number type, or
+                number_format is not a valid spec
+        """
         self._memory = 0
         self._last_result = 0
         self._last_expression = None
         self._last_pasteboard = None
         self._decimal_places = decimal_places
+        # LRU cache of input expression -> compiled Expression
+        self._cache_size = cache_size
+        self._compiled = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._limits = limits if limits is not None else Limits()
+        self._metrics = metrics
+        # Fixed for the calculator's lifetime, as compiled expressions depend on it
+        self._backend = make_backend(numeric, self.FUNCTIONS, self.CONSTANTS, precision)
+        self._history = history
+        # Variables defined with `name = value`; user functions (scicalc.evaluator.Function)
+        # live in the backend's function table
+        self._variables = {}
+        if isinstance(number_format, str):
+            number_format = compile_format(number_format)
+        self._number_format = number_format
+        # Incremental evaluation state, created on first use by live()
+        self._live = None
+        # Guards the last result/expression, memory and the cache when
+        # one Calculator is shared between threads
+        self._lock = threading.RLock()
 
     # Dictionary of function name mappings (case-insensitive)
     FUNCTION_ALIASES = {
@@ -27,45 +133,68 @@ class Calculator:
         'pi': 'pi', 'PI': 'pi', 'Pi': 'pi', 'π': 'pi',
     }
 
-    # Dictionary of mathematical symbols and their Python equivalents
-    MATH_SYMBOLS = {
-        # Basic operators
-        '×': '*', '∗': '*', '∙': '*',  # Multiplication variants
-        '÷': '/', '∕': '/',  # Division variants
-        '−': '-', '₋': '-', '⁻': '-',  # Minus variants
-        '⁺': '+', '₊': '+',  # Plus variants
-        '⁼': '=', '₌': '=',  # Equals variants
-        '^': '**', '⁽': '(', '⁾': ')',  # Power and parentheses
-        '⁄': '/',  # Fraction slash
-        
-        # Variables
-        'x': 'x',  # Variable x
-        
-        # Roots
-        '√': 'sqrt',  # Square root
-        '∛': 'cbrt',  # Cube root
-        '∜': 'root4',  # Fourth root
-        'ʸ√': 'nthroot',  # nth root
-        
-        # Powers
-        'ʸ': '**',  # General power
-        'ˣ': '**',  # Power of x
-        
-        # Greek letters commonly used in math
-        'π': 'pi',    # Pi
-        'ϕ': 'phi',   # Phi
-        'θ': 'theta', # Theta
-        'ϑ': 'theta', # Theta variant
-        'ϵ': 'epsilon', # Epsilon
-        'ϱ': 'rho',   # Rho
-        
-        # Other mathematical symbols
-        '∞': 'inf',   # Infinity
-        '°': 'deg',   # Degree
-        '′': 'prime', # Prime
-        '″': 'prime2', # Double prime
-        '‴': 'prime3', # Triple prime
-        '±': 'pm',    # Plus-minus
+    # Mathematical symbols and their Python equivalents, as the lexer reads them
+    MATH_SYMBOLS = SYMBOLS
+    
+    # Functions available to expressions (trig functions work in degrees)
+    FUNCTIONS = {
+        # Basic trig functions (wrapping to handle degrees)
+        'sin': lambda x: math.sin(math.radians(x)),
+        'cos': lambda x: math.cos(math.radians(x)),
+        'tan': lambda x: math.tan(math.radians(x)),
+        
+        # Inverse trig functions (converting result to degrees)
+        'asin': lambda x: math.degrees(math.asin(x)),
+        'acos': lambda x: math.degrees(math.acos(x)),
+        'atan': lambda x: math.degrees(math.atan(x)),
+        
+        # Hyperbolic functions
+        'sinh': math.sinh,
+        'cosh': math.cosh,
+        'tanh': math.tanh,
+        'asinh': math.asinh,
+        'acosh': math.acosh,
+        'atanh': math.atanh,
+        
+        # Powers and roots
+        'sqrt': math.sqrt,
+        'cbrt': _cbrt,
+        'root4': lambda x: x ** (1/4),
+        'root': lambda x, n: x ** (1/n),  # General root function
+        'nthroot': lambda x, n: x ** (1/n),  # nth root
+        'pow': pow,
+        'exp': math.exp,
+        'reciprocal': lambda x: 1/x,  # 1/x function
+        
+        # Logarithms
+        'log': math.log10,
+        'ln': math.log,
+        'log2': math.log2,
+        'logbase': lambda x, base: math.log(x, base),  # Log with arbitrary base
+        
+        # Additional functions
+        'abs': abs,
+        'factorial': math.factorial,
+        'rand': _rand,
+        'pm': lambda x: [x, -x],  # Plus-minus returns both values
+        'prime': lambda x: x,      # For now, just return the number
+        'prime2': lambda x: x**2,  # Square
+        'prime3': lambda x: x**3,  # Cube
+        
+        # Common operations
+        'rad': math.radians,
+        'deg': math.degrees,
+    }
+
+    # Named constants available to expressions
+    CONSTANTS = {
+        'pi': math.pi,
+        'e': math.e,
+        'inf': float('inf'),
+        'phi': (1 + math.sqrt(5)) / 2,  # Golden ratio
+        'theta': math.pi,  # Common use of theta is pi
+        'epsilon': sys.float_info.epsilon,  # Machine epsilon
+        'rho': math.pi,  # Sometimes used as alternative to pi
     }
 
     def clean_expression(self, expression):
@@ -73,241 +202,350 @@ class Calculator:
         if not expression:
             return expression
         
-        # Debug print for bracket handling
-        print(f"Input: {expression}")
-        
-        # First handle root functions before other replacements
-        cleaned = expression
-        cleaned = re.sub(r'∜\s*(\d+|\([^)]+\))', r'root4(\1)', cleaned)  # Fourth root
-        cleaned = re.sub(r'∛\s*(\d+|\([^)]+\))', r'cbrt(\1)', cleaned)  # Cube root
-        cleaned = re.sub(r'√\s*(\d+|\([^)]+\))', r'sqrt(\1)', cleaned)  # Square root
-        
-        # Handle superscript numbers first
-        superscript_map = str.maketrans('⁰¹²³⁴⁵⁶⁷⁸⁹', '0123456789')
-        def replace_superscript(match):
-            return f"**{match.group(0).translate(superscript_map)}"
-        cleaned = re.sub(r'([⁰¹²³⁴⁵⁶⁷⁸⁹]+)', replace_superscript, cleaned)
-        
-        # Handle subscript numbers in logarithms
-        subscript_map = str.maketrans('₀₁₂₃₄₅₆₇₈₉', '0123456789')
-        def replace_subscript(match):
-            base = match.group(1).translate(subscript_map)
-            return f"logbase({match.group(2)}, {base})"
-        cleaned = re.sub(r'log([₀₁₂₃₄₅₆₇₈₉]+)\((.+?)\)', replace_subscript, cleaned)
-        
-        # Handle scientific notation before other replacements
-        def handle_scientific(match):
-            num, exp = match.groups()
-            return f"{num}*10**{exp}"
-        cleaned = re.sub(r'(\d+)e(\d+)', handle_scientific, cleaned)
-        
-        # First balance any unclosed parentheses
-        open_count = cleaned.count('(')
-        close_count = cleaned.count(')')
-        if open_count > close_count:
-            # Simply add missing closing parentheses at the end
-            cleaned += ')' * (open_count - close_count)
-            print(f"After bracket completion: {cleaned}")
+        logger.debug("Input: %s", expression)
         
         # Handle special cases first before any other processing
-        if cleaned.strip() == '1/x':
+        if expression.strip() == '1/x':
             return 'reciprocal(x)'  # Use reciprocal function
         
-        # Handle plus-minus
-        if cleaned.startswith('±'):
-            return f'pm({cleaned[1:]})'
-        
-        # Replace mathematical symbols with their Python equivalents
-        for symbol, replacement in self.MATH_SYMBOLS.items():
-            cleaned = cleaned.replace(symbol, replacement)
+        return render(self._normalize_tokens(expression))
+
+    def _normalize_tokens(self, expression, group_multiplication=False):
+        """Tokenize an expression and apply the calculator's rewrite rules."""
+        tokens = tokenize(expression, self.FUNCTION_ALIASES)
+        return normalize(tokens, group_multiplication=group_multiplication)
+
+    def evaluate(self, expression: str) -> float:
+        """
+        Evaluate an expression and store its result as x, the last result.
         
-        # Replace function names with their canonical forms first
-        for alias, canonical in self.FUNCTION_ALIASES.items():
-            # Use word boundaries to avoid partial replacements
-            cleaned = re.sub(rf'\b{alias}\b', canonical, cleaned)
+        Defining a function (see calculate) leaves x unchanged.
         
-        # Handle implicit multiplication with constants
-        cleaned = re.sub(r'(\d+)([πe])', r'\1*\2', cleaned)  # Numbers with constants
-        # Handle all forms of implicit multiplication
-        cleaned = re.sub(r'(\d+)([a-zA-Z])', r'\1*\2', cleaned)  # Number followed by variable (2x)
-        cleaned = re.sub(r'([a-zA-Z])(\d+)', r'\1*\2', cleaned)  # Variable followed by number (x2)
-        cleaned = re.sub(r'(\d+)\(', r'\1*(', cleaned)  # Number followed by parenthesis
-        cleaned = re.sub(r'(\d+)([√∛∜])', r'\1*\2', cleaned)  # Number followed by root
+        As in calculate, the lock isn't held while the expression is
+        evaluated, so threads sharing a calculator (the daemon, the web
+        server) don't wait for each other's slow calculations. When two
+        evaluations overlap, both see the same x and the one finishing last
+        sets it.
+        """
+        with self._lock:
+            # Store the original expression
+            self._last_expression = expression
+            
+            # Initialize x variable with last result
+            if not hasattr(self, '_last_result'):
+                self._last_result = 0
+            last_result = self._last_result
+        
+        result = self.calculate(expression, last_result)
+        with self._lock:
+            if not isinstance(result, Function):
+                self._last_result = result
+            if self._history is not None:
+                self._record(expression, result)
+        return result
+
+    def _record(self, expression, result):
+        """Add a successful calculation to the history."""
+        # calculate() just compiled the expression, so it is in the cache
+        # unless caching is turned off
+        compiled = self._compiled.get(expression.split('=')[-1].strip())
+        normalized = compiled.source if compiled is not None else expression
+        self._history.add(expression, normalized, result)
+
+    def calculate(self, expression: str, last_result=None, define=True) -> float:
+        """
+        Evaluate an expression without storing it as the last result.
         
-        # Remove extra whitespace
-        cleaned = ' '.join(cleaned.split())
+        The lock is only held while looking up the compiled expression, so a
+        slow calculation doesn't block other threads.
         
-        # Handle special functions
-        cleaned = re.sub(r'(\w+)⁻¹\(', r'a\1(', cleaned)  # sin⁻¹(x) becomes asin(x)
+        `name = expression` stores the value as a variable and returns it,
+        and `name(a, b) = expression` defines a function and returns it as a
+        scicalc.evaluator.Function. The body of a function is compiled once,
+        when it is defined, and expressions calling it always use its latest
+        definition. Any other expression containing = is evaluated from the
+        last =, so '2 × 3 = 6' gives 6.
         
-        # Handle degrees with proper multiplication
-        cleaned = re.sub(r'(\d+)°', r'rad(\1)', cleaned)  # Use rad function
+        Args:
+            expression: Expression to evaluate
+            last_result: Value for x (defaults to the current last result)
+            define: If False, definitions are checked and their value or
+                Function returned, but not stored
+        
+        Raises:
+            ValueError: If the expression is invalid or exceeds one of the
+                calculator's limits (LimitExceeded)
+        """
+        if last_result is None:
+            last_result = self._last_result
+        metrics = self._metrics
         
-        # Handle prime notation
-        cleaned = re.sub(r'(\d+)′', r'prime(\1)', cleaned)  # Single prime
-        cleaned = re.sub(r'(\d+)″', r'prime2(\1)', cleaned)  # Double prime
-        cleaned = re.sub(r'(\d+)‴', r'prime3(\1)', cleaned)  # Triple prime
+        try:
+            self._limits.check_length(expression)
+            
+            definition = self._definition(expression) if '=' in expression else None
+            if definition is not None:
+                name, params, expression = definition
+                if params is not None:
+                    return self._define_function(name, params, expression, define)
+            elif '=' in expression:
+                # Otherwise take the part after the last equals
+                expression = expression.split('=')[-1].strip()
+            
+            # Parse and compile the expression (cached)
+            with self._lock:
+                compiled = self._compile(expression)
+                variables = {**self._variables, 'x': last_result}
+            
+            # Evaluate with x bound to the last result
+            if metrics is None:
+                result = compiled.evaluate(variables)
+            else:
+                start = metrics.clock()
+                result = compiled.evaluate(variables)
+                metrics.record('eval', metrics.clock() - start)
+            if self._decimal_places is not None and isinstance(result, self._backend.rounded_types):
+                result = round(result, self._decimal_places)
+            if definition is not None and define:
+                self._set_variable(name, result)
+            return result
+        except Exception as e:
+            if metrics is not None:
+                metrics.record_error(error_category(e))
+            if isinstance(e, LimitExceeded):
+                raise
+            raise ValueError(f"Invalid expression: {self._backend.describe_error(e)}")
+
+    def _definition(self, expression):
+        """Return split_definition(expression) if it defines a name that isn't taken."""
+        definition = split_definition(expression)
+        if definition is None:
+            return None
+        name, params, body = definition
+        if not self._definable(name):
+            # e.g. x = 5, or sin = 0.5 as written by an older grid: just evaluate
+            return None
+        if params is not None:
+            for param in params:
+                if not self._definable(param):
+                    raise ValueError(f"Invalid parameter name: {param!r}")
+            if len(set(params)) != len(params):
+                raise ValueError(f"Repeated parameter in {name}()")
+        return definition
+
+    def _definable(self, name):
+        """Check that a name can be given to a variable, function or parameter."""
+        return (name != 'x' and name not in self.CONSTANTS and name not in self.FUNCTIONS
+                # Reject names the lexer would rewrite, e.g. Sin or PI
+                and tokenize(name, self.FUNCTION_ALIASES) == [Token(NAME, name)])
+
+    def _define_function(self, name, params, body, install=True):
+        """Compile the body of a user function and, with `install`, add it to the function table."""
+        with self._lock:
+            compiled = self._compile(body)
+            self._check_recursion(name, _called(compiled.tree))
+            function = Function(name, params, compiled.source, compiled._program)
+            if not install:
+                return function
+            self._variables.pop(name, None)
+            # Moved to the end, so the table lists functions in the order they were defined
+            self._backend.functions.pop(name, None)
+            self._backend.functions[name] = function
+        return function
+
+    def _check_recursion(self, name, called):
+        """
+        Check that a function body calling the functions `called` can't end up calling `name`.
+
+        Raises:
+            ValueError: If it calls `name` directly or through other user functions
+        """
+        if name in called:
+            raise ValueError(f"{name}() can't call itself")
+        functions = self._backend.functions
+        for callee in called:
+            pending, seen = [callee], set()
+            while pending:
+                function = functions.get(pending.pop())
+                if not isinstance(function, Function) or function.name in seen:
+                    continue
+                seen.add(function.name)
+                calls = _called(parse(function.source))
+                if name in calls:
+                    raise ValueError(f"{name}() can't call itself through {callee}()")
+                pending.extend(calls)
+
+    def _set_variable(self, name, value):
+        with self._lock:
+            if isinstance(self._backend.functions.get(name), Function):
+                del self._backend.functions[name]
+            self._variables[name] = value
+
+    def definitions(self):
+        """
+        Return the variables and functions defined so far.
         
-        return cleaned
+        Returns:
+            A dict of name to value, or to a scicalc.evaluator.Function
+        """
+        with self._lock:
+            functions = {name: func for name, func in self._backend.functions.items()
+                         if isinstance(func, Function)}
+            return {**self._variables, **functions}
 
-    def evaluate(self, expression: str) -> float:
-        # Store the original expression
-        self._last_expression = expression
+    def clear_definitions(self):
+        """Forget every variable and function defined."""
+        with self._lock:
+            self._variables.clear()
+            for name in [name for name, func in self._backend.functions.items() if isinstance(func, Function)]:
+                del self._backend.functions[name]
+
+    def evaluate_many(self, expression: str, x) -> 'np.ndarray':
+        """
+        Evaluate one expression for every value in an array of x values.
         
-        # Initialize x variable with last result
-        if not hasattr(self, '_last_result'):
-            self._last_result = 0
+        The expression is parsed once and evaluated with NumPy ufuncs, so
+        points outside a function's domain give nan or inf instead of raising.
+        Memory and the last result are not changed.
         
-        # If expression contains equals sign, take the part after the last equals
+        Args:
+            expression: Expression using x as the variable
+            x: Array (or sequence) of values for x
+        
+        Returns:
+            An array of results with the same shape as x
+        
+        Raises:
+            ValueError: If the expression is invalid or exceeds one of the
+                calculator's limits (LimitExceeded)
+        """
+        import numpy as np
+        from scicalc.vectorized import vector_functions
+        
+        x = np.asarray(x, dtype=float)
+        self._limits.check_length(expression)
         if '=' in expression:
             expression = expression.split('=')[-1].strip()
         
-        # Clean and prepare the expression
-        expression = self.clean_expression(expression)
-        
         try:
-            # Create a safe dictionary of allowed functions
-            safe_dict = {
-                # Basic trig functions (wrapping to handle degrees)
-                'sin': lambda x: math.sin(math.radians(x)),
-                'cos': lambda x: math.cos(math.radians(x)),
-                'tan': lambda x: math.tan(math.radians(x)),
-                
-                # Inverse trig functions (converting result to degrees)
-                'asin': lambda x: math.degrees(math.asin(x)),
-                'acos': lambda x: math.degrees(math.acos(x)),
-                'atan': lambda x: math.degrees(math.atan(x)),
-                
-                # Hyperbolic functions
-                'sinh': math.sinh,
-                'cosh': math.cosh,
-                'tanh': math.tanh,
-                'asinh': math.asinh,
-                'acosh': math.acosh,
-                'atanh': math.atanh,
-                
-                # Powers and roots
-                'sqrt': math.sqrt,
-                'cbrt': lambda x: np.cbrt(x),
-                'root4': lambda x: x ** (1/4),
-                'root': lambda x, n: x ** (1/n),  # General root function
-                'nthroot': lambda x, n: x ** (1/n),  # nth root
-                'pow': pow,
-                'exp': math.exp,
-                'reciprocal': lambda x: 1/x,  # 1/x function
-                
-                # Logarithms
-                'log': math.log10,
-                'ln': math.log,
-                'log2': math.log2,
-                'logbase': lambda x, base: math.log(x, base),  # Log with arbitrary base
-                
-                # Unicode operators need explicit functions
-                '×': lambda x, y: x * y,
-                '∗': lambda x, y: x * y,
-                '∙': lambda x, y: x * y,
-                '÷': lambda x, y: x / y,
-                '∕': lambda x, y: x / y,
-                '−': lambda x, y: x - y,
-                '⁻': lambda x, y: x - y,
-                '⁺': lambda x, y: x + y,
-                
-                # Constants
-                'pi': math.pi,
-                'e': math.e,
-                'inf': float('inf'),
-                'phi': (1 + math.sqrt(5)) / 2,  # Golden ratio
-                'theta': math.pi,  # Common use of theta is pi
-                'epsilon': np.finfo(float).eps,  # Machine epsilon
-                'rho': math.pi,  # Sometimes used as alternative to pi
-                
-                # Additional functions
-                'abs': abs,
-                'factorial': math.factorial,
-                'rand': np.random.random,
-                'pm': lambda x: [x, -x],  # Plus-minus returns both values
-                'prime': lambda x: x,      # For now, just return the number
-                'prime2': lambda x: x**2,  # Square
-                'prime3': lambda x: x**3,  # Cube
-                
-                # Common operations
-                'rad': math.radians,
-                'deg': math.degrees,
-                
-                # Add x variable for calculations
-                'x': self._last_result,  # x is always initialized now
-            }
-            
-            # Handle special cases
-            expression = self._handle_special_cases(expression)
-            
-            # Debug the expression before evaluation
-            # print(f"Evaluating: {expression}")
-            
-            # Evaluate the expression
-            result = eval(expression, {"__builtins__": {}}, safe_dict)
-            self._last_result = result
-            return result
+            with self._lock:
+                compiled = self._compile(expression)
+                variables = {**self._variables, 'x': x}
+                functions = vector_functions(x.shape)
+                defined = [func for func in self._backend.functions.values() if isinstance(func, Function)]
+            if defined:
+                # Compile the user functions' bodies with the NumPy functions too.
+                # Calls are looked up when they run, so any order works.
+                functions.update((func.name, func) for func in defined)
+                for func in defined:
+                    try:
+                        body = compile_tree(parse(func.source), functions, self.CONSTANTS, self._limits)
+                    except (NameError, TypeError):
+                        # It calls a function that has since become a variable
+                        del functions[func.name]
+                        continue
+                    functions[func.name] = Function(func.name, func.params, func.source, body)
+            # Arrays are always float, so other backends' literals are parsed again
+            tree = compiled.tree if self._backend.name == 'float' else parse(compiled.source)
+            program = compile_tree(tree, functions, self.CONSTANTS, self._limits)
+            if self._limits.timeout is not None:
+                variables[DEADLINE] = time.monotonic() + self._limits.timeout
+            with np.errstate(all='ignore'):
+                result = program(variables)
+            result = np.asarray(result, dtype=float)
+        except LimitExceeded:
+            raise
         except Exception as e:
             raise ValueError(f"Invalid expression: {str(e)}")
+        
+        # Expressions that don't use x still give one result per value
+        if result.shape != x.shape and result.ndim == 0:
+            result = np.full(x.shape, result)
+        if self._decimal_places is not None:
+            result = np.round(result, self._decimal_places)
+        return result
 
-    def _prepare_expression(self, expression: str) -> str:
-        # First clean the expression
-        expression = self.clean_expression(expression)
-        
-        # First handle function calls to prevent interference
-        def handle_function_call(match):
-            func = match.group(1)
-            args = match.group(2)
-            # Special handling for log₂
-            if func == 'log₂':
-                return f'log2({args})'
-            return f'{func}({args})'
-        
-        # Handle function calls with proper parentheses
-        expression = re.sub(r'(\w+₂?)\s*\(([^)]*)\)?', r'\1(\2)', expression)
-        
-        # Replace various multiplication symbols
-        expression = expression.replace('x', '*')
-        expression = expression.replace('×', '*')
-        
-        # Handle special functions and roots
-        expression = re.sub(r'∛(\d+)', r'cbrt(\1)', expression)
-        expression = re.sub(r'√(\d+)', r'sqrt(\1)', expression)
-        
-        # Handle superscript numbers
-        expression = re.sub(r'(\d+)²', r'\1**2', expression)
-        expression = re.sub(r'(\d+)³', r'\1**3', expression)
-        
-        # Add missing closing brackets, but preserve the original count for each opening
-        stack = []
-        result = []
-        for char in expression:
-            if char == '(':
-                stack.append(len(result))
-            elif char == ')':
-                if stack:
-                    stack.pop()
-            result.append(char)
-        
-        # Add missing closing brackets in reverse order
-        while stack:
-            pos = stack.pop()
-            result.append(')')
-        
-        expression = ''.join(result)
-        
-        # Add implicit multiplication
-        # Between number and parenthesis
-        expression = re.sub(r'(\d+)(?=\()', r'\1*', expression)
-        # Between closing and opening parentheses
-        expression = re.sub(r'\)\(', ')*(', expression)
-        # Between number and constant
-        expression = re.sub(r'(\d+)([πe])', r'\1*\2', expression)
-        # Between parentheses groups
-        expression = re.sub(r'\)\s*(\d+)', r')*\1', expression)
+    def format_many(self, results) -> 'np.ndarray':
+        """
+        Format an array of results, such as one from evaluate_many, in the
+        calculator's number format.
         
-        return expression
+        Returns:
+            An array of str with the same shape
+        """
+        return self._number_format.format_array(results)
+
+    def _compile(self, expression: str) -> Expression:
+        """Return the compiled form of an expression, using the LRU cache."""
+        compiled = self._compiled.get(expression)
+        if compiled is not None:
+            self._cache_hits += 1
+            self._compiled.move_to_end(expression)
+            return compiled
+        
+        self._cache_misses += 1
+        metrics = self._metrics
+        if metrics is None:
+            cleaned = self.clean_expression(expression)
+            cleaned = self._handle_special_cases(cleaned)
+            compiled = self._backend.compile(cleaned, self._limits)
+        else:
+            with metrics.stage('normalize'):
+                cleaned = self.clean_expression(expression)
+            with metrics.stage('special_cases'):
+                cleaned = self._handle_special_cases(cleaned)
+            with metrics.stage('compile'):
+                compiled = self._backend.compile(cleaned, self._limits)
+        
+        if self._cache_size:
+            self._compiled[expression] = compiled
+            if len(self._compiled) > self._cache_size:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    @contextmanager
+    def instrument(self, metrics=None):
+        """
+        Record stage timings and errors for the calculations in a with block.
+        
+        Args:
+            metrics: Metrics to record into (defaults to a new one)
+        
+        Yields:
+            The Metrics being recorded into
+        """
+        metrics = metrics if metrics is not None else Metrics()
+        previous = self._metrics
+        self._metrics = metrics
+        try:
+            yield metrics
+        finally:
+            self._metrics = previous
+
+    def cache_info(self) -> CacheInfo:
+        """Report compiled expression cache statistics."""
+        return CacheInfo(self._cache_hits, self._cache_misses,
+                         self._cache_size, len(self._compiled))
+
+    def live(self):
+        """Return this calculator's LiveSession for as-you-type results (see scicalc.live)."""
+        with self._lock:
+            if self._live is None:
+                from scicalc.live import LiveSession
+                self._live = LiveSession(self)
+            return self._live
+
+    def cache_clear(self):
+        """Empty the compiled expression cache and reset its statistics."""
+        self._compiled.clear()
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    def _prepare_expression(self, expression: str) -> str:
+        """Normalize an expression, also multiplying adjacent bracket groups."""
+        if not expression:
+            return expression
+        return render(self._normalize_tokens(expression, group_multiplication=True))
 
     def _handle_special_cases(self, expression: str) -> str:
         # Handle factorial
@@ -340,81 +578,87 @@ class Calculator:
         
         return expression
 
-    def format_output(self, result: float, return_format: str = "answer") -> str:
-        """Format the output based on the requested format."""
+    def format_output(self, result: float, return_format: str = "answer", expression=None,
+                      number_format=None) -> str:
+        """
+        Format the output based on the requested format.
+        
+        Args:
+            result: Value to format
+            return_format: 'answer', 'answer,calc' or 'full'
+            expression: Expression shown with the result (defaults to the
+                last one evaluated); pass it when other threads may be
+                evaluating on this calculator
+            number_format: NumberFormat to use instead of the calculator's
+        """
+        if self._metrics is not None:
+            with self._metrics.stage('format_output'):
+                return self._format_output(result, return_format, expression, number_format)
+        return self._format_output(result, return_format, expression, number_format)
+
+    def _format_output(self, result, return_format, expression=None, number_format=None):
+        if isinstance(result, Function):
+            # A definition is shown as it was understood
+            return str(result)
         # Format the number with specified decimal places if set
         if self._decimal_places is not None:
-            if isinstance(result, float):
+            if isinstance(result, self._backend.rounded_types):
                 result = round(result, self._decimal_places)
+        result = (number_format or self._number_format)(result)
+        if expression is None:
+            expression = self._last_expression
         
         if return_format == "answer":
             return f"{result}"
         elif return_format == "answer,calc":
-            if self._last_expression:
-                return f"{result}\n{self._last_expression} = {result}"
+            if expression:
+                return f"{result}\n{expression} = {result}"
             return f"{result}"
         else:  # full
-            if self._last_expression:
-                return f"{self._last_expression} = {result}"
+            if expression:
+                return f"{expression} = {result}"
             return f"{result}"
 
-    def watch_pasteboard(self, callback=None):
+    def watch_pasteboard(self, callback=None, clipboard=None, stop_event=None, timeout=5.0):
         """
         Watch the pasteboard for changes and evaluate the last line of any new content.
         
+        Calculations run off the watcher loop (see PasteboardPipeline), so a
+        slow expression doesn't stop new clipboard content being noticed.
+        
         Args:
-            callback: Optional function to call with results
+            callback: Optional function (or coroutine function) to call with results
+            clipboard: Clipboard backend (defaults to the best one for this platform)
+            stop_event: Optional threading.Event that stops watching when set
+            timeout: Seconds before a calculation is abandoned
         """
-        print("Watching pasteboard for calculations... Press Ctrl+C to stop.")
+        import asyncio
+        from scicalc.pasteboard import PasteboardPipeline
+        
+        pipeline = PasteboardPipeline(self, clipboard, on_result=callback, timeout=timeout)
+        logger.info("Watching pasteboard for calculations... Press Ctrl+C to stop.")
         try:
-            while True:
-                current_content = pyperclip.paste()
-                
-                # Check if pasteboard has changed
-                if current_content != self._last_pasteboard:
-                    lines = current_content.strip().split('\n')
-                    last_line = lines[-1].strip()
-                    
-                    try:
-                        # Try to evaluate the last line
-                        result = self.evaluate(last_line)
-                        
-                        # Update the last line with the result
-                        lines[-1] = f"{last_line} = {result}"
-                        new_content = '\n'.join(lines)
-                        
-                        # Update pasteboard
-                        pyperclip.copy(new_content)
-                        
-                        # Store current state
-                        self._last_pasteboard = new_content
-                        
-                        # Call callback if provided
-                        if callback:
-                            callback(result, last_line)
-                            
-                    except ValueError:
-                        # Not a valid calculation, just update last content
-                        self._last_pasteboard = current_content
-                
-                time.sleep(0.5)  # Check every half second
-                
+            asyncio.run(pipeline.run(stop_event))
         except KeyboardInterrupt:
-            print("\nStopped watching pasteboard.")
+            logger.info("Stopped watching pasteboard.")
 
     def output_to_pasteboard(self, result: float, format: str = "answer"):
         """Output the result to the pasteboard in the specified format."""
+        import pyperclip
         output = self.format_output(result, format)
         pyperclip.copy(output)
 
     def memory_store(self):
-        self._memory = self._last_result
+        with self._lock:
+            self._memory = self._last_result
 
     def memory_recall(self) -> float:
         return self._memory
 
     def memory_add(self):
-        self._memory += self._last_result
+        with self._lock:
+            self._memory += self._last_result
 
     def memory_subtract(self):
-        self._memory -= self._last_result 
\ No newline at end of file
+        with self._lock:
+            self._memory -= self._last_result 
\ No newline at end of file
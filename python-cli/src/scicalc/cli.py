@@ -1,68 +1,212 @@
 import click
-from scicalc.calculator import Calculator
-import pyperclip
+from scicalc.calculator import Calculator, split_definition
+from scicalc.formatting import compile_format
+from scicalc.lexer import NAME, tokenize
+from collections import deque
+from scicalc.logsetup import configure_logging
 import logging
 import os
 import sys
 
-def setup_logging():
-    """Setup logging to both file and console"""
-    print("Setting up logging...")  # Direct console output for debugging
+def setup_logging(level=None, use_queue=True, stream=None):
+    """
+    Setup logging to both file and console
     
+    One-shot calculations pass use_queue=False: starting the background
+    listener costs more than the handful of records they write. Console
+    records go to `stream` (stdout by default); batch mode passes stderr so
+    they don't end up among the results.
+    """
     # Get script location
     if getattr(sys, 'frozen', False):
         # PyInstaller executable
-        print(f"Running as PyInstaller executable: {sys.executable}")
         script_dir = os.path.join(os.getenv('LOCALAPPDATA'), 'Ace Centre', 'Scientific Calculator')
     else:
         # Running from source
-        print("Running from source")
         script_dir = os.path.dirname(os.path.abspath(__file__))
     
-    print(f"Script directory: {script_dir}")
-    log_dir = os.path.join(script_dir, 'logs')
-    print(f"Log directory: {log_dir}")
-    
     try:
+        log_dir = os.path.join(script_dir, 'logs')
         os.makedirs(log_dir, exist_ok=True)
         log_file = os.path.join(log_dir, 'scicalc.log')
-        print(f"Attempting to write to log file: {log_file}")
-        
-        # Test write access
-        with open(log_file, 'a') as f:
-            f.write("Log file initialized\n")
-        
-        logging.basicConfig(
-            level=logging.DEBUG,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file),
-                logging.StreamHandler(sys.stdout)  # Explicitly use stdout
-            ]
-        )
-        print("Logging setup complete")
-        logging.info(f"Logging to: {log_file}")
-        
-    except Exception as e:
-        print(f"Error setting up logging: {str(e)}")
+        file_handler = logging.FileHandler(log_file)
+    except Exception:
         # Fall back to temp directory if we can't write to preferred location
         import tempfile
-        temp_dir = tempfile.gettempdir()
-        print(f"Falling back to temp directory: {temp_dir}")
-        log_dir = os.path.join(temp_dir, 'Ace Centre', 'Scientific Calculator', 'logs')
+        log_dir = os.path.join(tempfile.gettempdir(), 'Ace Centre', 'Scientific Calculator', 'logs')
         os.makedirs(log_dir, exist_ok=True)
         log_file = os.path.join(log_dir, 'scicalc.log')
-        
-        logging.basicConfig(
-            level=logging.DEBUG,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file),
-                logging.StreamHandler(sys.stdout)  # Explicitly use stdout
-            ]
-        )
-        print(f"Logging setup complete (using temp directory)")
-        logging.info(f"Logging to: {log_file}")
+        file_handler = logging.FileHandler(log_file)
+    
+    configure_logging([
+        file_handler,
+        logging.StreamHandler(stream or sys.stdout)
+    ], level, use_queue=use_queue)
+    logging.debug("Logging to: %s", log_file)
+
+def run_batch(calc, lines, return_format, out=None, err=None):
+    """
+    Evaluate expressions line by line, writing one result per expression.
+    
+    Lines are consumed lazily, so any iterable (including an open file) can
+    be streamed in constant memory. Blank lines are skipped and errors are
+    reported to `err` without stopping the run.
+    
+    Returns:
+        The number of lines that failed to evaluate
+    """
+    out = out or click.get_text_stream('stdout')
+    err = err or click.get_text_stream('stderr')
+    errors = 0
+    for line_number, line in enumerate(lines, 1):
+        expression = line.strip()
+        if not expression:
+            continue
+        try:
+            result = calc.evaluate(expression)
+            out.write(calc.format_output(result, return_format) + '\n')
+        except ValueError as e:
+            errors += 1
+            err.write(f"Line {line_number}: {expression}: {e}\n")
+    return errors
+
+def _uses_last_result(expression):
+    """Check whether an expression refers to x, the previous result."""
+    if 'x' not in expression:
+        return False
+    if '=' in expression:
+        expression = expression.split('=')[-1]
+    return any(token.kind == NAME and token.text == 'x' for token in tokenize(expression))
+
+def _chains(lines):
+    """
+    Group non-blank lines into chains of (line number, expression).
+    
+    A chain starts at a line that doesn't use x and continues through the
+    lines after it that do, so each chain can be evaluated independently.
+    Lines after a definition (a = 3, f(t) = t^2) may use it, so they all
+    go in the definition's chain.
+    """
+    chain = []
+    defined = False
+    for line_number, line in enumerate(lines, 1):
+        expression = line.strip()
+        if not expression:
+            continue
+        if chain and not defined and not _uses_last_result(expression):
+            yield chain
+            chain = []
+        defined = defined or ('=' in expression and split_definition(expression) is not None)
+        chain.append((line_number, expression))
+    if chain:
+        yield chain
+
+def _chunks(chains, size):
+    """Pack chains into chunks of roughly `size` lines for the worker pool."""
+    chunk, count = [], 0
+    for chain in chains:
+        chunk.append(chain)
+        count += len(chain)
+        if count >= size:
+            yield chunk
+            chunk, count = [], 0
+    if chunk:
+        yield chunk
+
+def _evaluate_chain(calc, chain, return_format, last_result):
+    """
+    Evaluate one chain in order, starting with x set to `last_result`.
+    
+    Returns:
+        (outputs, final, head_failed) where outputs holds a
+        (line number, expression, output, error) tuple per line, final is the
+        last successful result (None if every line failed) and head_failed
+        tells whether the first line failed
+    """
+    calc._last_result = last_result
+    outputs = []
+    final = None
+    for line_number, expression in chain:
+        try:
+            result = calc.evaluate(expression)
+            outputs.append((line_number, expression, calc.format_output(result, return_format), None))
+            final = result
+        except ValueError as e:
+            outputs.append((line_number, expression, None, str(e)))
+    return outputs, final, outputs[0][3] is not None
+
+_worker_calculator = None
+
+def _init_worker(number_format='auto'):
+    global _worker_calculator
+    _worker_calculator = Calculator(number_format=number_format)
+
+def _evaluate_chunk(chunk, return_format):
+    return [_evaluate_chain(_worker_calculator, chain, return_format, 0) for chain in chunk]
+
+def run_parallel_batch(lines, return_format, jobs, out=None, err=None, chunk_size=256,
+                       number_format='auto'):
+    """
+    Evaluate expressions across a pool of worker processes.
+    
+    Independent chains of lines (see `_chains`) are spread over `jobs`
+    workers, each holding its own Calculator, and the results are written in
+    input order. Only a bounded number of chunks is in flight at a time, so
+    input is still read lazily. Results are written in `number_format` (see
+    scicalc.formatting).
+    
+    Returns:
+        The number of lines that failed to evaluate
+    """
+    out = out or click.get_text_stream('stdout')
+    err = err or click.get_text_stream('stderr')
+    errors = 0
+    last_result = 0
+    local_calc = None
+    
+    from concurrent.futures import ProcessPoolExecutor
+    
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(number_format,)) as pool:
+        in_flight = deque()
+        chunks = _chunks(_chains(lines), chunk_size)
+        exhausted = False
+        while in_flight or not exhausted:
+            # Keep the pool busy without reading the whole input
+            while not exhausted and len(in_flight) < jobs * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    in_flight.append((chunk, pool.submit(_evaluate_chunk, chunk, return_format)))
+            if not in_flight:
+                break
+            
+            chunk, future = in_flight.popleft()
+            for chain, (outputs, final, head_failed) in zip(chunk, future.result()):
+                if head_failed and len(chain) > 1:
+                    # The rest of the chain used x from before its first line,
+                    # which is only known here, so re-run it in order
+                    local_calc = local_calc or Calculator(number_format=number_format)
+                    outputs, final, _ = _evaluate_chain(local_calc, chain, return_format, last_result)
+                for line_number, expression, output, error in outputs:
+                    if error is None:
+                        out.write(output + '\n')
+                    else:
+                        errors += 1
+                        err.write(f"Line {line_number}: {expression}: {error}\n")
+                if final is not None:
+                    last_result = final
+    return errors
+
+def _number_format(ctx, param, value):
+    """Check a --format spec when the command line is parsed."""
+    if value is None:
+        return None
+    try:
+        return compile_format(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
 
 @click.command()
 @click.argument('expression', required=False)
@@ -71,15 +215,69 @@ def setup_logging():
 @click.option('--output-to-pasteboard', is_flag=True, help='Output result to pasteboard instead of stdout')
 @click.option('--return', 'return_format', type=click.Choice(['answer', 'answer,calc', 'full']), 
               default='full', help='Format of the output')
-def main(expression, readpasteboard, readpasteboard_once, output_to_pasteboard, return_format):
+@click.option('--format', 'number_format', metavar='SPEC', callback=_number_format,
+              help='Number format, e.g. fixed:2, scientific:4, engineering:3, significant:6, '
+                   'optionally followed by ,grouping and ,speech (default: auto)')
+@click.option('--batch', 'batch_file', type=click.File('r', encoding='utf-8'), metavar='FILE|-',
+              help='Evaluate each line of FILE (or stdin with -) and print the results')
+@click.option('--jobs', type=click.IntRange(min=0), default=1,
+              help='Worker processes for --batch (0 uses every CPU)')
+@click.option('--daemon', 'run_daemon', is_flag=True,
+              help='Keep a calculator running on a Unix socket for --client calls')
+@click.option('--client', is_flag=True,
+              help='Send the expression to a running --daemon (calculates locally if none is running)')
+@click.option('--socket', 'socket_path', envvar='SCICALC_SOCKET', metavar='PATH',
+              help='Socket for --daemon and --client (default: a per-user path)')
+@click.option('--log-level', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR'], case_sensitive=False),
+              help='Logging level (default: SCICALC_LOG_LEVEL or INFO)')
+def main(expression, readpasteboard, readpasteboard_once, output_to_pasteboard, return_format, number_format,
+         batch_file, jobs, run_daemon, client, socket_path, log_level):
     """Scientific Calculator CLI for AAC users."""
-    setup_logging()
+    # Only long-running modes are worth handing records to a background thread
+    setup_logging(log_level, use_queue=batch_file is not None or readpasteboard or run_daemon,
+                  stream=sys.stderr if batch_file is not None else None)
     logging.info("Starting Scientific Calculator")
-    logging.debug(f"Args: expression={expression}, readpasteboard={readpasteboard}, "
-                 f"readpasteboard_once={readpasteboard_once}, output_to_pasteboard={output_to_pasteboard}, "
-                 f"return_format={return_format}")
+    logging.debug("Args: expression=%s, readpasteboard=%s, readpasteboard_once=%s, "
+                  "output_to_pasteboard=%s, return_format=%s, format=%s, batch=%s, jobs=%s, daemon=%s, client=%s",
+                  expression, readpasteboard, readpasteboard_once, output_to_pasteboard,
+                  return_format, number_format, batch_file is not None, jobs, run_daemon, client)
+    
+    calc = Calculator(number_format=number_format or 'auto')
+    
+    if run_daemon:
+        if expression or readpasteboard or readpasteboard_once or output_to_pasteboard or client \
+                or batch_file is not None:
+            logging.error("--daemon cannot be combined with other modes")
+            raise click.UsageError("--daemon cannot be combined with an expression or other modes")
+        from scicalc import daemon
+        if not daemon.available():
+            logging.error("--daemon needs Unix domain sockets, which this platform doesn't have")
+            raise click.UsageError("--daemon is not supported on this platform (no Unix domain sockets)")
+        daemon.serve(socket_path, calc)
+        return
     
-    calc = Calculator()
+    if client and (batch_file is not None or readpasteboard):
+        logging.error("--client cannot be combined with --batch or --readpasteboard")
+        raise click.UsageError("--client cannot be combined with --batch or --readpasteboard")
+    
+    if jobs != 1 and batch_file is None:
+        logging.error("--jobs requires --batch")
+        raise click.UsageError("--jobs requires --batch")
+    
+    if batch_file is not None:
+        if expression or readpasteboard or readpasteboard_once or output_to_pasteboard:
+            logging.error("--batch cannot be combined with an expression or pasteboard options")
+            raise click.UsageError("--batch cannot be combined with an expression or pasteboard options")
+        jobs = jobs or os.cpu_count() or 1
+        logging.info("Starting batch mode with %d job(s)", jobs)
+        if jobs > 1:
+            errors = run_parallel_batch(batch_file, return_format, jobs, number_format=calc._number_format.spec)
+        else:
+            errors = run_batch(calc, batch_file, return_format)
+        logging.info("Batch mode finished with %d error(s)", errors)
+        if errors:
+            sys.exit(1)
+        return
     
     if readpasteboard and readpasteboard_once:
         logging.error("Cannot use both --readpasteboard and --readpasteboard-once")
@@ -97,8 +295,9 @@ def main(expression, readpasteboard, readpasteboard_once, output_to_pasteboard,
         return
     
     if readpasteboard_once:
+        import pyperclip
         expression = pyperclip.paste().strip()
-        logging.debug(f"Read from pasteboard: {expression}")
+        logging.debug("Read from pasteboard: %s", expression)
         if not expression:
             logging.error("No expression found in pasteboard")
             raise click.UsageError("No expression found in pasteboard")
@@ -108,24 +307,35 @@ def main(expression, readpasteboard, readpasteboard_once, output_to_pasteboard,
         raise click.UsageError("Please provide an expression or use --readpasteboard")
     
     try:
-        logging.debug(f"Evaluating expression: {expression}")
-        result = calc.evaluate(expression)
-        logging.debug(f"Result: {result}")
+        output = None
+        if client:
+            from scicalc import daemon
+            try:
+                output = daemon.request(expression, return_format, socket_path,
+                                        number_format=number_format and number_format.spec)
+            except OSError as e:
+                logging.warning("No scicalc daemon available (%s), calculating locally", e)
         
-        # Format output
-        output = calc.format_output(result, return_format)
-        logging.debug(f"Formatted output: {output}")
+        if output is None:
+            logging.debug("Evaluating expression: %s", expression)
+            result = calc.evaluate(expression)
+            logging.debug("Result: %s", result)
+            
+            # Format output
+            output = calc.format_output(result, return_format)
+        logging.debug("Formatted output: %s", output)
         
         # Handle output
         if output_to_pasteboard:
             logging.info("Copying result to pasteboard")
+            import pyperclip
             pyperclip.copy(output)
         else:
             logging.info("Outputting result to stdout")
             click.echo(output)
         
     except ValueError as e:
-        logging.error(f"Error evaluating expression: {str(e)}")
+        logging.error("Error evaluating expression: %s", e)
         raise click.UsageError(str(e))
 
 if __name__ == '__main__':
@@ -0,0 +1,236 @@
+"""Long-running calculator daemon on a Unix domain socket, and its client.
+
+`scicalc --daemon` keeps one warm Calculator (compiled expression cache,
+memory and last result) listening on a socket, so callers such as the AAC
+grid don't pay for a new interpreter on every button press. Each connection
+carries one request and one reply, both single lines of JSON:
+
+    {"expression": "2+2", "return": "full"}
+    {"success": true, "output": "2+2 = 4"}
+
+A request may also give a "format" spec (see scicalc.formatting) to use
+instead of the daemon's own number format.
+
+The client half only needs the standard library, so `scicalc-client`
+starts in a fraction of the time of the full CLI.
+"""
+import json
+import logging
+import os
+import socket
+import sys
+
+logger = logging.getLogger(__name__)
+
+RETURN_FORMATS = ('answer', 'answer,calc', 'full')
+
+# Longest request line accepted by the daemon
+MAX_REQUEST_BYTES = 64 * 1024
+
+
+def available():
+    """Check whether this platform has Unix domain sockets (Windows builds of Python don't)."""
+    return hasattr(socket, 'AF_UNIX')
+
+
+def default_socket_path():
+    """Return the socket path from SCICALC_SOCKET, or a per-user default."""
+    path = os.environ.get('SCICALC_SOCKET')
+    if path:
+        return path
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if not base:
+        import tempfile
+        base = tempfile.gettempdir()
+    uid = os.getuid() if hasattr(os, 'getuid') else os.getpid()
+    return os.path.join(base, f'scicalc-{uid}.sock')
+
+
+def request(expression, return_format='full', path=None, timeout=5.0, number_format=None):
+    """
+    Evaluate an expression on a running daemon.
+
+    Args:
+        expression: Expression to evaluate
+        return_format: One of 'answer', 'answer,calc' or 'full'
+        path: Socket path (defaults to `default_socket_path()`)
+        timeout: Seconds to wait for the daemon
+        number_format: Optional format spec for the result, such as 'fixed:2'
+
+    Returns:
+        The formatted output
+
+    Raises:
+        ValueError: If the daemon couldn't evaluate the expression
+        OSError: If no daemon is listening on `path`, or the platform has no
+            Unix domain sockets
+    """
+    if not available():
+        raise ConnectionError("Unix domain sockets are not available on this platform")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or default_socket_path())
+        message = {'expression': expression, 'return': return_format}
+        if number_format is not None:
+            message['format'] = number_format
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("Daemon closed the connection without replying")
+    reply = json.loads(line)
+    if not reply.get('success'):
+        raise ValueError(reply.get('error', 'Unknown error'))
+    return reply['output']
+
+
+def _handle(calculator, line):
+    """Turn one request line into a reply dict."""
+    try:
+        message = json.loads(line)
+        expression = message['expression']
+        return_format = message.get('return', 'full')
+        spec = message.get('format')
+    except (ValueError, KeyError, TypeError):
+        return {'success': False, 'error': 'Invalid request'}
+    if not isinstance(expression, str):
+        return {'success': False, 'error': "'expression' must be a string"}
+    if return_format not in RETURN_FORMATS:
+        return {'success': False, 'error': f"Invalid return format: {return_format}"}
+    number_format = calculator._number_format
+    if spec is not None:
+        from scicalc.formatting import compile_format
+        try:
+            number_format = compile_format(spec)
+        except (ValueError, TypeError, AttributeError):
+            return {'success': False, 'error': f"Invalid format: {spec}"}
+
+    # The expression and format are passed along rather than read back from
+    # the calculator, which other clients may be using at the same time
+    try:
+        result = calculator.evaluate(expression)
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}
+    output = calculator.format_output(result, return_format, expression=expression, number_format=number_format)
+    return {'success': True, 'output': output}
+
+
+def _remove_stale_socket(path):
+    """Remove a socket file left behind by a daemon that is no longer running."""
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            os.unlink(path)
+            return
+    raise RuntimeError(f"A scicalc daemon is already listening on {path}")
+
+
+def make_server(path, calculator=None):
+    """
+    Create a threaded server for `calculator` bound to the socket at `path`.
+
+    The socket is only accessible to the current user.
+
+    Raises:
+        RuntimeError: If a daemon is already listening on `path`, or the
+            platform has no Unix domain sockets
+    """
+    import socketserver
+
+    if not available():
+        raise RuntimeError("The scicalc daemon needs Unix domain sockets, which this platform doesn't have")
+
+    if calculator is None:
+        from scicalc.calculator import Calculator
+        calculator = Calculator()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline(MAX_REQUEST_BYTES)
+            if not line:
+                return
+            reply = _handle(calculator, line)
+            self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    _remove_stale_socket(path)
+    old_umask = os.umask(0o177)
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(old_umask)
+    server.calculator = calculator
+    return server
+
+
+def serve(path=None, calculator=None):
+    """
+    Serve calculations on a Unix domain socket until SIGINT or SIGTERM.
+
+    The socket file is removed when the daemon stops.
+    """
+    import signal
+    import threading
+
+    path = path or default_socket_path()
+    server = make_server(path, calculator)
+
+    def request_shutdown(sig, frame):
+        logger.info("Stopping scicalc daemon...")
+        # shutdown() blocks until serve_forever() returns, so call it from another thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, request_shutdown)
+    signal.signal(signal.SIGTERM, request_shutdown)
+
+    logger.info("scicalc daemon listening on %s", path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+    logger.info("scicalc daemon stopped")
+
+
+def client_main(argv=None):
+    """
+    Entry point for `scicalc-client`: send one expression to the daemon.
+
+    Falls back to calculating in this process when no daemon is running, so
+    a result is always printed (but memory and x don't carry over).
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='scicalc-client',
+                                     description='Send an expression to a running scicalc daemon.')
+    parser.add_argument('expression')
+    parser.add_argument('--return', dest='return_format', choices=RETURN_FORMATS, default='full',
+                        help='Format of the output')
+    parser.add_argument('--format', dest='number_format', metavar='SPEC',
+                        help='Number format, e.g. fixed:2 or significant:6,grouping (default: the daemon\'s)')
+    parser.add_argument('--socket', help='Daemon socket (default: SCICALC_SOCKET or a per-user path)')
+    args = parser.parse_args(argv)
+
+    try:
+        try:
+            output = request(args.expression, args.return_format, args.socket,
+                             number_format=args.number_format)
+        except OSError:
+            from scicalc.calculator import Calculator
+            calc = Calculator(number_format=args.number_format or 'auto')
+            output = calc.format_output(calc.evaluate(args.expression), args.return_format)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(client_main())
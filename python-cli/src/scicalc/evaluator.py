@@ -0,0 +1,462 @@
+"""Parser and evaluator for normalized calculator expressions.
+
+Expressions produced by `Calculator.clean_expression` are parsed into a small
+syntax tree which is then compiled into nested closures. Only numbers,
+names, calls to functions from an explicit table and the arithmetic
+operators are understood, so nothing in the input can reach Python builtins.
+"""
+import math
+import operator
+import re
+import time
+from collections import namedtuple
+
+# Syntax tree nodes
+Number = namedtuple('Number', ['value'])
+Name = namedtuple('Name', ['name'])
+Call = namedtuple('Call', ['name', 'args'])
+UnaryOp = namedtuple('UnaryOp', ['op', 'operand'])
+BinOp = namedtuple('BinOp', ['op', 'left', 'right'])
+
+BINARY_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '**': operator.pow,
+}
+
+UNARY_OPERATORS = {
+    '-': operator.neg,
+    '+': operator.pos,
+}
+
+# Key in the variables mapping holding the evaluation deadline; it can't
+# clash with a parsed name
+DEADLINE = '@deadline'
+
+
+class LimitExceeded(ValueError):
+    """Raised when an expression exceeds one of its resource limits."""
+
+
+class Limits:
+    """
+    Resource limits for evaluating untrusted expressions.
+
+    Any limit can be set to None to disable it.
+    """
+
+    def __init__(self, max_length=1000, max_depth=100, max_digits=1000, max_exponent=10000,
+                 max_factorial=1000, timeout=None):
+        """
+        Args:
+            max_length: Longest expression accepted, in characters
+            max_depth: Deepest nesting of brackets, function arguments and signs
+            max_digits: Most digits allowed in any integer operand or result
+            max_exponent: Largest absolute exponent for ** and pow()
+            max_factorial: Largest argument accepted by factorial()
+            timeout: Wall-clock seconds allowed for one evaluation
+        """
+        self.max_length = max_length
+        self.max_depth = max_depth
+        self.max_digits = max_digits
+        self.max_exponent = max_exponent
+        self.max_factorial = max_factorial
+        self.timeout = timeout
+        # Integers up to this many bits have at most max_digits digits
+        self._max_bits = None if max_digits is None else int(max_digits * math.log2(10))
+
+    def check_length(self, expression):
+        if self.max_length is not None and len(expression) > self.max_length:
+            raise LimitExceeded(
+                f"Expression is too long: {len(expression)} characters (limit {self.max_length})")
+
+    def check_digits(self, value):
+        if self._max_bits is not None and type(value) is not float and _bits(value) > self._max_bits:
+            raise LimitExceeded(f"Number is too large: more than {self.max_digits} digits")
+        return value
+
+    def check_power(self, base, exponent):
+        if self.max_exponent is not None and not isinstance(exponent, complex) \
+                and _above(abs(exponent), self.max_exponent):
+            raise LimitExceeded(f"Exponent is too large: {exponent} (limit {self.max_exponent})")
+        # Refuse exact powers whose result would be too large before computing them
+        if self._max_bits is not None and getattr(exponent, 'denominator', None) == 1 \
+                and exponent > 0 and (_bits(base) - 1) * exponent > self._max_bits:
+            raise LimitExceeded(f"Number is too large: more than {self.max_digits} digits")
+
+    def check_factorial(self, value):
+        if self.max_factorial is not None and not isinstance(value, complex) \
+                and _above(value, self.max_factorial):
+            raise LimitExceeded(f"Factorial argument is too large: {value} (limit {self.max_factorial})")
+
+    def check_deadline(self, variables):
+        deadline = variables.get(DEADLINE)
+        if deadline is not None and time.monotonic() > deadline:
+            raise LimitExceeded(f"Calculation took longer than {self.timeout} seconds")
+
+    def guard_operator(self, op, func):
+        """Wrap a binary operator so it enforces these limits."""
+        check_digits = self.check_digits
+        if op == '**':
+            check_power = self.check_power
+
+            def power(base, exponent):
+                check_power(base, exponent)
+                return check_digits(func(base, exponent))
+            return power
+        return lambda a, b: check_digits(func(a, b))
+
+    def guard_function(self, name, func):
+        """Wrap a calculator function so it enforces these limits."""
+        check_digits = self.check_digits
+        if name == 'factorial':
+            check_factorial = self.check_factorial
+
+            def factorial(value):
+                check_factorial(value)
+                return check_digits(func(value))
+            return factorial
+        if name == 'pow':
+            check_power = self.check_power
+
+            def power(base, exponent, *args):
+                check_power(base, exponent)
+                return check_digits(func(base, exponent, *args))
+            return power
+        return lambda *args: check_digits(func(*args))
+
+
+def _above(value, limit):
+    """Check whether a number, or any element of a NumPy array, is above `limit`."""
+    above = value > limit
+    return above.any() if hasattr(above, 'any') else above
+
+
+def _bits(value):
+    """Bits in the numerator or denominator of an exact number, or 0 for inexact numbers."""
+    if type(value) is int:
+        return value.bit_length()
+    # Fractions grow without bound too; floats, Decimals and NumPy numbers
+    # have a fixed precision
+    numerator = getattr(value, 'numerator', None)
+    if type(numerator) is not int:
+        return 0
+    return max(abs(numerator).bit_length(), value.denominator.bit_length())
+
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<name>[A-Za-z_]\w*)
+      | (?P<op>\*\*|[-+*/(),])
+      | (?P<other>\S)
+    )""", re.VERBOSE)
+
+
+def _scan(expression):
+    tokens = []
+    for match in _TOKEN_RE.finditer(expression):
+        kind = match.lastgroup
+        if kind is None:
+            continue
+        text = match.group(kind)
+        if kind == 'other':
+            raise SyntaxError(f"invalid character '{text}'")
+        tokens.append((kind, text))
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser using Python's operator precedence."""
+
+    def __init__(self, tokens, max_depth=None, number=None):
+        self.tokens = tokens
+        self.pos = 0
+        self.max_depth = max_depth
+        self.depth = 0
+        self.number = number
+
+    def enter(self):
+        self.depth += 1
+        if self.max_depth is not None and self.depth > self.max_depth:
+            raise LimitExceeded(f"Expression is nested too deeply (limit {self.max_depth})")
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos][1]
+        return None
+
+    def next(self):
+        if self.pos >= len(self.tokens):
+            raise SyntaxError("unexpected end of expression")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect(self, text):
+        kind, token = self.next()
+        if token != text:
+            raise SyntaxError(f"expected '{text}' but found '{token}'")
+
+    def parse(self):
+        if not self.tokens:
+            raise SyntaxError("empty expression")
+        node = self.additive()
+        if self.pos < len(self.tokens):
+            raise SyntaxError(f"unexpected '{self.peek()}'")
+        return node
+
+    def additive(self):
+        self.enter()
+        node = self.multiplicative()
+        while self.peek() in ('+', '-'):
+            op = self.next()[1]
+            node = BinOp(op, node, self.multiplicative())
+        self.depth -= 1
+        return node
+
+    def multiplicative(self):
+        node = self.unary()
+        while self.peek() in ('*', '/'):
+            op = self.next()[1]
+            node = BinOp(op, node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek() in ('-', '+'):
+            op = self.next()[1]
+            self.enter()
+            node = UnaryOp(op, self.unary())
+            self.depth -= 1
+            return node
+        return self.power()
+
+    def power(self):
+        node = self.primary()
+        if self.peek() == '**':
+            self.next()
+            # Right associative, and binds tighter than a unary minus on its left.
+            # Chains of powers nest, so each one counts towards the depth
+            self.enter()
+            node = BinOp('**', node, self.unary())
+            self.depth -= 1
+        return node
+
+    def primary(self):
+        kind, text = self.next()
+        if kind == 'number':
+            if self.number is not None:
+                return Number(self.number(text))
+            if '.' in text or 'e' in text or 'E' in text:
+                return Number(float(text))
+            return Number(int(text))
+        if kind == 'name':
+            if self.peek() == '(':
+                self.next()
+                args = []
+                if self.peek() != ')':
+                    args.append(self.additive())
+                    while self.peek() == ',':
+                        self.next()
+                        args.append(self.additive())
+                self.expect(')')
+                return Call(text, tuple(args))
+            return Name(text)
+        if text == '(':
+            node = self.additive()
+            self.expect(')')
+            return node
+        raise SyntaxError(f"unexpected '{text}'")
+
+
+def parse(expression, max_depth=None, number=None):
+    """Parse a normalized expression string into a syntax tree.
+
+    Number literals become ints or floats, unless `number` is given to
+    convert their text instead (e.g. decimal.Decimal).
+
+    Raises:
+        SyntaxError: If the expression is not valid calculator syntax
+        LimitExceeded: If the expression is nested more than `max_depth` deep
+    """
+    return _Parser(_scan(expression), max_depth, number).parse()
+
+
+def compile_tree(node, functions, constants, limits=None):
+    """Compile a syntax tree into a function of a variables mapping.
+
+    Function calls are bound when compiling; names are looked up in
+    `constants` first and then in the variables passed at evaluation time.
+    With `limits`, operators and functions check the result size, exponent,
+    factorial and deadline limits as they run.
+
+    Raises:
+        NameError: If the tree calls a function that is not in `functions`
+    """
+    kind = type(node)
+    if kind is Number:
+        value = node.value
+        if limits is not None:
+            limits.check_digits(value)
+        return lambda variables: value
+    if kind is Name:
+        name = node.name
+        if name in constants:
+            value = constants[name]
+            return lambda variables: value
+
+        def lookup(variables):
+            try:
+                return variables[name]
+            except KeyError:
+                raise _undefined(name) from None
+        return lookup
+    if kind is UnaryOp:
+        operands = [compile_tree(node.operand, functions, constants, limits)]
+    elif kind is BinOp:
+        operands = [compile_tree(node.left, functions, constants, limits),
+                    compile_tree(node.right, functions, constants, limits)]
+    elif kind is Call:
+        # Report an unknown function before anything unknown inside it
+        if node.name not in functions:
+            raise _undefined(node.name)
+        operands = [compile_tree(arg, functions, constants, limits) for arg in node.args]
+    else:
+        raise TypeError(f"unknown node {node!r}")
+    return combine(node, operands, functions, limits)
+
+
+def combine(node, operands, functions, limits=None):
+    """Build the program for an operator or call node from its compiled operands.
+
+    `compile_tree` uses this for every node that has operands; it is
+    exposed so callers that cache compiled subtrees can build the rest.
+
+    Raises:
+        NameError: If `node` calls a function that is not in `functions`
+    """
+    kind = type(node)
+    if kind is UnaryOp:
+        op = UNARY_OPERATORS[node.op]
+        operand = operands[0]
+        return lambda variables: op(operand(variables))
+    if kind is BinOp:
+        op = BINARY_OPERATORS[node.op]
+        if limits is not None:
+            op = limits.guard_operator(node.op, op)
+        left, right = operands
+        program = lambda variables: op(left(variables), right(variables))
+    else:
+        if node.name not in functions:
+            raise _undefined(node.name)
+        func = functions[node.name]
+        if isinstance(func, Function):
+            return _call_defined(node, operands, functions, limits)
+        if limits is not None:
+            func = limits.guard_function(node.name, func)
+        if len(operands) == 1:
+            arg = operands[0]
+            program = lambda variables: func(arg(variables))
+        else:
+            args = operands
+            program = lambda variables: func(*[a(variables) for a in args])
+
+    # Only calls and powers can be slow, so only they check the deadline
+    if limits is not None and limits.timeout is not None and (kind is Call or node.op == '**'):
+        check_deadline = limits.check_deadline
+        inner = program
+
+        def program(variables):
+            check_deadline(variables)
+            return inner(variables)
+    return program
+
+
+def _call_defined(node, operands, functions, limits):
+    """Build the program for a call to a Function in the table."""
+    name = node.name
+    functions[name].check_arity(len(operands))
+    args = operands
+
+    def program(variables):
+        # Looked up on every call so that redefining the function takes
+        # effect without recompiling the expressions that call it
+        func = functions.get(name)
+        if not isinstance(func, Function):
+            raise _undefined(name)
+        return func.call(variables, [a(variables) for a in args])
+
+    if limits is not None and limits.timeout is not None:
+        check_deadline = limits.check_deadline
+        inner = program
+
+        def program(variables):
+            check_deadline(variables)
+            return inner(variables)
+    return program
+
+
+def _undefined(name):
+    return NameError(f"name '{name}' is not defined")
+
+
+class Function:
+    """
+    A function defined as an expression of its parameters, e.g. f(t) = t**2+1.
+
+    Put one in a function table and calls to it are compiled like calls to
+    any other function, except that the body sees the caller's variables
+    with the parameters added.
+    """
+    __slots__ = ('name', 'params', 'source', '_program')
+
+    def __init__(self, name, params, source, program):
+        """
+        Args:
+            name: Name the function is called by
+            params: Tuple of parameter names
+            source: The normalized body
+            program: The compiled body, a function of a variables mapping
+        """
+        self.name = name
+        self.params = params
+        self.source = source
+        self._program = program
+
+    def check_arity(self, count):
+        if count != len(self.params):
+            raise TypeError(f"{self.name}() takes {len(self.params)} argument"
+                            f"{'' if len(self.params) == 1 else 's'} but {count} {'was' if count == 1 else 'were'} given")
+
+    def call(self, variables, args):
+        """Evaluate the body with the parameters bound to `args`."""
+        self.check_arity(len(args))
+        scope = dict(variables)
+        scope.update(zip(self.params, args))
+        return self._program(scope)
+
+    def __str__(self):
+        return f"{self.name}({', '.join(self.params)}) = {self.source}"
+
+    def __repr__(self):
+        return f"<Function {self}>"
+
+
+class Expression:
+    """A parsed and compiled expression that can be evaluated repeatedly."""
+    __slots__ = ('source', 'tree', 'limits', '_program')
+
+    def __init__(self, source, functions, constants, limits=None, number=None):
+        self.source = source
+        self.limits = limits
+        self.tree = parse(source, limits.max_depth if limits is not None else None, number)
+        self._program = compile_tree(self.tree, functions, constants, limits)
+
+    def evaluate(self, variables):
+        """Evaluate the expression with the given variable values."""
+        if self.limits is not None and self.limits.timeout is not None:
+            variables = dict(variables)
+            variables[DEADLINE] = time.monotonic() + self.limits.timeout
+        return self._program(variables)
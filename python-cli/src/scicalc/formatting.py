@@ -0,0 +1,366 @@
+"""Number formats for calculator output.
+
+A format spec is a mode, an optional digit count and optional flags:
+
+    auto            the number as Python prints it, 4 rather than 4.0 (the default)
+    fixed:2         2 decimal places: 1234.50
+    scientific:3    3 digits after the point: 1.235e3
+    engineering:4   4 significant digits, exponent a multiple of 3: 1.235e3
+    significant:4   4 significant digits, trailing zeros dropped: 1234.5 -> 1235
+
+Flags follow a comma: `grouping` separates thousands (1,234.50) and
+`speech` spells the output for voice output ("minus 1.5 times ten to the
+power 3"). For example `fixed:2,grouping,speech`.
+
+`compile_format` parses a spec once and returns a `NumberFormat` whose
+format strings are already built, and reuses it for the same spec, so
+formatting in a batch costs no parsing. `NumberFormat.format_array`
+formats a NumPy array with array-wide string operations instead of a
+Python call per element.
+"""
+import math
+import re
+from functools import lru_cache
+
+MODES = ('auto', 'fixed', 'scientific', 'engineering', 'significant')
+FLAGS = ('grouping', 'speech')
+
+# Digits used when a spec gives none
+DEFAULT_DIGITS = {'fixed': 2, 'scientific': 6, 'engineering': 6, 'significant': 10}
+
+# Most digits a spec may ask for. Past 15 significant digits a float has
+# nothing more to show, and array formatting can't be exact.
+MAX_DIGITS = {'fixed': 20, 'scientific': 14, 'engineering': 15, 'significant': 15}
+
+# Significant mode writes numbers with an exponent outside this range out in full
+POSITIONAL_EXPONENTS = range(-5, 16)
+
+# Words for the parts of a formatted number, in the order they are replaced
+SPEECH_WORDS = (
+    ('±', 'plus or minus '),
+    ('-', 'minus '),
+    ('e', ' times ten to the power '),
+    ('/', ' over '),
+    ('.', ' point '),
+    ('inf', 'infinity'),
+    ('nan', 'not a number'),
+)
+
+# The exponent in Python's output, such as the '-07' in 1e-07
+EXPONENT = re.compile(r'e([+-]?\d+)')
+
+
+@lru_cache(maxsize=64)
+def compile_format(spec='auto'):
+    """
+    Parse a format spec (see the module docstring).
+
+    Returns:
+        A NumberFormat; the same spec always returns the same object
+
+    Raises:
+        ValueError: If the spec has an unknown mode or flag, or digits out of range
+    """
+    head, *flags = [part.strip() for part in spec.split(',')]
+    mode, _, digits = head.partition(':')
+    mode = mode.strip().lower()
+    if mode not in MODES:
+        raise ValueError(f"Unknown format mode: {mode} (expected one of {', '.join(MODES)})")
+    for flag in flags:
+        if flag not in FLAGS:
+            raise ValueError(f"Unknown format flag: {flag} (expected {' or '.join(FLAGS)})")
+
+    if mode == 'auto':
+        if digits:
+            raise ValueError("The auto format takes no digits")
+        digits = None
+    elif not digits:
+        digits = DEFAULT_DIGITS[mode]
+    else:
+        try:
+            digits = int(digits)
+        except ValueError:
+            raise ValueError(f"Invalid digits in format spec: {digits}") from None
+        lowest = 0 if mode == 'fixed' else 1
+        if not lowest <= digits <= MAX_DIGITS[mode]:
+            raise ValueError(f"{mode} format digits must be between {lowest} and {MAX_DIGITS[mode]}")
+    return NumberFormat(mode, digits, 'grouping' in flags, 'speech' in flags)
+
+
+def _real(value):
+    """Return a value that format() handles exactly: floats and Decimals as they are."""
+    if isinstance(value, float):
+        return value
+    # Imported here, as float-only output doesn't need them
+    from decimal import Decimal
+    from fractions import Fraction
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, Fraction):
+        return Decimal(value.numerator) / Decimal(value.denominator)
+    return Decimal(value)
+
+
+def _is_finite(value):
+    return math.isfinite(value) if isinstance(value, float) else value.is_finite()
+
+
+def _group(text):
+    """Separate the thousands in the integer part of a formatted number."""
+    sign = '-' if text.startswith('-') else ''
+    whole, point, rest = text[len(sign):].partition('.')
+    if not whole.isdigit():
+        # Exponent or non-finite output
+        return text
+    return f"{sign}{int(whole):,}{point}{rest}"
+
+
+def _strip_zeros(text):
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    return text
+
+
+def _spoken_exponent(text):
+    """Write an exponent as its int, so 1e-07 is spoken as 'minus 7' and 1e+20 as '20'."""
+    return EXPONENT.sub(lambda match: f"e{int(match.group(1))}", text)
+
+
+def _auto_text(value):
+    """The value as Python prints it, without the '.0' of a whole float."""
+    text = str(value)
+    if isinstance(value, float) and text.endswith('.0'):
+        text = text[:-2]
+        # As significant mode writes it
+        return '0' if text == '-0' else text
+    return text
+
+
+def _speak(text):
+    text = _spoken_exponent(text)
+    for symbol, words in SPEECH_WORDS:
+        text = text.replace(symbol, words)
+    return text
+
+
+class NumberFormat:
+    """
+    A compiled format spec. Create with `compile_format`.
+
+    Calling it formats one result: an int, float, Decimal, Fraction or the
+    two-value list from ±.
+    """
+
+    def __init__(self, mode, digits, grouping=False, speech=False):
+        self.mode = mode
+        self.digits = digits
+        self.grouping = grouping
+        self.speech = speech
+        if mode == 'fixed':
+            self._format_finite = self._fixed
+            self._spec = f"{',' if grouping else ''}.{digits}f"
+        elif mode == 'auto':
+            self._format_finite = self._auto
+        else:
+            self._format_finite = {'scientific': self._scientific, 'engineering': self._engineering,
+                                   'significant': self._significant}[mode]
+            # Scientific keeps `digits` after the point; the others count every digit
+            self._spec = f".{digits if mode == 'scientific' else digits - 1}e"
+
+    def __repr__(self):
+        return f"compile_format({self.spec!r})"
+
+    @property
+    def spec(self):
+        """The spec in its canonical form."""
+        spec = self.mode if self.digits is None else f"{self.mode}:{self.digits}"
+        flags = [flag for flag in FLAGS if getattr(self, flag)]
+        return ','.join([spec] + flags)
+
+    def __call__(self, value):
+        """Format one result."""
+        if isinstance(value, list):
+            text = self._format_pair(value)
+        elif self.mode == 'auto':
+            text = self._auto(value)
+        else:
+            real = _real(value)
+            text = self._format_finite(real) if _is_finite(real) else str(float(real))
+        return _speak(text) if self.speech else text
+
+    def _format_pair(self, values):
+        if self.mode == 'auto' and not self.speech:
+            # As before formats existed, so grids reading the output keep working
+            return f"[{', '.join(self._auto(value) for value in values)}]"
+        first = NumberFormat(self.mode, self.digits, self.grouping)
+        if len(values) == 2 and values[1] == -values[0]:
+            return '±' + first(abs(values[0]))
+        return ' or '.join(first(value) for value in values)
+
+    def _auto(self, value):
+        text = _auto_text(value)
+        return _group(text) if self.grouping else text
+
+    def _fixed(self, value):
+        return format(value, self._spec)
+
+    def _split(self, value):
+        """Round to the spec's digits; return (sign, digits without the point, exponent)."""
+        mantissa, _, exponent = format(value, self._spec).partition('e')
+        sign = '-' if mantissa.startswith('-') else ''
+        return sign, mantissa[len(sign):].replace('.', ''), int(exponent)
+
+    def _scientific(self, value):
+        sign, digits, exponent = self._split(value)
+        point = '.' if len(digits) > 1 else ''
+        return f"{sign}{digits[0]}{point}{digits[1:]}e{exponent}"
+
+    def _engineering(self, value):
+        sign, digits, exponent = self._split(value)
+        shift = exponent % 3
+        digits = digits.ljust(shift + 1, '0')
+        point = '.' if len(digits) > shift + 1 else ''
+        mantissa = f"{digits[:shift + 1]}{point}{digits[shift + 1:]}"
+        return f"{sign}{mantissa}e{exponent - shift}"
+
+    def _significant(self, value):
+        sign, digits, exponent = self._split(value)
+        if exponent not in POSITIONAL_EXPONENTS:
+            point = '.' if len(digits) > 1 else ''
+            return f"{sign}{_strip_zeros(digits[0] + point + digits[1:])}e{exponent}"
+        if exponent >= 0:
+            digits = digits.ljust(exponent + 1, '0')
+            text = _strip_zeros(f"{digits[:exponent + 1]}.{digits[exponent + 1:]}")
+            if self.grouping:
+                text = _group(text)
+        else:
+            text = _strip_zeros(f"0.{'0' * (-exponent - 1)}{digits}")
+        # Rounding can leave -0
+        return text if text == '0' else sign + text
+
+    def format_array(self, values):
+        """
+        Format every value in a NumPy array, as calling the format on each
+        float in it would.
+
+        Returns:
+            An array of str with the same shape
+        """
+        import numpy as np
+
+        values = np.asarray(values, dtype=float)
+        if not values.size:
+            return np.zeros(values.shape, dtype=str)
+        flat = values.ravel()
+        finite = np.isfinite(flat)
+        # Non-finite values are formatted as 0 and replaced at the end
+        safe = np.where(finite, flat, 0.0)
+
+        if self.mode == 'auto':
+            convert = _spoken_exponent if self.speech else str
+            text = np.array([convert(_auto_text(value)) for value in flat.tolist()], dtype=str)
+            if self.grouping:
+                text = _group_array(np, text)
+        elif self.mode == 'fixed':
+            text = _printf(np, f'%.{self.digits}f', safe)
+            if self.grouping:
+                text = _group_array(np, text)
+        else:
+            text = self._exponent_array(np, safe)
+
+        if not finite.all():
+            text = np.where(finite, text, np.where(np.isnan(flat), 'nan', np.where(flat > 0, 'inf', '-inf')))
+        if self.speech:
+            for symbol, words in SPEECH_WORDS:
+                # Widen the strings first, or np.char.replace can cut them short
+                growth = int(np.char.count(text, symbol).max()) * (len(words) - len(symbol))
+                text = np.char.replace(text.astype(f'<U{text.dtype.itemsize // 4 + growth}'), symbol, words)
+        return text.reshape(values.shape)
+
+    def _exponent_array(self, np, values):
+        """format_array for the modes that round to a number of digits."""
+        digits = self.digits
+        scientific = _printf(np, '%' + self._spec, values)
+        mantissas, _, exponents = np.char.partition(scientific, 'e').T
+        # Arrays hold few distinct exponents, so only those are parsed
+        exponent_texts, inverse = np.unique(exponents, return_inverse=True)
+        exponents = np.array([int(text) for text in exponent_texts.tolist()])[inverse].reshape(-1)
+
+        if self.mode == 'scientific':
+            return np.char.add(mantissas, _exponent_suffixes(np, exponents))
+
+        if self.mode == 'engineering':
+            shift = exponents % 3
+            # Rescaling the mantissa is exact to far more digits than it keeps
+            scaled = np.where(shift, mantissas.astype(float) * 10.0 ** shift, 0.0)
+            formats = np.array([f'%.{max(digits - 1 - s, 0)}f' for s in range(3)])[shift]
+            shifted = np.where(shift, _printf(np, formats, scaled), mantissas)
+            return np.char.add(shifted, _exponent_suffixes(np, exponents - shift))
+
+        # significant
+        positional = (exponents >= POSITIONAL_EXPONENTS.start) & (exponents < POSITIONAL_EXPONENTS.stop)
+        decimals = np.clip(digits - 1 - np.clip(exponents, POSITIONAL_EXPONENTS.start, None), 0, None)
+        formats = np.array([f'%.{places}f' for places in range(decimals.max() + 1)])[decimals]
+        # Rounding to the left of the point can't be done by %f, so those
+        # values are written as their rounded digits followed by zeros
+        whole = positional & (exponents >= digits)
+        fraction = positional & ~whole
+        pieces = [(fraction, _strip_zeros_array(np, _printf(np, formats[fraction], values[fraction])))]
+        if whole.any():
+            zeros = np.array(['0' * count for count in range(POSITIONAL_EXPONENTS.stop)])
+            pieces.append((whole, np.char.add(np.char.replace(mantissas[whole], '.', ''),
+                                              zeros[exponents[whole] - digits + 1])))
+        text = np.char.add(_strip_zeros_array(np, mantissas), _exponent_suffixes(np, exponents))
+        for mask, full in pieces:
+            if not mask.any():
+                continue
+            if self.grouping:
+                full = _group_array(np, full)
+            full = np.where(full == '-0', '0', full)
+            text = text.astype(np.promote_types(text.dtype, full.dtype))
+            text[mask] = full
+        return text
+
+
+def _exponent_suffixes(np, exponents):
+    """Return 'e' and each exponent as text."""
+    if not len(exponents):
+        return np.zeros(0, dtype=str)
+    low = exponents.min()
+    return np.array([f'e{exponent}' for exponent in range(low, exponents.max() + 1)])[exponents - low]
+
+
+def _printf(np, formats, values):
+    """
+    Apply a %-format (or an array of them) to each value.
+
+    This is the one step done per element: np.char.mod makes a Python call
+    for each one too, and is slower than this.
+    """
+    if isinstance(formats, str):
+        return np.array([formats % value for value in values.tolist()], dtype=str)
+    return np.array([form % value for form, value in zip(formats.tolist(), values.tolist())], dtype=str)
+
+
+def _strip_zeros_array(np, text):
+    stripped = np.char.rstrip(np.char.rstrip(text, '0'), '.')
+    return np.where(np.char.find(text, '.') >= 0, stripped, text)
+
+
+def _group_array(np, text):
+    """_group for an array of positional numbers."""
+    negative = np.char.startswith(text, '-')
+    unsigned = np.where(negative, np.char.lstrip(text, '-'), text)
+    whole, point, rest = np.char.partition(unsigned, '.').T
+    # Only plain numbers are grouped, as in _group
+    plain = np.char.isdigit(whole)
+    # Right-align the integer parts to a multiple of three characters, then
+    # read them back three characters at a time
+    width = max(3, -(-int(np.char.str_len(whole).max(initial=1)) // 3) * 3)
+    chunks = np.char.rjust(whole, width).astype(f'<U{width}').view('<U3').reshape(len(whole), -1)
+    grouped = chunks[:, 0]
+    for column in range(1, chunks.shape[1]):
+        grouped = np.char.add(np.char.add(grouped, ','), chunks[:, column])
+    grouped = np.char.lstrip(grouped, ' ,')
+    result = np.char.add(np.char.add(np.where(negative, '-', ''), grouped), np.char.add(point, rest))
+    return np.where(plain, result, text)
@@ -0,0 +1,524 @@
+"""Generate the Grid 3 gridset for the calculator from its own tables.
+
+The Start grid has the keypad and the most used keys. The Functions grid
+has a button for every function in `Calculator.FUNCTIONS`, and the Symbols
+grid one for every symbol in `Calculator.MATH_SYMBOLS` that stands for a
+function, constant or x, so the buttons can't drift from what the calculator
+accepts. Every grid opens the calculator at the %FILEPATHTOREPLACE% URL,
+which the installer's CreateGridSet replaces with the local file path.
+
+The archive is streamed entry by entry and is byte-for-byte reproducible:
+entries are written in a fixed order with fixed timestamps and grid GUIDs.
+
+Usage:
+    python -m scicalc.gridset OUTPUT [--thumbnail PNG]
+"""
+import sys
+import uuid
+import zipfile
+from xml.sax.saxutils import escape
+
+from scicalc.calculator import Calculator
+
+URL_PLACEHOLDER = '%FILEPATHTOREPLACE%'
+
+COLUMNS = 9
+ROWS = 7
+# The EnterText keyboard is one column wider, for the ten keys of 'qwertyuiop'
+KEYBOARD_COLUMNS = 10
+# Buttons fill the rows below the calculator workspace
+FIRST_BUTTON_ROW = 3
+
+# Fixed entry timestamp (the earliest a zip can store) so builds are reproducible
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Namespace for grid GUIDs derived from grid names
+GRID_NAMESPACE = uuid.UUID('c2bfb002-d26d-49b7-82bc-abad702950ca')
+
+# Keys on the Start grid beside the keypad, row by row: a function name
+# inserts "name(", a constant or symbol inserts itself, and a (caption,
+# grid) pair jumps to another grid. Names are checked against the
+# calculator's tables when the gridset is built.
+START_KEYS = [
+    ['²', '³', '^', '(', ')'],
+    ['sqrt', 'cbrt', 'log', 'ln', '!'],
+    ['sin', 'cos', 'tan', 'e', 'EE'],
+    ['π', 'x', 'rad', ('Functions', 'Functions'), ('Symbols', 'Symbols')],
+]
+
+# The keypad, left of the operators
+KEYPAD = [
+    ['7', '8', '9'],
+    ['4', '5', '6'],
+    ['1', '2', '3'],
+    ['rand', '0', '.'],
+]
+
+# Keys typed as they are that aren't in the calculator's tables
+LITERAL_KEYS = frozenset('0123456789.()²³!%') | {'EE'}
+
+# Captions for keys whose text isn't a good label
+CAPTIONS = {'sqrt': '√', 'cbrt': '∛', '^': 'xʸ'}
+
+KEYBOARD_ROWS = ['qwertyuiop', 'asdfghjkl', 'zxcvbnm']
+
+STYLE_KEY = 'Vocab cell'
+STYLE_OPERATOR = 'style 1'
+STYLE_ACTION = 'Actions category style'
+STYLE_CONTROL = 'ComputerControl category style'
+STYLE_NAVIGATION = 'Navigation category style'
+
+SETTINGS_XML = '''<GridSetSettings xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <PictureSearch>
+    <PictureSearchKeys>
+      <PictureSearchKey>widgit</PictureSearchKey>
+      <PictureSearchKey>sstix#</PictureSearchKey>
+      <PictureSearchKey>mjpcs#</PictureSearchKey>
+      <PictureSearchKey>ssnaps</PictureSearchKey>
+    </PictureSearchKeys>
+  </PictureSearch>
+  <Appearance>
+    <Theme>Kids</Theme>
+  </Appearance>
+  <StartGrid>Start</StartGrid>
+  <Description>Scientific Calculator</Description>
+  <ThumbnailBackground>#FEF8E4FF</ThumbnailBackground>
+  <Thumbnail>.png</Thumbnail>
+  <ShowSymbols>0</ShowSymbols>
+  <GridSetFileFormatVersion>1</GridSetFileFormatVersion>
+</GridSetSettings>'''
+
+STYLES_XML = '''<StyleData xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <Styles>
+    <Style Key="Default" />
+    <Style Key="Vocab cell">
+      <BackColour>#75706BFF</BackColour>
+      <BorderColour>#646464FF</BorderColour>
+      <FontColour>#FFFFFFFF</FontColour>
+      <FontName>Segoe UI</FontName>
+      <FontSize>24</FontSize>
+    </Style>
+    <Style Key="Actions category style">
+      <BackColour>#D14841FF</BackColour>
+      <BorderColour>#D14841FF</BorderColour>
+      <FontColour>#FFFFFFFF</FontColour>
+    </Style>
+    <Style Key="style 1">
+      <Name>OrangeFN</Name>
+      <BackColour>#FBA026FF</BackColour>
+      <BorderColour>#FBA026FF</BorderColour>
+      <FontColour>#000000FF</FontColour>
+      <FontName>Dosis</FontName>
+      <FontSize>28</FontSize>
+    </Style>
+    <Style Key="ActionsEditing category style">
+      <BackColour>#2C82C9FF</BackColour>
+      <BorderColour>#2C82C9FF</BorderColour>
+      <FontColour>#FFFFFFFF</FontColour>
+    </Style>
+    <Style Key="Workspace">
+      <BackColour>#FFFFFFFF</BackColour>
+      <FontColour>#000000FF</FontColour>
+    </Style>
+    <Style Key="ComputerControl category style">
+      <BackColour>#54ACD2FF</BackColour>
+      <BorderColour>#54ACD2FF</BorderColour>
+      <FontColour>#FFFFFFFF</FontColour>
+    </Style>
+    <Style Key="Navigation category style">
+      <BackColour>#2C82C9FF</BackColour>
+      <BorderColour>#2C82C9FF</BorderColour>
+      <FontColour>#FFFFFFFF</FontColour>
+    </Style>
+  </Styles>
+</StyleData>'''
+
+WEB_BROWSER_XML = '''<WebBrowserExtensions xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <Extensions />
+</WebBrowserExtensions>'''
+
+
+def _file_map(thumbnail):
+    lines = ['<FileMap xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">', '  <Entries>']
+    if thumbnail:
+        lines += [
+            '    <Entry StaticFile="Settings0\\settings.xml">',
+            '      <DynamicFiles>',
+            '        <File>Settings0\\thumbnail.png</File>',
+            '      </DynamicFiles>',
+            '    </Entry>',
+        ]
+    lines += ['  </Entries>', '</FileMap>']
+    return '\r\n'.join(lines)
+
+
+class Cell:
+    """One button (or the calculator workspace) on a grid."""
+
+    def __init__(self, x, y, caption=None, commands=(), style=STYLE_KEY, image=None,
+                 font=None, column_span=1, row_span=1, workspace=False):
+        """
+        Args:
+            x, y: Column and row, from 0
+            caption: Label shown on the button
+            commands: (command id, [(parameter key, XML value)]) pairs
+            style: Grid 3 style the cell is based on
+            image: Optional Grid 3 symbol path
+            font: Optional font overriding the style's
+            column_span, row_span: Cells covered
+            workspace: True for the web browser showing the calculator
+        """
+        self.x = x
+        self.y = y
+        self.caption = caption
+        self.commands = commands
+        self.style = style
+        self.image = image
+        self.font = font
+        self.column_span = column_span
+        self.row_span = row_span
+        self.workspace = workspace
+
+    def xml_lines(self):
+        """Yield the lines of this cell's <Cell> element."""
+        attributes = ''
+        if self.x:
+            attributes += f' X="{self.x}"'
+        if self.y:
+            attributes += f' Y="{self.y}"'
+        if self.column_span > 1:
+            attributes += f' ColumnSpan="{self.column_span}"'
+        if self.row_span > 1:
+            attributes += f' RowSpan="{self.row_span}"'
+        yield f'    <Cell{attributes}>'
+        yield '      <Content>'
+        if self.workspace:
+            yield '        <ContentType>Workspace</ContentType>'
+            yield '        <ContentSubType>WebBrowser</ContentSubType>'
+        if self.commands:
+            yield '        <Commands>'
+            for command_id, parameters in self.commands:
+                if not parameters:
+                    yield f'          <Command ID="{command_id}" />'
+                    continue
+                yield f'          <Command ID="{command_id}">'
+                for key, value in parameters:
+                    # Grid 3 trims whitespace-only values unless told not to
+                    space = ' xml:space="preserve"' if value.isspace() else ''
+                    yield f'            <Parameter Key="{key}"{space}>{value}</Parameter>'
+                yield '          </Command>'
+            yield '        </Commands>'
+        if self.caption is not None or self.image:
+            yield '        <CaptionAndImage>'
+            if self.caption is not None:
+                yield f'          <Caption>{escape(self.caption)}</Caption>'
+            if self.image:
+                yield f'          <Image>{escape(self.image)}</Image>'
+            yield '        </CaptionAndImage>'
+        yield '        <Style>'
+        yield f'          <BasedOnStyle>{self.style}</BasedOnStyle>'
+        if self.workspace:
+            yield '          <BorderColour>#75706BFF</BorderColour>'
+        if self.font:
+            yield f'          <FontName>{self.font}</FontName>'
+        yield '        </Style>'
+        yield '      </Content>'
+        yield '    </Cell>'
+
+
+def insert_text(x, y, text, caption=None, style=STYLE_KEY):
+    """A button that types `text` into the calculator."""
+    value = f'\r\n              <r>{escape(text)}</r>\r\n            '
+    commands = [('Action.InsertText', [
+        ('indicatorenabled', '1'),
+        ('text', value),
+        ('showincelllabel', 'Yes'),
+    ])]
+    return Cell(x, y, caption if caption is not None else text, commands, style)
+
+
+def press_keys(x, y, keystring, caption, style=STYLE_KEY, image=None, font=None):
+    """A button that sends a Grid 3 keystring, e.g. {LEFT} or {LEFTCONTROL}p."""
+    return Cell(x, y, caption, [('ComputerControl.Keyboard', [('keystring', escape(keystring))])],
+                style, image, font)
+
+
+def jump(x, y, grid, caption):
+    """A button that opens another grid."""
+    return Cell(x, y, caption, [('Jump.To', [('grid', escape(grid))])], STYLE_NAVIGATION)
+
+
+def workspace(column_span=5):
+    """The web browser showing the calculator, in the top left corner."""
+    return Cell(0, 0, style='Workspace', column_span=column_span, row_span=FIRST_BUTTON_ROW,
+                workspace=True)
+
+
+def backspace(x, y):
+    return Cell(x, y, 'Backspace', [('Action.DeleteLetter', [])], STYLE_ACTION,
+                '[GRID3X]delete_letter.wmf', 'Medrano')
+
+
+def clear(x, y):
+    return press_keys(x, y, '{ESC}', 'Clear', STYLE_ACTION, '[grid3x]clear.wmf', 'Medrano')
+
+
+def back(x, y):
+    return Cell(x, y, 'Back', [('Jump.Back', [])], STYLE_NAVIGATION, '[GRID3X]jump_back.wmf')
+
+
+def cursor_keys(x, y):
+    """Left and right cursor buttons at (x, y) and (x + 1, y)."""
+    return [
+        press_keys(x, y, '{LEFT}', 'Left Cursor', STYLE_CONTROL, '[grid3x]arrow_left.wmf'),
+        press_keys(x + 1, y, '{RIGHT}', 'Right Cursor', STYLE_CONTROL, '[grid3x]arrow_right.wmf'),
+    ]
+
+
+def decimal_place_keys(x, y):
+    """Buttons setting 2, 5 and 10 decimal places (the calculator's Ctrl+digit shortcuts)."""
+    return [
+        press_keys(x, y, '{LEFTCONTROL}(d2)', '0.02', STYLE_CONTROL),
+        press_keys(x + 1, y, '{LEFTCONTROL}(d5)', '0.00005', STYLE_CONTROL),
+        press_keys(x + 2, y, '{LEFTCONTROL}(d10)', '0.000000010', STYLE_CONTROL),
+    ]
+
+
+def grid_xml(name, cells, columns=COLUMNS, rows=ROWS):
+    """Yield the lines of a grid's XML, which opens the calculator URL when shown."""
+    yield '<Grid xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+    yield f'  <GridGuid>{uuid.uuid5(GRID_NAMESPACE, name)}</GridGuid>'
+    yield '  <ColumnDefinitions>'
+    for _ in range(columns):
+        yield '    <ColumnDefinition />'
+    yield '  </ColumnDefinitions>'
+    yield '  <RowDefinitions>'
+    for _ in range(rows):
+        yield '    <RowDefinition />'
+    yield '  </RowDefinitions>'
+    yield '  <Commands>'
+    yield '    <Command ID="WebBrowser.NavigateUrl">'
+    yield f'      <Parameter Key="url">{URL_PLACEHOLDER}</Parameter>'
+    yield '    </Command>'
+    yield '  </Commands>'
+    yield '  <AutoContentCommands />'
+    yield '  <Cells>'
+    for cell in cells:
+        yield from cell.xml_lines()
+    yield '  </Cells>'
+    yield '  <ScanBlockAudioDescriptions />'
+    yield '  <WordList>'
+    yield '    <Items />'
+    yield '  </WordList>'
+    yield '</Grid>'
+
+
+def _key(x, y, key, calculator):
+    """The Start grid button for one entry of START_KEYS."""
+    if isinstance(key, tuple):
+        caption, grid = key
+        return jump(x, y, grid, caption)
+    if key in calculator.FUNCTIONS:
+        return insert_text(x, y, f'{key}(', CAPTIONS.get(key, key))
+    return insert_text(x, y, key, CAPTIONS.get(key))
+
+
+def start_cells(calculator=Calculator):
+    """The Start grid: calculator, controls, keypad and the START_KEYS."""
+    cells = [workspace(column_span=4)]
+    cells += decimal_place_keys(4, 0)
+    cells += [backspace(7, 0), clear(8, 0)]
+    cells += [press_keys(4, 1, '{UP}', 'Up', image='[grid3x]arrow_up.wmf')]
+    cells += cursor_keys(5, 1)
+    cells += [
+        jump(7, 1, 'EnterText', 'Text'),
+        insert_text(8, 1, '%'),
+        press_keys(4, 2, '{DOWN}', 'Down', image='[grid3x]arrow_down.wmf'),
+        press_keys(5, 2, '{LEFTCONTROL}p', 'M+'),
+        press_keys(6, 2, '{LEFTCONTROL}m', 'M-'),
+        press_keys(7, 2, '{LEFTCONTROL}r', 'MR'),
+        insert_text(8, 2, '/', style=STYLE_OPERATOR),
+    ]
+    for row, keys in enumerate(START_KEYS):
+        for column, key in enumerate(keys):
+            cells.append(_key(column, FIRST_BUTTON_ROW + row, key, calculator))
+
+    # Keypad, with the operators down the right-hand side
+    for row, keys in enumerate(KEYPAD):
+        for column, key in enumerate(keys):
+            cells.append(_key(5 + column, FIRST_BUTTON_ROW + row, key, calculator))
+    for row, operator in enumerate('*-+='):
+        cells.append(insert_text(8, FIRST_BUTTON_ROW + row, operator, style=STYLE_OPERATOR))
+    return cells
+
+
+def _page_cells(buttons, name, page, pages):
+    """One page of a grid of buttons, below the calculator and editing controls."""
+    cells = [workspace()]
+    cells += cursor_keys(5, 0)
+    cells += [backspace(7, 0), clear(8, 0)]
+    cells += [insert_text(5, 1, '('), insert_text(6, 1, ')'), back(7, 1)]
+    if page + 1 < pages:
+        cells.append(jump(8, 1, _page_name(name, page + 1), 'More'))
+    cells += [insert_text(5, 2, ','), insert_text(6, 2, '=', style=STYLE_OPERATOR)]
+    for i, (text, caption) in enumerate(buttons):
+        row, column = divmod(i, COLUMNS)
+        cells.append(insert_text(column, FIRST_BUTTON_ROW + row, text, caption))
+    return cells
+
+
+def _page_name(name, page):
+    return name if page == 0 else f'{name} {page + 1}'
+
+
+def paged_grids(name, buttons):
+    """
+    Split (text, caption) buttons over as many grids as they need.
+
+    Returns:
+        (grid name, cells) pairs; each page but the last links to the next
+    """
+    per_page = COLUMNS * (ROWS - FIRST_BUTTON_ROW)
+    pages = max(1, -(-len(buttons) // per_page))
+    return [
+        (_page_name(name, page), _page_cells(buttons[page * per_page:(page + 1) * per_page],
+                                             name, page, pages))
+        for page in range(pages)
+    ]
+
+
+def function_buttons(calculator=Calculator):
+    """A button inserting "name(" for every calculator function, sorted by name."""
+    return [(f'{name}(', name) for name in sorted(calculator.FUNCTIONS)]
+
+
+def symbol_buttons(calculator=Calculator):
+    """
+    A button for every symbol standing for a function, constant or x, then
+    one for each constant that has no symbol.
+    """
+    known = set(calculator.FUNCTIONS) | set(calculator.CONSTANTS) | {'x'}
+    buttons = []
+    covered = set()
+    for symbol, meaning in calculator.MATH_SYMBOLS.items():
+        if meaning in known and symbol != meaning:
+            buttons.append((symbol, symbol))
+            covered.add(meaning)
+    for name in calculator.CONSTANTS:
+        if name not in covered:
+            buttons.append((name, name))
+    return buttons
+
+
+def check_tables(calculator=Calculator):
+    """
+    Check that every key the gridset offers means something to the calculator.
+
+    Raises:
+        ValueError: Listing the FUNCTION_ALIASES targets and START_KEYS or
+            KEYPAD entries that aren't a function, constant or symbol
+    """
+    known = set(calculator.FUNCTIONS) | set(calculator.CONSTANTS) | {'x'}
+    unknown = [f"FUNCTION_ALIASES[{alias!r}] = {name!r}"
+               for alias, name in calculator.FUNCTION_ALIASES.items() if name not in known]
+    for keys in START_KEYS + KEYPAD:
+        for key in keys:
+            if isinstance(key, tuple) or key in known or key in calculator.MATH_SYMBOLS \
+                    or key in LITERAL_KEYS:
+                continue
+            unknown.append(f"key {key!r}")
+    if unknown:
+        raise ValueError("Not known to the calculator: " + ', '.join(unknown))
+
+
+def grids(calculator=Calculator):
+    """Return (grid name, cells, columns) for every grid in the gridset, Start first."""
+    check_tables(calculator)
+    pages = [('Start', start_cells(calculator))] + \
+        paged_grids('Functions', function_buttons(calculator)) + \
+        paged_grids('Symbols', symbol_buttons(calculator))
+    return [(name, cells, COLUMNS) for name, cells in pages] + \
+        [('EnterText', keyboard_cells(), KEYBOARD_COLUMNS)]
+
+
+def keyboard_cells():
+    """The EnterText grid: an on-screen keyboard for typing text into the calculator."""
+    cells = [workspace()]
+    cells += decimal_place_keys(5, 0)
+    cells += [backspace(8, 0), clear(9, 0)]
+    cells += [press_keys(5, 1, '{UP}', 'Up', image='[grid3x]arrow_up.wmf')]
+    cells += cursor_keys(6, 1)
+    cells += [back(8, 1), press_keys(5, 2, '{DOWN}', 'Down', image='[grid3x]arrow_down.wmf')]
+    for row, letters in enumerate(KEYBOARD_ROWS):
+        for column, letter in enumerate(letters):
+            cells.append(press_keys(column, FIRST_BUTTON_ROW + row, letter, letter.upper()))
+    cells.append(Cell(3, 6, commands=[('ComputerControl.Keyboard', [('keystring', ' ')])],
+                      column_span=4))
+    cells.append(Cell(9, 5, 'Enter', [('ComputerControl.Keyboard', [('keystring', '{ENTER}')])],
+                      image='[widgit]widgit rebus\\r\\return.emf', row_span=2))
+    return cells
+
+
+def _entry(name):
+    info = zipfile.ZipInfo(name, ZIP_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.create_system = 0
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def _write_lines(zout, name, lines):
+    """Stream XML lines into a new zip entry, with Grid 3's CRLF line endings."""
+    with zout.open(_entry(name), 'w') as f:
+        first = True
+        for line in lines:
+            if not first:
+                f.write(b'\r\n')
+            f.write(line.encode('utf-8'))
+            first = False
+
+
+def write_gridset(file, thumbnail=None, calculator=Calculator):
+    """
+    Write the gridset archive.
+
+    Args:
+        file: Path or writable binary file
+        thumbnail: Optional path of a PNG shown for the gridset in Grid 3
+        calculator: Calculator class whose tables the buttons come from
+
+    Raises:
+        ValueError: If the tables name something the calculator doesn't know
+    """
+    grid_list = grids(calculator)
+    with zipfile.ZipFile(file, 'w', zipfile.ZIP_DEFLATED) as zout:
+        for name, cells, columns in grid_list:
+            _write_lines(zout, f'Grids/{name}/grid.xml', grid_xml(name, cells, columns))
+        _write_lines(zout, 'Settings0/settings.xml', [SETTINGS_XML])
+        _write_lines(zout, 'Settings0/Styles/styles.xml', [STYLES_XML])
+        _write_lines(zout, 'Settings0/WebBrowser/webbrowserextensions.xml', [WEB_BROWSER_XML])
+        _write_lines(zout, 'FileMap.xml', [_file_map(thumbnail)])
+        if thumbnail:
+            with open(thumbnail, 'rb') as source, zout.open(_entry('Settings0/thumbnail.png'), 'w') as f:
+                for chunk in iter(lambda: source.read(1024 * 1024), b''):
+                    f.write(chunk)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m scicalc.gridset',
+                                     description='Build the Grid 3 gridset from the calculator tables.')
+    parser.add_argument('output', help='Gridset file to write')
+    parser.add_argument('--thumbnail', help='PNG shown for the gridset in Grid 3')
+    args = parser.parse_args(argv)
+    try:
+        write_gridset(args.output, args.thumbnail)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""Bounded history of calculations with prefix and substring recall.
+
+`History` keeps the newest `maxlen` entries in a ring buffer, with a sorted
+index for prefix search. With a `path`, every entry is also appended to a
+JSON-lines file, which is read back on a background thread so a long
+history doesn't delay start-up.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import deque, namedtuple
+
+logger = logging.getLogger(__name__)
+
+Entry = namedtuple('Entry', ['expression', 'normalized', 'result', 'timestamp'])
+
+
+def _to_json(entry):
+    result = entry.result
+    if not isinstance(result, (int, float)) or isinstance(result, bool):
+        # Decimals, Fractions and ± lists are stored as they are displayed
+        result = str(result)
+    return json.dumps({
+        'expression': entry.expression,
+        'normalized': entry.normalized,
+        'result': result,
+        'timestamp': entry.timestamp,
+    })
+
+
+def _from_json(line):
+    data = json.loads(line)
+    return Entry(data['expression'], data['normalized'], data['result'], data['timestamp'])
+
+
+class History:
+    """
+    Thread-safe ring buffer of past calculations.
+
+    Searches return the newest matches first. While a persisted history is
+    still loading, searches only see entries added since start-up; call
+    `wait_loaded()` to wait for the rest.
+    """
+
+    def __init__(self, maxlen=1000, path=None, clock=time.time):
+        """
+        Args:
+            maxlen: Most entries kept in memory
+            path: Optional JSON-lines file to load from and append to
+            clock: Function returning the timestamp for new entries
+        """
+        if maxlen < 1:
+            raise ValueError("maxlen must be at least 1")
+        self.maxlen = maxlen
+        self.path = path
+        self.clock = clock
+        self._lock = threading.Lock()
+        # Entries oldest first; entry number n is at index n - self._first
+        self._entries = deque()
+        self._first = 0
+        # Sorted (lowercase expression, entry number) pairs for prefix search
+        self._index = []
+        self._file = None
+        # Entries added while loading, written once the file has been read
+        self._pending = []
+        self._loaded = threading.Event()
+
+        if path is None:
+            self._loaded.set()
+        else:
+            threading.Thread(target=self._load, name='history-loader', daemon=True).start()
+
+    def add(self, expression, normalized, result):
+        """Record a calculation, dropping the oldest entry when full."""
+        entry = Entry(expression, normalized, result, self.clock())
+        with self._lock:
+            self._append(entry)
+            if self.path is not None:
+                if self._loaded.is_set():
+                    self._write(entry)
+                else:
+                    self._pending.append(entry)
+        return entry
+
+    def _append(self, entry):
+        if len(self._entries) == self.maxlen:
+            oldest = self._entries.popleft()
+            key = (oldest.expression.lower(), self._first)
+            del self._index[bisect_left(self._index, key)]
+            self._first += 1
+        number = self._first + len(self._entries)
+        self._entries.append(entry)
+        insort(self._index, (entry.expression.lower(), number))
+
+    def _write(self, entry):
+        try:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(_to_json(entry) + '\n')
+            self._file.flush()
+        except OSError as e:
+            logger.warning("Could not write history to %s: %s", self.path, e)
+
+    def _load(self):
+        loaded = deque(maxlen=self.maxlen)
+        lines = 0
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        loaded.append(_from_json(line))
+                    except (ValueError, KeyError, TypeError):
+                        # A line cut short by a crash; skip it
+                        continue
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Could not read history from %s: %s", self.path, e)
+
+        with self._lock:
+            # Entries added while loading are newer than anything on disk
+            added = list(self._entries)
+            self._entries.clear()
+            self._index.clear()
+            self._first = 0
+            for entry in list(loaded) + added:
+                self._append(entry)
+            # Keep the file from growing without bound
+            if lines > 2 * self.maxlen:
+                self._compact()
+            else:
+                for entry in self._pending:
+                    self._write(entry)
+            self._pending.clear()
+            self._loaded.set()
+
+    def _compact(self):
+        """Rewrite the file with only the entries in memory."""
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for entry in self._entries:
+                    f.write(_to_json(entry) + '\n')
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not compact history file %s: %s", self.path, e)
+
+    def wait_loaded(self, timeout=None):
+        """Block until a persisted history has been read. Returns False on timeout."""
+        return self._loaded.wait(timeout)
+
+    def recent(self, limit=None):
+        """Return up to `limit` entries, newest first."""
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        return entries if limit is None else entries[:limit]
+
+    def search(self, text, prefix=False, limit=None):
+        """
+        Find entries whose expression contains (or, with `prefix`, starts
+        with) `text`, ignoring case.
+
+        Returns:
+            Matching entries, newest first
+        """
+        text = text.lower()
+        with self._lock:
+            if prefix:
+                start = bisect_left(self._index, (text,))
+                numbers = []
+                for key, number in self._index[start:]:
+                    if not key.startswith(text):
+                        break
+                    numbers.append(number)
+                numbers.sort(reverse=True)
+                if limit is not None:
+                    numbers = numbers[:limit]
+                return [self._entries[n - self._first] for n in numbers]
+
+            matches = []
+            for entry in reversed(self._entries):
+                if text in entry.expression.lower():
+                    matches.append(entry)
+                    if limit is not None and len(matches) >= limit:
+                        break
+            return matches
+
+    def clear(self):
+        """Forget every entry, truncating the history file if there is one."""
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            self._first = 0
+            if self.path is not None:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                try:
+                    open(self.path, 'w').close()
+                except OSError as e:
+                    logger.warning("Could not clear history file %s: %s", self.path, e)
+
+    def close(self):
+        """Close the history file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        """Iterate over the entries, oldest first."""
+        return iter(self.recent()[::-1])
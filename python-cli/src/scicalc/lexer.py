@@ -0,0 +1,406 @@
+"""Single-pass tokenizer for calculator input.
+
+`tokenize` turns raw AAC input (Unicode operators, superscripts, roots, ...)
+into a flat token list in one scan. `normalize` then makes one pass over the
+tokens to apply the calculator's rewrite rules (roots, degrees, primes,
+subscript log bases, implicit multiplication and bracket auto-closing) and
+returns canonical tokens that `render` joins back into Python syntax.
+"""
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+Token = namedtuple('Token', ['kind', 'text'])
+
+# Token kinds
+NUMBER = 'NUMBER'
+NAME = 'NAME'
+OP = 'OP'
+LPAREN = 'LPAREN'
+RPAREN = 'RPAREN'
+COMMA = 'COMMA'
+PREFIX = 'PREFIX'          # Prefix function applied to the next operand (√, ∛, ±)
+POSTFIX = 'POSTFIX'        # Postfix function applied to the previous operand (°, ′)
+ROOT_INDEX = 'ROOT_INDEX'  # ʸ√: previous operand is the index of the following root
+SUBSCRIPT = 'SUBSCRIPT'    # Subscript digits, e.g. the base in log₂
+OTHER = 'OTHER'            # Passed through untouched (!, % and unknown characters)
+
+SUPERSCRIPT_DIGITS = dict(zip('⁰¹²³⁴⁵⁶⁷⁸⁹', '0123456789'))
+SUBSCRIPT_DIGITS = dict(zip('₀₁₂₃₄₅₆₇₈₉', '0123456789'))
+
+OPERATORS = {
+    '+': '+', '-': '-', '*': '*', '/': '/', '=': '=',
+    '×': '*', '∗': '*', '∙': '*',  # Multiplication variants
+    '÷': '/', '∕': '/', '⁄': '/',  # Division variants and fraction slash
+    '−': '-', '₋': '-', '⁻': '-',  # Minus variants
+    '⁺': '+', '₊': '+',  # Plus variants
+    '⁼': '=', '₌': '=',  # Equals variants
+    '^': '**', 'ʸ': '**', 'ˣ': '**',  # Powers
+}
+
+SYMBOL_NAMES = {
+    'π': 'pi', 'ϕ': 'phi', 'θ': 'theta', 'ϑ': 'theta',
+    'ϵ': 'epsilon', 'ϱ': 'rho', '∞': 'inf',
+}
+
+PREFIX_FUNCTIONS = {'√': 'sqrt', '∛': 'cbrt', '∜': 'root4', '±': 'pm'}
+
+# Postfix symbols and the function they apply, plus the name used when
+# there is no operand before them
+POSTFIX_FUNCTIONS = {
+    '°': ('rad', 'deg'),
+    '′': ('prime', 'prime'),
+    '″': ('prime2', 'prime2'),
+    '‴': ('prime3', 'prime3'),
+}
+
+# Every symbol above and the operator, bracket or name it stands for, for
+# listing what the calculator accepts (e.g. the gridset's symbol buttons)
+SYMBOLS = {
+    **{symbol: op for symbol, op in OPERATORS.items() if symbol != op},
+    '⁽': '(', '⁾': ')',
+    **PREFIX_FUNCTIONS,
+    'ʸ√': 'nthroot',
+    **SYMBOL_NAMES,
+    **{symbol: name for symbol, (_, name) in POSTFIX_FUNCTIONS.items()},
+}
+
+# Names that end in digits; any other letters followed by digits are an
+# implicit multiplication (x2 = x*2)
+NAMES_WITH_DIGITS = frozenset(['log2', 'log10', 'root4', 'prime2', 'prime3'])
+
+# Functions whose ⁻¹ form is the inverse function rather than a reciprocal
+INVERTIBLE_FUNCTIONS = frozenset(['sin', 'cos', 'tan', 'sinh', 'cosh', 'tanh'])
+
+DIGITS = '0123456789'
+
+
+# Most characters past the end of a token that tokenize looks at to decide
+# where it ends (the "EE+3" of "2EE+3"); an edit further away can't change it
+LOOKAHEAD = 4
+
+
+def tokenize(expression, aliases=None):
+    """Split an expression into tokens in a single left-to-right scan.
+
+    Args:
+        expression: Raw calculator input
+        aliases: Optional mapping of name spellings to canonical names
+    """
+    return _scan(expression, aliases or {}, 0, [], None)[0]
+
+
+def tokenize_with_offsets(expression, aliases=None):
+    """Like `tokenize`, but also return the input offset each token starts at."""
+    return _scan(expression, aliases or {}, 0, [], [])
+
+
+def retokenize(old, new, tokens, offsets, aliases=None):
+    """Tokenize `new` by rescanning only what follows its common prefix with `old`.
+
+    Args:
+        old: Input that `tokens` and `offsets` were produced from
+        new: Input to tokenize
+        tokens, offsets: Result of `tokenize_with_offsets(old)`
+        aliases: The aliases `old` was tokenized with
+
+    Returns:
+        (tokens, offsets) for `new`, as `tokenize_with_offsets` would give
+    """
+    common = 0
+    for a, b in zip(old, new):
+        if a != b:
+            break
+        common += 1
+    # Rescan from the last token that starts far enough before the edit
+    # that the tokens ahead of it can't have looked at the edited text
+    keep = bisect_right(offsets, common - LOOKAHEAD)
+    if not keep:
+        return tokenize_with_offsets(new, aliases)
+    # Superscripts give two tokens at one offset; rescan from the first
+    keep = bisect_left(offsets, offsets[keep - 1])
+    return _scan(new, aliases or {}, offsets[keep], tokens[:keep], offsets[:keep])
+
+
+def _scan(expression, aliases, i, tokens, offsets):
+    append = tokens.append
+    n = len(expression)
+    while i < n:
+        ch = expression[i]
+        if offsets is not None:
+            at, count = i, len(tokens)
+        if ch.isspace():
+            i += 1
+        elif ch in DIGITS or ch == '.':
+            start = i
+            while i < n and expression[i] in DIGITS:
+                i += 1
+            if i < n and expression[i] == '.':
+                i += 1
+                while i < n and expression[i] in DIGITS:
+                    i += 1
+            text = expression[start:i]
+            # Scientific notation: 2e3, 2E3 and the calculator key form 2EE3
+            if i < n and expression[i] in 'eE':
+                j = i + 2 if expression.startswith('EE', i) else i + 1
+                sign = ''
+                if j > i + 1 and j < n and expression[j] in '+-':
+                    sign = expression[j]
+                    j += 1
+                if j < n and expression[j] in DIGITS:
+                    k = j
+                    while k < n and expression[k] in DIGITS:
+                        k += 1
+                    text = f"{text}e{sign}{expression[j:k]}"
+                    i = k
+            append(Token(NUMBER, text))
+        elif ch.isascii() and (ch.isalpha() or ch == '_'):
+            start = i
+            while i < n and expression[i].isascii() and (expression[i].isalpha() or expression[i] == '_'):
+                i += 1
+            if i < n and expression[i] in DIGITS:
+                k = i
+                while k < n and expression[k] in DIGITS:
+                    k += 1
+                if expression[start:k] in NAMES_WITH_DIGITS:
+                    i = k
+            name = expression[start:i]
+            name = aliases.get(name, name)
+            if expression.startswith('⁻¹', i) and name in INVERTIBLE_FUNCTIONS:
+                name = 'a' + name
+                i += 2
+            append(Token(NAME, name))
+        elif ch in SUPERSCRIPT_DIGITS or (ch in '⁻⁺' and i + 1 < n and expression[i + 1] in SUPERSCRIPT_DIGITS):
+            # Superscripts are exponents: 2³ = 2**3, 2⁻¹ = 2**-1
+            sign = '-' if ch == '⁻' else ''
+            if ch in '⁻⁺':
+                i += 1
+            start = i
+            while i < n and expression[i] in SUPERSCRIPT_DIGITS:
+                i += 1
+            append(Token(OP, '**'))
+            append(Token(NUMBER, sign + ''.join(SUPERSCRIPT_DIGITS[c] for c in expression[start:i])))
+        elif ch in SUBSCRIPT_DIGITS:
+            start = i
+            while i < n and expression[i] in SUBSCRIPT_DIGITS:
+                i += 1
+            append(Token(SUBSCRIPT, ''.join(SUBSCRIPT_DIGITS[c] for c in expression[start:i])))
+        elif ch == '*' and expression.startswith('**', i):
+            append(Token(OP, '**'))
+            i += 2
+        elif ch == 'ʸ' and expression.startswith('ʸ√', i):
+            append(Token(ROOT_INDEX, 'nthroot'))
+            i += 2
+        elif ch in OPERATORS:
+            append(Token(OP, OPERATORS[ch]))
+            i += 1
+        elif ch in '(⁽':
+            append(Token(LPAREN, '('))
+            i += 1
+        elif ch in ')⁾':
+            append(Token(RPAREN, ')'))
+            i += 1
+        elif ch == ',':
+            append(Token(COMMA, ','))
+            i += 1
+        elif ch in SYMBOL_NAMES:
+            append(Token(NAME, SYMBOL_NAMES[ch]))
+            i += 1
+        elif ch in PREFIX_FUNCTIONS:
+            append(Token(PREFIX, PREFIX_FUNCTIONS[ch]))
+            i += 1
+        elif ch in POSTFIX_FUNCTIONS:
+            append(Token(POSTFIX, ch))
+            i += 1
+        else:
+            append(Token(OTHER, ch))
+            i += 1
+        if offsets is not None and len(tokens) != count:
+            offsets.extend([at] * (len(tokens) - count))
+    return tokens, offsets
+
+
+class _Frame:
+    """An open bracket awaiting its closing token."""
+    __slots__ = ('start', 'before_close', 'after_close', 'implicit')
+
+    def __init__(self, start, before_close=(), after_close=(), implicit=False):
+        self.start = start                # Index of the call name or bracket in the output
+        self.before_close = list(before_close)  # Tokens emitted before ')', e.g. a log base
+        self.after_close = list(after_close)    # Pending prefix closers to resume after ')'
+        self.implicit = implicit          # Closed only at the end of the input
+
+
+def normalize(tokens, group_multiplication=False):
+    """Apply the calculator rewrite rules to a token list in one pass.
+
+    Args:
+        tokens: Tokens from `tokenize`
+        group_multiplication: Also insert '*' after a closing bracket, so
+            (2)(3) and (2)3 multiply
+
+    Returns:
+        A list of canonical NUMBER, NAME, OP, LPAREN, RPAREN, COMMA and
+        OTHER tokens
+    """
+    out = []
+    prefixes = {}      # Output index -> tokens to insert before it
+    frames = []        # Open brackets
+    pending = []       # (closing tokens, start index) for prefix functions awaiting an operand
+    atom_start = None  # Start index of the operand that ends at len(out)
+    prev = None        # Kind of the last emitted item: 'number', 'name', 'call', 'close' or None
+
+    def emit(token):
+        out.append(token)
+
+    def wrap(start, name, closing):
+        prefixes.setdefault(start, []).extend([Token(NAME, name), Token(LPAREN, '(')])
+        out.extend(closing)
+
+    def open_prefix(name, closing, pos):
+        # Apply a prefix function to the next operand, reusing its bracket if it has one
+        nonlocal prev
+        start = len(out)
+        emit(Token(NAME, name))
+        if pos + 1 < len(tokens) and tokens[pos + 1].kind == LPAREN:
+            frames.append(_Frame(start, before_close=closing[:-1], after_close=pending))
+            pending.clear()
+            emit(Token(LPAREN, '('))
+            prev = None
+            return pos + 1
+        emit(Token(LPAREN, '('))
+        pending.append((closing, start))
+        prev = None
+        return pos
+
+    def finish_atom(start, pos, kind):
+        # An operand just ended: apply postfix functions, then close pending prefixes
+        nonlocal atom_start, prev
+        while pos + 1 < len(tokens) and tokens[pos + 1].kind == POSTFIX:
+            pos += 1
+            wrap(start, POSTFIX_FUNCTIONS[tokens[pos].text][0], [Token(RPAREN, ')')])
+            kind = 'close'
+        while pending:
+            closing, start = pending.pop()
+            out.extend(closing)
+            kind = 'close'
+        atom_start = start
+        prev = kind
+        return pos
+
+    def multiply_if(*kinds):
+        if prev in kinds:
+            emit(Token(OP, '*'))
+
+    pos = 0
+    while pos < len(tokens):
+        token = tokens[pos]
+        kind = token.kind
+        if kind == NUMBER:
+            multiply_if('name', *(('close',) if group_multiplication else ()))
+            start = len(out)
+            emit(token)
+            pos = finish_atom(start, pos, 'number')
+        elif kind == NAME:
+            multiply_if('number')
+            start = len(out)
+            nxt = tokens[pos + 1] if pos + 1 < len(tokens) else None
+            if token.text == 'log' and nxt is not None and nxt.kind == SUBSCRIPT:
+                # log₂(8) becomes logbase(8, 2)
+                closing = [Token(COMMA, ','), Token(NUMBER, nxt.text), Token(RPAREN, ')')]
+                pos = open_prefix('logbase', closing, pos + 1)
+            elif nxt is not None and nxt.kind == LPAREN:
+                emit(token)
+                prev = 'call'
+            else:
+                emit(token)
+                pos = finish_atom(start, pos, 'name')
+        elif kind == PREFIX:
+            multiply_if('number')
+            if token.text == 'pm' and not out and not frames:
+                # A leading ± applies to the whole expression
+                emit(Token(NAME, 'pm'))
+                emit(Token(LPAREN, '('))
+                frames.append(_Frame(0, implicit=True))
+                prev = None
+            else:
+                pos = open_prefix(token.text, [Token(RPAREN, ')')], pos)
+        elif kind == ROOT_INDEX:
+            if atom_start is not None and prev in ('number', 'name', 'close'):
+                # 3ʸ√27 becomes nthroot(27, 3): move the index operand after the radicand
+                index = []
+                for i in range(atom_start, len(out)):
+                    index.extend(prefixes.pop(i, ()))
+                    index.append(out[i])
+                del out[atom_start:]
+                pos = open_prefix('nthroot', [Token(COMMA, ',')] + index + [Token(RPAREN, ')')], pos)
+            else:
+                pos = open_prefix('sqrt', [Token(RPAREN, ')')], pos)
+        elif kind == POSTFIX:
+            # No operand before it, so use the plain function name
+            multiply_if('number')
+            start = len(out)
+            emit(Token(NAME, POSTFIX_FUNCTIONS[token.text][1]))
+            prev = 'call'
+        elif kind == LPAREN:
+            if prev != 'call':
+                multiply_if('number', *(('close',) if group_multiplication else ()))
+            start = len(out) - 1 if prev == 'call' else len(out)
+            frames.append(_Frame(start, after_close=pending))
+            pending.clear()
+            emit(token)
+            prev = None
+        elif kind == RPAREN:
+            if frames and not frames[-1].implicit:
+                frame = frames.pop()
+                out.extend(frame.before_close)
+                emit(token)
+                pending.extend(frame.after_close)
+                pos = finish_atom(frame.start, pos, 'close')
+            else:
+                emit(token)
+                prev = 'close'
+        elif kind == SUBSCRIPT:
+            multiply_if('name')
+            start = len(out)
+            emit(Token(NUMBER, token.text))
+            pos = finish_atom(start, pos, 'number')
+        else:
+            emit(token)
+            atom_start = None
+            prev = 'postfix' if token.text in '!%' else None
+        pos += 1
+
+    # Auto-close anything still open
+    while pending:
+        out.extend(pending.pop()[0])
+    while frames:
+        frame = frames.pop()
+        out.extend(frame.before_close)
+        out.append(Token(RPAREN, ')'))
+        for closing, _ in reversed(frame.after_close):
+            out.extend(closing)
+
+    if not prefixes:
+        return out
+    result = []
+    for i, token in enumerate(out):
+        if i in prefixes:
+            result.extend(prefixes[i])
+        result.append(token)
+    return result
+
+
+def render(tokens):
+    """Join canonical tokens back into an expression string."""
+    parts = []
+    prev = None
+    for token in tokens:
+        if token.kind == COMMA:
+            parts.append(', ')
+        else:
+            # Keep adjacent words apart so "2 3" doesn't become "23"
+            if prev in (NUMBER, NAME) and token.kind in (NUMBER, NAME):
+                parts.append(' ')
+            parts.append(token.text)
+        prev = token.kind
+    return ''.join(parts)
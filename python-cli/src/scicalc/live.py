@@ -0,0 +1,203 @@
+"""Incremental evaluation for live-as-you-type results.
+
+A `LiveSession` remembers what it last evaluated for one user. When the
+next keystroke arrives, only the input after the edit is lexed again (see
+`scicalc.lexer.retokenize`), and every subexpression that is unchanged
+reuses its compiled program and, unless it depends on x or a random number,
+its value. Requests carry a sequence number, counted separately for each
+page sending them, so that one overtaken by a newer keystroke is dropped
+instead of evaluated.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from scicalc.calculator import CacheInfo, _called
+from scicalc.evaluator import (DEADLINE, BinOp, Function, LimitExceeded, Name, Number, UnaryOp, combine,
+                               compile_tree, parse)
+from scicalc.lexer import normalize, render, retokenize
+from scicalc.metrics import error_category
+
+# Functions whose result can change between calls with the same arguments
+VOLATILE_FUNCTIONS = frozenset(['rand'])
+
+# Pages whose latest sequence number a session remembers
+MAX_PAGES = 32
+
+
+class StaleRequest(Exception):
+    """Raised for a request superseded by a newer one from the same session."""
+
+
+class LiveSession:
+    """
+    Per-session state for evaluating an expression as it is typed.
+
+    Results are the same as `Calculator.calculate`, but evaluating changes
+    nothing: not the last result or memory, and definitions are only
+    checked, not stored. Calculators with a numeric type other than float
+    are evaluated in full every time.
+    """
+
+    def __init__(self, calculator, cache_size=512):
+        """
+        Args:
+            calculator: Calculator providing functions, limits, x and rounding
+            cache_size: Number of compiled subexpressions to keep
+        """
+        self.calculator = calculator
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        # Highest sequence number seen from each page, least recent first,
+        # guarded by its own lock so a request can be marked stale while an
+        # older one holds self._lock
+        self._latest = OrderedDict()
+        self._seq_lock = threading.Lock()
+        # Input last tokenized, and its tokens and their offsets
+        self._input = ''
+        self._tokens = []
+        self._offsets = []
+        # LRU cache of subexpression key -> (program, constant)
+        self._programs = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def evaluate(self, expression, seq=None, page=None):
+        """
+        Evaluate the current input.
+
+        Args:
+            expression: The whole input as it now reads
+            seq: Optional number increasing with every request from `page`;
+                requests older than one already seen from it are dropped
+            page: Identifies the page (or other client) counting `seq`, so a
+                reloaded page or a second tab can start again from 0
+
+        Raises:
+            StaleRequest: If a request from `page` with a higher `seq` arrived first
+            ValueError: If the expression is invalid or exceeds one of the
+                calculator's limits (LimitExceeded)
+        """
+        if seq is not None:
+            with self._seq_lock:
+                latest = self._latest.get(page)
+                if latest is not None and seq < latest:
+                    raise StaleRequest(seq)
+                self._latest[page] = seq
+                self._latest.move_to_end(page)
+                if len(self._latest) > MAX_PAGES:
+                    self._latest.popitem(last=False)
+
+        calculator = self.calculator
+        if calculator._backend.name != 'float':
+            return calculator.calculate(expression, define=False)
+
+        with self._lock:
+            # A newer request may have arrived while this one waited
+            if seq is not None and seq < self._latest.get(page, seq):
+                raise StaleRequest(seq)
+            limits = calculator._limits
+            try:
+                limits.check_length(expression)
+                definition = calculator._definition(expression) if '=' in expression else None
+                if definition is not None:
+                    name, params, expression = definition
+                elif '=' in expression:
+                    expression = expression.split('=')[-1].strip()
+                source = self._normalize(expression)
+                tree = parse(source, limits.max_depth)
+                program = self._compile(tree)[0]
+                if definition is not None and params is not None:
+                    calculator._check_recursion(name, _called(tree))
+                    return Function(name, params, source, program)
+
+                variables = {**calculator._variables, 'x': calculator._last_result}
+                if limits.timeout is not None:
+                    variables[DEADLINE] = time.monotonic() + limits.timeout
+                result = program(variables)
+                if calculator._decimal_places is not None and isinstance(result, float):
+                    result = round(result, calculator._decimal_places)
+                return result
+            except Exception as e:
+                if calculator._metrics is not None:
+                    calculator._metrics.record_error(error_category(e))
+                if isinstance(e, LimitExceeded):
+                    raise
+                raise ValueError(f"Invalid expression: {calculator._backend.describe_error(e)}")
+
+    def _normalize(self, expression):
+        """Clean an expression as Calculator.clean_expression does, lexing only what changed."""
+        if not expression:
+            return expression
+        if expression.strip() == '1/x':
+            return 'reciprocal(x)'
+        aliases = self.calculator.FUNCTION_ALIASES
+        self._tokens, self._offsets = retokenize(self._input, expression, self._tokens,
+                                                 self._offsets, aliases)
+        self._input = expression
+        return self.calculator._handle_special_cases(render(normalize(self._tokens)))
+
+    def _compile(self, node):
+        """
+        Compile a syntax tree, reusing the programs of unchanged subtrees.
+
+        Returns:
+            (program, key, constant): the key identifies the subtree in the
+            cache, and constant is True if its value never changes
+        """
+        calculator = self.calculator
+        functions = calculator._backend.functions
+        constants = calculator._backend.constants
+        limits = calculator._limits
+
+        kind = type(node)
+        if kind is Number:
+            # Keep 1 and 1.0 apart, as they give different results
+            return (compile_tree(node, functions, constants, limits),
+                    (Number, type(node.value), node.value), True)
+        if kind is Name:
+            return compile_tree(node, functions, constants, limits), node, node.name in constants
+
+        if kind is UnaryOp:
+            children = (node.operand,)
+        elif kind is BinOp:
+            children = (node.left, node.right)
+        else:
+            children = node.args
+        compiled = [self._compile(child) for child in children]
+        key = (kind, node[0], tuple(child[1] for child in compiled))
+
+        cached = self._programs.get(key)
+        if cached is not None:
+            self._hits += 1
+            self._programs.move_to_end(key)
+            return cached[0], key, cached[1]
+
+        self._misses += 1
+        program = combine(node, [child[0] for child in compiled], functions, limits)
+        # Calls to user functions change when the function is redefined
+        constant = all(child[2] for child in compiled) and node[0] not in VOLATILE_FUNCTIONS \
+            and not isinstance(functions.get(node[0]), Function)
+        if constant:
+            program = _remember(program)
+        if self.cache_size:
+            self._programs[key] = (program, constant)
+            if len(self._programs) > self.cache_size:
+                self._programs.popitem(last=False)
+        return program, key, constant
+
+    def cache_info(self):
+        """Report compiled subexpression cache statistics."""
+        return CacheInfo(self._hits, self._misses, self.cache_size, len(self._programs))
+
+
+def _remember(program):
+    """Wrap a program that doesn't depend on its variables so it only runs once."""
+    value = []
+
+    def remembered(variables):
+        if not value:
+            # Nothing is stored if the program raises, so errors are raised every time
+            value.append(program(variables))
+        return value[0]
+    return remembered
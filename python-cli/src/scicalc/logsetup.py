@@ -0,0 +1,76 @@
+import atexit
+import logging
+import os
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DEFAULT_LEVEL = 'INFO'
+
+_listener = None
+
+
+def resolve_level(level=None):
+    """
+    Turn a level name or number into a logging level.
+
+    Falls back to the SCICALC_LOG_LEVEL environment variable and then INFO.
+    """
+    if level is None:
+        level = os.environ.get('SCICALC_LOG_LEVEL', DEFAULT_LEVEL)
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).upper())
+    if not isinstance(value, int):
+        raise ValueError(f"Unknown log level: {level}")
+    return value
+
+
+def configure_logging(handlers, level=None, use_queue=True):
+    """
+    Configure the root logger to write to the given handlers.
+
+    With `use_queue`, log calls only put the record on an in-memory queue and
+    a background QueueListener thread does the formatting and file I/O, so
+    request handling never waits on the disk.
+
+    Args:
+        handlers: Handlers that should receive log records
+        level: Level name or number (see `resolve_level`)
+        use_queue: Hand records to a background thread instead of writing inline
+    """
+    global _listener
+    level = resolve_level(level)
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    stop_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(level)
+
+    if use_queue:
+        # Imported here as logging.handlers pulls in socket, pickle and queue
+        from logging.handlers import QueueHandler, QueueListener
+        import queue
+        log_queue = queue.SimpleQueue()
+        root.addHandler(QueueHandler(log_queue))
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        for handler in handlers:
+            root.addHandler(handler)
+
+
+def stop_logging():
+    """Flush queued records and stop the background listener, if any."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
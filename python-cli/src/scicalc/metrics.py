@@ -0,0 +1,114 @@
+"""Opt-in timing and error counters for Calculator stages.
+
+Attach a `Metrics` to a Calculator (`Calculator(metrics=...)` or
+`Calculator.instrument()`) to record how long each stage of a calculation
+takes and why calculations fail. Without one, the calculator does no timing.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from scicalc.evaluator import LimitExceeded
+
+# Stages timed by Calculator, in pipeline order
+STAGES = ('normalize', 'special_cases', 'compile', 'eval', 'format_output')
+
+
+def error_category(error):
+    """Name the kind of failure an exception from a calculation represents."""
+    if isinstance(error, LimitExceeded):
+        return 'limit'
+    if isinstance(error, ZeroDivisionError):
+        return 'division_by_zero'
+    if isinstance(error, SyntaxError):
+        return 'syntax'
+    if isinstance(error, NameError):
+        return 'unknown_name'
+    if isinstance(error, OverflowError):
+        return 'overflow'
+    if isinstance(error, (ValueError, ArithmeticError)):
+        # math raises ValueError for arguments outside a function's domain
+        return 'domain'
+    return 'other'
+
+
+class Metrics:
+    """
+    Thread-safe per-stage durations and counts, and error counts by category.
+
+    One instance can be shared by many calculators, e.g. every web session.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._counts = {}
+        self._errors = {}
+
+    def record(self, stage, seconds):
+        """Add one run of `stage` that took `seconds`."""
+        with self._lock:
+            self._durations[stage] = self._durations.get(stage, 0.0) + seconds
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+
+    def record_error(self, category):
+        """Count one failed calculation in `category` (see `error_category`)."""
+        with self._lock:
+            self._errors[category] = self._errors.get(category, 0) + 1
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a with block as one run of stage `name`."""
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.record(name, self.clock() - start)
+
+    def snapshot(self):
+        """
+        Return a copy of the current counters.
+
+        Returns:
+            A dict with 'stages', mapping each stage to its 'count',
+            'total_seconds' and 'mean_seconds', and 'errors', mapping each
+            error category to its count
+        """
+        with self._lock:
+            stages = {
+                stage: {
+                    'count': self._counts[stage],
+                    'total_seconds': total,
+                    'mean_seconds': total / self._counts[stage],
+                }
+                for stage, total in self._durations.items()
+            }
+            return {'stages': stages, 'errors': dict(self._errors)}
+
+    def reset(self):
+        """Clear all counters."""
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+            self._errors.clear()
+
+    def to_prometheus(self, prefix='scicalc'):
+        """Render the counters in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = [
+            f'# HELP {prefix}_stage_duration_seconds Time spent in each calculation stage.',
+            f'# TYPE {prefix}_stage_duration_seconds summary',
+        ]
+        for stage, values in sorted(snapshot['stages'].items()):
+            lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{stage}"}} '
+                         f'{values["total_seconds"]!r}')
+            lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{stage}"}} {values["count"]}')
+        lines += [
+            f'# HELP {prefix}_errors_total Failed calculations by category.',
+            f'# TYPE {prefix}_errors_total counter',
+        ]
+        for category, count in sorted(snapshot['errors'].items()):
+            lines.append(f'{prefix}_errors_total{{category="{category}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
@@ -0,0 +1,228 @@
+"""Numeric backends: the number type a Calculator evaluates expressions in.
+
+    float     binary floats (the default, and the fastest)
+    decimal   decimal.Decimal at a configurable precision, so 0.1+0.2 == 0.3
+    fraction  fractions.Fraction, exact for +, -, *, / and integer powers
+
+A backend is applied when an expression is compiled: number literals,
+constants, operators and functions are swapped for versions in its number
+type, so evaluation carries no per-operation type checks. Functions with no
+exact form (trig, logarithms, ...) are computed in floating point. The
+decimal backend converts their result back to Decimal; the fraction backend
+leaves it a float, since the binary fraction it would become is exact only in
+appearance, and a float is rounded to the calculator's decimal places.
+"""
+import math
+import operator
+
+from scicalc.evaluator import Expression
+
+NUMERIC_TYPES = ('float', 'decimal', 'fraction')
+
+# Functions that already work on any number type
+EXACT_FUNCTIONS = frozenset(['abs', 'pm', 'prime', 'prime2', 'prime3', 'reciprocal'])
+
+
+def make_backend(numeric, functions, constants, precision=28):
+    """
+    Create the backend for a numeric type.
+
+    Args:
+        numeric: One of NUMERIC_TYPES
+        functions: The calculator's float function table
+        constants: The calculator's float constants
+        precision: Significant digits for the decimal backend
+
+    Raises:
+        ValueError: If `numeric` is not a known numeric type
+    """
+    if numeric == 'float':
+        return FloatBackend(functions, constants)
+    if numeric == 'decimal':
+        return DecimalBackend(functions, constants, precision)
+    if numeric == 'fraction':
+        return FractionBackend(functions, constants)
+    raise ValueError(f"Unknown numeric type: {numeric} (expected one of {', '.join(NUMERIC_TYPES)})")
+
+
+def _integer(value):
+    if value != int(value):
+        raise ValueError("factorial() only accepts integral values")
+    return int(value)
+
+
+def _through_float(func, convert=None):
+    """Wrap a float function so it takes any real arguments, and `convert` its results if given."""
+    if convert is None:
+        def call(*args):
+            return func(*[float(arg) for arg in args])
+    else:
+        def call(*args):
+            return convert(func(*[float(arg) for arg in args]))
+    return call
+
+
+class FloatBackend:
+    """Evaluate with Python ints and floats."""
+
+    name = 'float'
+    # Result types rounded to the calculator's decimal places
+    rounded_types = (float,)
+
+    def __init__(self, functions, constants):
+        # Copied, as user-defined functions are added to it
+        self.functions = dict(functions)
+        self.constants = constants
+
+    def compile(self, source, limits=None):
+        """Parse and compile a normalized expression for this backend."""
+        return Expression(source, self.functions, self.constants, limits)
+
+    def describe_error(self, error):
+        """Return the message to show for an error raised while evaluating."""
+        return str(error)
+
+
+class _ContextExpression(Expression):
+    """An Expression evaluated under its own decimal context."""
+    __slots__ = ('context', '_localcontext')
+
+    def evaluate(self, variables):
+        with self._localcontext(self.context):
+            return Expression.evaluate(self, variables)
+
+
+class DecimalBackend(FloatBackend):
+    """Evaluate with decimal.Decimal at `precision` significant digits."""
+
+    name = 'decimal'
+
+    def __init__(self, functions, constants, precision=28):
+        import decimal
+        self._decimal = decimal
+        self.context = decimal.Context(prec=precision)
+        Decimal = decimal.Decimal
+        self.rounded_types = (float, Decimal)
+
+        def to_decimal(value):
+            return Decimal(repr(value)) if isinstance(value, float) else value
+
+        def positive(method):
+            def call(x):
+                x = Decimal(x)
+                if x <= 0:
+                    raise ValueError("math domain error")
+                return method(x)
+            return call
+
+        def sqrt(x):
+            x = Decimal(x)
+            if x < 0:
+                raise ValueError("math domain error")
+            return x.sqrt()
+
+        table = {}
+        for name, func in functions.items():
+            table[name] = func if name in EXACT_FUNCTIONS else _through_float(func, to_decimal)
+        table.update(
+            sqrt=sqrt,
+            exp=lambda x: Decimal(x).exp(),
+            ln=positive(Decimal.ln),
+            log=positive(Decimal.log10),
+            root=lambda x, n: Decimal(x) ** (1 / Decimal(n)),
+            nthroot=lambda x, n: Decimal(x) ** (1 / Decimal(n)),
+            pow=pow,
+            factorial=lambda x: math.factorial(_integer(x)),
+        )
+        self.functions = table
+
+        self.constants = {name: to_decimal(value) for name, value in constants.items()}
+        with decimal.localcontext(self.context):
+            pi = _decimal_pi(decimal)
+            self.constants.update(
+                pi=pi, theta=pi, rho=pi,
+                e=Decimal(1).exp(),
+                phi=(1 + Decimal(5).sqrt()) / 2,
+            )
+
+    def compile(self, source, limits=None):
+        expression = _ContextExpression(source, self.functions, self.constants, limits,
+                                        number=self._decimal.Decimal)
+        expression.context = self.context
+        expression._localcontext = self._decimal.localcontext
+        return expression
+
+    def describe_error(self, error):
+        decimal = self._decimal
+        if isinstance(error, ZeroDivisionError):
+            return "division by zero"
+        if isinstance(error, decimal.Overflow):
+            return "result too large"
+        if isinstance(error, decimal.InvalidOperation):
+            return "math domain error"
+        return str(error)
+
+
+def _decimal_pi(decimal):
+    """Compute pi to the current decimal precision (recipe from the decimal docs)."""
+    context = decimal.getcontext()
+    context.prec += 2
+    three = decimal.Decimal(3)
+    lasts, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+    while s != lasts:
+        lasts = s
+        n, na = n + na, na + 8
+        d, da = d + da, da + 32
+        t = (t * n) / d
+        s += t
+    context.prec -= 2
+    return +s
+
+
+class FractionBackend(FloatBackend):
+    """
+    Evaluate with fractions.Fraction, exact except for functions with no exact form.
+
+    Inexact results (sin(1), sqrt(2), non-integer powers, pi) stay floats
+    rather than becoming the huge binary fraction of a float, so they are
+    rounded to the calculator's decimal places, and anything computed from
+    them is a float too.
+    """
+
+    name = 'fraction'
+    # Fractions are exact, so only inexact float results are rounded
+    rounded_types = (float,)
+
+    def __init__(self, functions, constants):
+        from fractions import Fraction
+        self._fraction = Fraction
+
+        def sqrt(x):
+            x = Fraction(x)
+            if x >= 0:
+                numerator, denominator = math.isqrt(x.numerator), math.isqrt(x.denominator)
+                if numerator * numerator == x.numerator and denominator * denominator == x.denominator:
+                    return Fraction(numerator, denominator)
+            return math.sqrt(x)
+
+        table = {}
+        for name, func in functions.items():
+            table[name] = func if name in EXACT_FUNCTIONS else _through_float(func)
+        table.update(
+            sqrt=sqrt,
+            # Fraction powers with a non-integer exponent come back as floats
+            root=lambda x, n: operator.pow(x, 1 / Fraction(n)),
+            nthroot=lambda x, n: operator.pow(x, 1 / Fraction(n)),
+            pow=operator.pow,
+            factorial=lambda x: math.factorial(_integer(x)),
+        )
+        self.functions = table
+        self.constants = constants
+
+    def compile(self, source, limits=None):
+        return Expression(source, self.functions, self.constants, limits, number=self._fraction)
+
+    def describe_error(self, error):
+        if isinstance(error, ZeroDivisionError):
+            return "division by zero"
+        return str(error)
@@ -0,0 +1,154 @@
+"""Asyncio pipeline that evaluates clipboard calculations off the watcher loop."""
+import asyncio
+import inspect
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scicalc.clipboard import ClipboardWatcher
+from scicalc.evaluator import Function
+
+logger = logging.getLogger(__name__)
+
+
+class PasteboardPipeline:
+    """
+    Read, evaluate and write back clipboard calculations as separate stages.
+
+    The reader stage keeps watching the clipboard while a calculation runs in
+    a worker thread. When newer content arrives first, the running calculation
+    is cancelled and its result is discarded; calculations that take longer
+    than `timeout` seconds are abandoned. Only a completed calculation updates
+    the calculator's last result and is written back to the clipboard.
+
+    A worker thread can't be stopped, so when an abandoned calculation is
+    still running its pool is retired and new calculations go to a fresh one.
+    The abandoned thread finishes on its own, or at the calculator's
+    `Limits.timeout` if one is set.
+    """
+
+    def __init__(self, calculator, clipboard=None, on_result=None, timeout=5.0, workers=2,
+                 **watcher_options):
+        """
+        Args:
+            calculator: Calculator used for evaluation
+            clipboard: Clipboard backend (defaults to the best one for this platform)
+            on_result: Optional hook called with (result, expression); may be a
+                coroutine function
+            timeout: Seconds before a calculation is abandoned
+            workers: Threads available for calculations
+            watcher_options: Polling options passed to ClipboardWatcher
+        """
+        self.calculator = calculator
+        self.watcher = ClipboardWatcher(clipboard, **watcher_options)
+        self.on_result = on_result
+        self.timeout = timeout
+        self._workers = workers
+        self._current = None
+        # Keeps a poll from seeing our own write before it is marked as seen
+        self._clipboard_lock = threading.Lock()
+        self._io = None
+        self._eval = None
+
+    async def run(self, stop_event=None):
+        """
+        Watch the clipboard until `stop_event` (a threading.Event) is set.
+        """
+        stop_event = stop_event or threading.Event()
+        # Calculations get their own pool so abandoned ones can't hold up clipboard I/O
+        self._io = ThreadPoolExecutor(max_workers=2, thread_name_prefix='pasteboard-io')
+        self._eval = self._eval_pool()
+        try:
+            await self._read(stop_event)
+        finally:
+            if self._current is not None and not self._current.done():
+                self._current.cancel()
+                try:
+                    await self._current
+                except asyncio.CancelledError:
+                    pass
+            self._io.shutdown(wait=False)
+            self._eval.shutdown(wait=False)
+
+    def _eval_pool(self):
+        return ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='pasteboard-eval')
+
+    def _abandon(self, future):
+        """Give up on a calculation's future, replacing the pool if its thread is still busy."""
+        if not future.cancel() and not future.done():
+            logger.debug("Retiring the calculation pool held by an abandoned calculation")
+            self._eval.shutdown(wait=False)
+            self._eval = self._eval_pool()
+
+    async def _read(self, stop_event):
+        loop = asyncio.get_running_loop()
+        clipboard = self.watcher.clipboard
+        while not stop_event.is_set():
+            content = await loop.run_in_executor(self._io, self._poll)
+            if content is not None:
+                self._submit(content)
+                continue
+
+            if clipboard.supports_events:
+                await loop.run_in_executor(self._io, clipboard.wait_for_change, self.watcher.max_interval)
+            else:
+                await asyncio.sleep(self.watcher.next_interval())
+
+    def _poll(self):
+        with self._clipboard_lock:
+            return self.watcher.poll()
+
+    def _write(self, content):
+        with self._clipboard_lock:
+            self.watcher.clipboard.copy(content)
+            self.watcher.ignore(content)
+
+    def _submit(self, content):
+        if content == self.calculator._last_pasteboard:
+            return
+        if self._current is not None and not self._current.done():
+            logger.debug("Cancelling stale calculation")
+            self._current.cancel()
+        self._current = asyncio.ensure_future(self._process(content))
+
+    async def _process(self, content):
+        loop = asyncio.get_running_loop()
+        calc = self.calculator
+        lines = content.strip().split('\n')
+        last_line = lines[-1].strip()
+
+        future = self._eval.submit(calc.calculate, last_line)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+        except ValueError:
+            # Not a valid calculation, just update last content
+            calc._last_pasteboard = content
+            return
+        except asyncio.TimeoutError:
+            self._abandon(future)
+            logger.warning("Calculation timed out after %ss: %s", self.timeout, last_line)
+            calc._last_pasteboard = content
+            return
+
+        if isinstance(result, Function):
+            # A function definition has no result to paste
+            calc._last_pasteboard = content
+            return
+
+        with calc._lock:
+            calc._last_expression = last_line
+            calc._last_result = result
+
+        # Update the last line with the result
+        lines[-1] = f"{last_line} = {result}"
+        new_content = '\n'.join(lines)
+        calc._last_pasteboard = new_content
+        await loop.run_in_executor(self._io, self._write, new_content)
+
+        if self.on_result:
+            outcome = self.on_result(result, last_line)
+            if inspect.isawaitable(outcome):
+                await outcome
@@ -0,0 +1,79 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionStore:
+    """
+    Bounded in-memory store of per-session state, such as a Calculator.
+
+    Sessions are kept in least-recently-used order. A session is evicted once
+    it has been idle for longer than `idle_timeout` seconds, or when the store
+    is full and room is needed for a new one.
+    """
+
+    def __init__(self, factory, max_sessions=1000, idle_timeout=1800, clock=time.monotonic):
+        """
+        Args:
+            factory: Callable creating the state for a new session
+            max_sessions: Maximum number of sessions kept at once
+            idle_timeout: Seconds of inactivity before a session is dropped
+            clock: Time source, replaceable for testing
+        """
+        self._factory = factory
+        self._max_sessions = max_sessions
+        self._idle_timeout = idle_timeout
+        self._clock = clock
+        self._sessions = OrderedDict()  # session id -> [state, last used]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_id() -> str:
+        """Generate an unguessable session id."""
+        return secrets.token_urlsafe(16)
+
+    def get(self, session_id):
+        """
+        Return the state for a session, creating it if it doesn't exist.
+
+        Returns:
+            (session id, state, created); the id is new if `session_id` was
+            None or had expired
+        """
+        now = self._clock()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(session_id) if session_id else None
+            if entry is not None:
+                entry[1] = now
+                self._sessions.move_to_end(session_id)
+                return session_id, entry[0], False
+
+            session_id = self.new_id()
+            state = self._factory()
+            self._sessions[session_id] = [state, now]
+            while len(self._sessions) > self._max_sessions:
+                self._sessions.popitem(last=False)
+            return session_id, state, True
+
+    def discard(self, session_id):
+        """Forget a session."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _evict_idle(self, now):
+        # Least recently used sessions are first, so stop at the first live one
+        while self._sessions:
+            session_id, (state, last_used) = next(iter(self._sessions.items()))
+            if now - last_used <= self._idle_timeout:
+                break
+            del self._sessions[session_id]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
@@ -0,0 +1,64 @@
+"""NumPy versions of the calculator functions, used by Calculator.evaluate_many.
+
+Kept apart from scicalc.calculator so numpy is only imported when an
+expression is evaluated over an array. Each function gives, element by
+element, what the scalar one gives, except that values outside its domain
+give nan instead of raising.
+"""
+import math
+
+import numpy as np
+
+
+def _factorial(value):
+    """Factorial of an integral float, nan outside its domain and inf past the float range."""
+    if not (math.isfinite(value) and value >= 0 and value == int(value)):
+        return math.nan
+    if value > 170:
+        return math.inf
+    return float(math.factorial(int(value)))
+
+
+def _pm(x):
+    raise ValueError("pm() gives two results, so it can't be evaluated over an array")
+
+# NumPy equivalents of Calculator.FUNCTIONS
+VECTOR_FUNCTIONS = {
+    'sin': lambda x: np.sin(np.radians(x)),
+    'cos': lambda x: np.cos(np.radians(x)),
+    'tan': lambda x: np.tan(np.radians(x)),
+    'asin': lambda x: np.degrees(np.arcsin(x)),
+    'acos': lambda x: np.degrees(np.arccos(x)),
+    'atan': lambda x: np.degrees(np.arctan(x)),
+    'sinh': np.sinh,
+    'cosh': np.cosh,
+    'tanh': np.tanh,
+    'asinh': np.arcsinh,
+    'acosh': np.arccosh,
+    'atanh': np.arctanh,
+    'sqrt': np.sqrt,
+    'cbrt': np.cbrt,
+    'root4': lambda x: np.power(x, 0.25),
+    'root': lambda x, n: np.power(x, 1 / np.asarray(n, dtype=float)),
+    'nthroot': lambda x, n: np.power(x, 1 / np.asarray(n, dtype=float)),
+    'pow': np.float_power,
+    'exp': np.exp,
+    'reciprocal': lambda x: np.divide(1.0, x),
+    'log': np.log10,
+    'ln': np.log,
+    'log2': np.log2,
+    'logbase': lambda x, base: np.log(x) / np.log(base),
+    'abs': np.abs,
+    'factorial': np.vectorize(_factorial, otypes=[float]),
+    'pm': _pm,
+    'prime': lambda x: x,
+    'prime2': np.square,
+    'prime3': lambda x: np.power(x, 3),
+    'rad': np.radians,
+    'deg': np.degrees,
+}
+
+
+def vector_functions(shape):
+    """Return VECTOR_FUNCTIONS with rand giving one random number per element of an array of `shape`."""
+    return {**VECTOR_FUNCTIONS, 'rand': lambda: np.random.random(shape)}
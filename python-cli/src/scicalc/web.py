@@ -1,12 +1,23 @@
-from flask import Flask, request, jsonify, send_file
+import click
+from flask import Flask, Response, request, jsonify, send_file, g
+from werkzeug.serving import make_server
 from scicalc.calculator import Calculator
+from scicalc.evaluator import Limits
+from scicalc.formatting import compile_format
+from scicalc.history import History
+from scicalc.live import StaleRequest
+from scicalc.metrics import Metrics
+from scicalc.logsetup import configure_logging
+from scicalc.sessions import SessionStore
+import functools
 import os
 import sys
 import webbrowser
 import signal
 import logging
+import threading
 
-def setup_logging():
+def setup_logging(level=None):
     if getattr(sys, 'frozen', False):
         base_dir = os.path.dirname(sys.executable)
     else:
@@ -16,14 +27,11 @@ def setup_logging():
     os.makedirs(log_dir, exist_ok=True)
     log_file = os.path.join(log_dir, 'calcweb.log')
     
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
-    )
+    # Records are written by a background thread so requests don't wait on file I/O
+    configure_logging([
+        logging.FileHandler(log_file),
+        logging.StreamHandler()
+    ], level)
 
 # Set up logging first
 setup_logging()
@@ -36,6 +44,50 @@ if DECIMAL_PLACES is not None:
     except ValueError:
         DECIMAL_PLACES = None
 
+# Number format for results (see scicalc.formatting), e.g. fixed:2,grouping
+try:
+    NUMBER_FORMAT = compile_format(os.environ.get('NUMBER_FORMAT', 'auto'))
+except ValueError as e:
+    logging.warning("Ignoring NUMBER_FORMAT: %s", e)
+    NUMBER_FORMAT = compile_format('auto')
+
+def _int_from_env(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def _float_from_env(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+# Session store limits
+MAX_SESSIONS = _int_from_env('MAX_SESSIONS', 1000)
+SESSION_IDLE_TIMEOUT = _int_from_env('SESSION_IDLE_TIMEOUT', 1800)
+SESSION_COOKIE = 'calc_session'
+
+# Calculations remembered per session for /history
+HISTORY_SIZE = _int_from_env('HISTORY_SIZE', 100)
+
+# Largest number of expressions accepted by /calculate/batch
+MAX_BATCH_SIZE = _int_from_env('MAX_BATCH_SIZE', 1000)
+RETURN_FORMATS = ('answer', 'answer,calc', 'full')
+
+# Limits on expressions from the browser; 0 disables a limit
+def _limit(value):
+    return value if value > 0 else None
+
+LIMITS = Limits(
+    max_length=_limit(_int_from_env('MAX_EXPRESSION_LENGTH', 1000)),
+    max_depth=_limit(_int_from_env('MAX_NESTING_DEPTH', 100)),
+    max_digits=_limit(_int_from_env('MAX_DIGITS', 1000)),
+    max_exponent=_limit(_int_from_env('MAX_EXPONENT', 10000)),
+    max_factorial=_limit(_int_from_env('MAX_FACTORIAL', 1000)),
+    timeout=_limit(_float_from_env('EVAL_TIMEOUT', 1.0)),
+)
+
 # Set up Flask to find templates
 if getattr(sys, 'frozen', False):
     # Running as compiled executable
@@ -45,7 +97,7 @@ else:
     # Use the package's template directory
     template_dir = os.path.join(os.path.dirname(__file__), 'templates')
 
-logging.info(f"Final template directory: {template_dir}")
+logging.info("Final template directory: %s", template_dir)
 if not os.path.exists(template_dir):
     raise FileNotFoundError(f"Cannot find templates directory at {template_dir}")
 
@@ -53,7 +105,7 @@ if not os.path.exists(template_dir):
 if os.path.exists(template_dir):
     logging.info("Template directory contents:")
     for file in os.listdir(template_dir):
-        logging.info(f"  - {file}")
+        logging.info("  - %s", file)
 
 # Initialize Flask with explicit template and static folders
 app = Flask(__name__)
@@ -62,12 +114,38 @@ app.static_folder = os.path.abspath(template_dir)    # Use same directory for st
 # Disable template caching
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 
-# Enable Flask debug logging
-logging.getLogger('flask').setLevel(logging.DEBUG)
-# Add Werkzeug debug logging
-logging.getLogger('werkzeug').setLevel(logging.DEBUG)
+# Stage timings and error counts from every session, served at /metrics
+METRICS = Metrics()
+
+# Each browser session gets its own calculator (last result, memory, decimal places)
+sessions = SessionStore(
+    lambda: Calculator(decimal_places=DECIMAL_PLACES, limits=LIMITS, metrics=METRICS,
+                       history=History(HISTORY_SIZE), number_format=NUMBER_FORMAT),
+    max_sessions=MAX_SESSIONS,
+    idle_timeout=SESSION_IDLE_TIMEOUT,
+)
+
+def uses_session(view):
+    """
+    Load the browser's session into g.calculator before running `view`.
 
-calculator = Calculator(decimal_places=DECIMAL_PLACES)
+    Only routes that need a calculator use this, so requests such as
+    /metrics scrapes and page loads don't create sessions and evict real ones.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.session_id, g.calculator, g.new_session = sessions.get(request.cookies.get(SESSION_COOKIE))
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.after_request
+def save_session(response):
+    # Sent on every response so the cookie expires after SESSION_IDLE_TIMEOUT
+    # of inactivity, like the session itself, rather than after creation
+    if getattr(g, 'session_id', None) is not None:
+        response.set_cookie(SESSION_COOKIE, g.session_id, max_age=SESSION_IDLE_TIMEOUT,
+                            httponly=True, samesite='Strict')
+    return response
 
 def signal_handler(sig, frame):
     logging.info('Shutting down calculator web server...')
@@ -78,7 +156,7 @@ def index():
     logging.info("Serving calculator.html")
     try:
         template_path = os.path.join(template_dir, 'calculator.html')
-        logging.debug(f"Full template path: {template_path}")
+        logging.debug("Full template path: %s", template_path)
         
         response = send_file(template_path)
         # Add cache control headers
@@ -87,20 +165,22 @@ def index():
         response.headers["Expires"] = "0"
         return response
     except Exception as e:
-        logging.error(f"Error serving template: {str(e)}")
+        logging.error("Error serving template: %s", e)
         logging.exception("Full traceback:")
         return f"Error: {str(e)}", 500
 
 @app.route('/calculate', methods=['POST'])
+@uses_session
 def calculate():
     data = request.get_json()
     expression = data.get('expression', '')
-    logging.info(f"Calculating with decimal places: {calculator._decimal_places}")
+    calculator = g.calculator
+    logging.debug("Calculating with decimal places: %s", calculator._decimal_places)
     try:
         result = calculator.evaluate(expression)
-        logging.info(f"Result before formatting: {result}")
+        logging.debug("Result before formatting: %s", result)
         # Format the result using the calculator's format_output method
-        formatted_result = calculator.format_output(result, "answer")
+        formatted_result = calculator.format_output(result, "answer", expression=expression)
         return jsonify({
             'success': True,
             'result': formatted_result,
@@ -112,24 +192,215 @@ def calculate():
             'error': str(e)
         })
 
+@app.route('/calculate/live', methods=['POST'])
+@uses_session
+def calculate_live():
+    """
+    Preview the result of an expression while it is being typed.
+    
+    Expects JSON with 'expression', 'seq', a number the page increases with
+    every request, and 'page', an id the page picks when it loads. Only the
+    changed part of the input is processed again, the last result is left
+    alone, and a request overtaken by one from the same page with a higher
+    'seq' is answered with 'stale' instead of evaluated.
+    """
+    data = request.get_json(silent=True) or {}
+    expression = data.get('expression', '')
+    seq = data.get('seq')
+    page = data.get('page')
+    if not isinstance(expression, str):
+        return jsonify({'success': False, 'error': "'expression' must be a string"}), 400
+    if seq is not None and (not isinstance(seq, int) or isinstance(seq, bool)):
+        return jsonify({'success': False, 'error': "'seq' must be an integer"}), 400
+    if page is not None and (not isinstance(page, str) or len(page) > 64):
+        return jsonify({'success': False, 'error': "'page' must be a string of at most 64 characters"}), 400
+    
+    calculator = g.calculator
+    try:
+        result = calculator.live().evaluate(expression, seq, page)
+        return jsonify({
+            'success': True,
+            'result': calculator.format_output(result, 'answer'),
+            'expression': expression,
+            'seq': seq
+        })
+    except StaleRequest:
+        return jsonify({'success': False, 'stale': True, 'seq': seq})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e), 'seq': seq})
+
+@app.route('/calculate/batch', methods=['POST'])
+@uses_session
+def calculate_batch():
+    """
+    Evaluate a list of expressions in order in one request.
+    
+    Expects JSON with 'expressions' (a list of strings) and optionally
+    'decimal_places', 'format' and 'return_format'. Expressions run through the
+    session's calculator, so x carries from one item to the next.
+    """
+    data = request.get_json(silent=True) or {}
+    expressions = data.get('expressions')
+    return_format = data.get('return_format', 'answer')
+    places = data.get('decimal_places', g.calculator._decimal_places)
+    spec = data.get('format')
+    
+    if not isinstance(expressions, list) or not all(isinstance(e, str) for e in expressions):
+        return jsonify({'success': False, 'error': "'expressions' must be a list of strings"}), 400
+    if len(expressions) > MAX_BATCH_SIZE:
+        return jsonify({'success': False, 'error': f"At most {MAX_BATCH_SIZE} expressions per batch"}), 400
+    if return_format not in RETURN_FORMATS:
+        return jsonify({'success': False, 'error': f"Invalid return format: {return_format}"}), 400
+    try:
+        places = int(places) if places is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid decimal places'}), 400
+    try:
+        number_format = compile_format(spec) if spec is not None else g.calculator._number_format
+    except (TypeError, ValueError, AttributeError):
+        return jsonify({'success': False, 'error': 'Invalid format'}), 400
+    
+    calculator = g.calculator
+    logging.debug("Calculating batch of %d expressions", len(expressions))
+    results = []
+    with calculator._lock:
+        # Apply the requested decimal places and format for this batch only
+        saved_places = calculator._decimal_places
+        saved_format = calculator._number_format
+        calculator._decimal_places = places
+        calculator._number_format = number_format
+        try:
+            for expression in expressions:
+                try:
+                    result = calculator.evaluate(expression)
+                    results.append({
+                        'success': True,
+                        'result': calculator.format_output(result, return_format),
+                        'expression': expression
+                    })
+                except ValueError as e:
+                    results.append({
+                        'success': False,
+                        'error': str(e),
+                        'expression': expression
+                    })
+        finally:
+            calculator._decimal_places = saved_places
+            calculator._number_format = saved_format
+    return jsonify({'success': True, 'results': results})
+
 @app.route('/decimals', methods=['POST'])
+@uses_session
 def set_decimals():
     data = request.get_json()
     places = data.get('places')
-    logging.info(f"Setting decimal places to: {places}")
+    calculator = g.calculator
+    logging.info("Setting decimal places to: %s", places)
     try:
         calculator._decimal_places = int(places) if places is not None else None
-        logging.info(f"Decimal places set to: {calculator._decimal_places}")
+        logging.info("Decimal places set to: %s", calculator._decimal_places)
         return jsonify({'success': True, 'places': calculator._decimal_places})
     except ValueError:
-        logging.error(f"Invalid decimal places value: {places}")
+        logging.error("Invalid decimal places value: %s", places)
         return jsonify({'success': False, 'error': 'Invalid decimal places'})
 
-def main():
+@app.route('/format', methods=['POST'])
+@uses_session
+def set_format():
+    """Set the session's number format from JSON {'format': spec}."""
+    data = request.get_json(silent=True) or {}
+    spec = data.get('format', 'auto')
+    try:
+        g.calculator._number_format = compile_format(spec)
+    except (TypeError, ValueError, AttributeError) as e:
+        logging.error("Invalid number format %r: %s", spec, e)
+        return jsonify({'success': False, 'error': f'Invalid format: {spec}'}), 400
+    logging.info("Number format set to: %s", g.calculator._number_format.spec)
+    return jsonify({'success': True, 'format': g.calculator._number_format.spec})
+
+@app.route('/history')
+@uses_session
+def history():
+    """
+    Recall the session's past calculations, newest first.
+    
+    Query parameters: 'q' to keep only expressions containing it, 'prefix'
+    (true/false) to match 'q' at the start instead, and 'limit'.
+    """
+    text = request.args.get('q', '')
+    prefix = request.args.get('prefix', 'false').lower() in ('1', 'true', 'yes')
+    try:
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid limit'}), 400
+    
+    store = g.calculator._history
+    entries = store.search(text, prefix=prefix, limit=limit) if text else store.recent(limit)
+    return jsonify({
+        'success': True,
+        'history': [
+            {
+                'expression': entry.expression,
+                'normalized': entry.normalized,
+                'result': g.calculator.format_output(entry.result, 'answer'),
+                'timestamp': entry.timestamp,
+            }
+            for entry in entries
+        ]
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Calculation stage timings and error counts in Prometheus text format."""
+    return Response(METRICS.to_prometheus(), mimetype='text/plain; version=0.0.4')
+
+def serve_app(host, port):
+    """
+    Run the app on a multi-threaded WSGI server until SIGINT or SIGTERM.
+    
+    In-flight requests are allowed to finish before the server exits.
+    """
+    server = make_server(host, port, app, threaded=True)
+    # Wait for request threads on close instead of killing them
+    server.daemon_threads = False
+    server.block_on_close = True
+    
+    def request_shutdown(sig, frame):
+        logging.info('Shutting down calculator web server...')
+        # shutdown() blocks until serve_forever() returns, so call it from another thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    
+    signal.signal(signal.SIGINT, request_shutdown)
+    signal.signal(signal.SIGTERM, request_shutdown)
+    
+    logging.info('Serving calculator on http://%s:%s', host, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+    logging.info('Calculator web server stopped')
+
+@click.command()
+@click.option('--serve', is_flag=True,
+              help='Run headless on a multi-threaded server without opening a browser')
+@click.option('--host', default='127.0.0.1', envvar='CALCWEB_HOST', show_default=True,
+              help='Interface to listen on')
+@click.option('--port', default=5000, type=int, envvar='CALCWEB_PORT', show_default=True,
+              help='Port to listen on')
+@click.option('--log-level', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR'], case_sensitive=False),
+              help='Logging level (default: SCICALC_LOG_LEVEL or INFO)')
+def main(serve, host, port, log_level):
+    """Scientific Calculator web interface."""
+    if log_level:
+        setup_logging(log_level)
+    
+    if serve:
+        serve_app(host, port)
+        return
+    
     signal.signal(signal.SIGINT, signal_handler)
     
-    port = 5000
-    logging.info(f'Starting calculator web server on port {port}...')
+    logging.info('Starting calculator web server on port %s...', port)
     
     # Open browser after a short delay
     webbrowser.open(f'http://127.0.0.1:{port}', new=2)
@@ -138,7 +409,7 @@ def main():
     debug_mode = not getattr(sys, 'frozen', False)
     
     # Run the server
-    app.run(host='127.0.0.1', port=port, debug=debug_mode)
+    app.run(host=host, port=port, debug=debug_mode)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -1,6 +1,9 @@
 import pytest
 from scicalc.calculator import Calculator
+from scicalc.evaluator import LimitExceeded, Limits
 import math
+from fractions import Fraction
+import numpy as np
 import unittest
 
 class TestCalculator(unittest.TestCase):
@@ -265,7 +268,7 @@ class TestCalculator(unittest.TestCase):
         # Test with 2 decimal places
         calc = Calculator(decimal_places=2)
         self.assertEqual(calc.format_output(3.14159, "answer"), "3.14")
-        self.assertEqual(calc.format_output(2.0, "answer"), "2.0")
+        self.assertEqual(calc.format_output(2.0, "answer"), "2")
         
         # Test with 4 decimal places
         calc = Calculator(decimal_places=4)
@@ -284,4 +287,199 @@ class TestCalculator(unittest.TestCase):
         
         calc = Calculator()  # No decimal limit
         result = calc.evaluate("22/7")
-        self.assertGreater(len(str(result).split('.')[1]), 4)  # Should have more decimals 
\ No newline at end of file
+        self.assertGreater(len(str(result).split('.')[1]), 4)  # Should have more decimals 
+
+    def test_compiled_cache(self):
+        calc = Calculator(cache_size=2)
+        assert calc.evaluate("2+2") == 4
+        assert calc.evaluate("2+2") == 4
+        info = calc.cache_info()
+        self.assertEqual((info.hits, info.misses, info.maxsize, info.currsize), (1, 1, 2, 1))
+        
+        # Least recently used entries are evicted
+        calc.evaluate("3*3")
+        calc.evaluate("4*4")
+        self.assertEqual(calc.cache_info().currsize, 2)
+        calc.evaluate("2+2")
+        self.assertEqual(calc.cache_info().misses, 4)
+        
+        calc.cache_clear()
+        self.assertEqual(calc.cache_info(), (0, 0, 2, 0))
+
+    def test_compiled_cache_uses_current_x(self):
+        calc = Calculator()
+        calc.evaluate("2")
+        assert calc.evaluate("1/x") == 0.5
+        calc.evaluate("4")
+        assert calc.evaluate("1/x") == 0.25
+        
+        # Caching can be disabled entirely
+        calc = Calculator(cache_size=0)
+        calc.evaluate("2+2")
+        self.assertEqual(calc.cache_info().currsize, 0)
+
+    def test_evaluate_many(self):
+        calc = Calculator()
+        xs = np.array([0.0, 30.0, 90.0])
+        result = calc.evaluate_many("sin(x)+x^2", x=xs)
+        expected = [calc.evaluate(f"sin({v})+{v}^2") for v in xs]
+        np.testing.assert_allclose(result, expected)
+        
+        np.testing.assert_allclose(calc.evaluate_many("∛x", x=[8, 27]), [2, 3])
+        np.testing.assert_allclose(calc.evaluate_many("log₂(x)", x=[8, 16]), [3, 4])
+        np.testing.assert_allclose(calc.evaluate_many("2+2", x=[1, 2]), [4, 4])
+        
+        # Domain errors become nan instead of raising
+        assert np.isnan(calc.evaluate_many("sqrt(x)", x=[-1, 4])[0])
+        with pytest.raises(ValueError):
+            calc.evaluate_many("invalid(x)", x=[1])
+
+
+VECTOR_CASES = {
+    'sin': ('sin({})', [0, 30, 90]), 'cos': ('cos({})', [0, 60]), 'tan': ('tan({})', [0, 45]),
+    'asin': ('asin({})', [0, 0.5, 1]), 'acos': ('acos({})', [0, 0.5, 1]), 'atan': ('atan({})', [0, 1]),
+    'sinh': ('sinh({})', [0, 2]), 'cosh': ('cosh({})', [0, 2]), 'tanh': ('tanh({})', [0, 2]),
+    'asinh': ('asinh({})', [0, 2]), 'acosh': ('acosh({})', [1, 2]), 'atanh': ('atanh({})', [0, 0.5]),
+    'sqrt': ('sqrt({})', [4, 2]), 'cbrt': ('cbrt({})', [27, -8, 2]), 'root4': ('root4({})', [16, 2]),
+    'root': ('root({}, 3)', [27, 2]), 'nthroot': ('nthroot({}, 4)', [16, 2]), 'pow': ('pow({}, -1)', [2, 4]),
+    'exp': ('exp({})', [0, 1]), 'reciprocal': ('reciprocal({})', [2, 4, -3]),
+    'log': ('log({})', [100, 2]), 'ln': ('ln({})', [1, 10]), 'log2': ('log2({})', [8, 3]),
+    'logbase': ('logbase({}, 3)', [9, 2]), 'abs': ('abs({})', [-2, 3]),
+    'factorial': ('factorial({})', [0, 5, 20]), 'prime': ('prime({})', [3]), 'prime2': ('prime2({})', [3]),
+    'prime3': ('prime3({})', [-3]), 'rad': ('rad({})', [180]), 'deg': ('deg({})', [1]),
+}
+
+
+@pytest.mark.parametrize("name", sorted(VECTOR_CASES))
+def test_vector_functions_match_scalar(name):
+    calc = Calculator()
+    template, values = VECTOR_CASES[name]
+    expected = [calc.evaluate(template.format(value)) for value in values]
+    np.testing.assert_allclose(calc.evaluate_many(template.format('x'), x=values), expected)
+    # Integer literals give the same results as float arrays
+    for value, scalar in zip(values, expected):
+        np.testing.assert_allclose(calc.evaluate_many(template.format(value), x=[0, 0]), [scalar, scalar])
+
+
+def test_vector_functions_cover_the_calculator():
+    assert set(VECTOR_CASES) | {'rand', 'pm'} == set(Calculator.FUNCTIONS)
+    calc = Calculator()
+    # Outside the domain the scalar function raises and the vector one gives nan
+    assert np.isnan(calc.evaluate_many("factorial(x)", x=[2.5, -1, 3])[:2]).all()
+    assert calc.evaluate_many("factorial(x)", x=[3.0, 171]).tolist() == [6.0, float('inf')]
+    randoms = calc.evaluate_many("rand()", x=np.zeros((50, 2)))
+    assert randoms.shape == (50, 2)
+    assert len(np.unique(randoms)) == 100 and ((randoms >= 0) & (randoms < 1)).all()
+    with pytest.raises(ValueError, match="two results"):
+        calc.evaluate_many("pm(x)", x=[1, 2])
+
+
+def test_limits():
+    calc = Calculator(limits=Limits(max_length=50, max_factorial=100))
+    for expression in ["9^9^9", "200!", "1+" * 30 + "1", "(" * 40 + "1" + ")" * 40]:
+        with pytest.raises(ValueError):
+            calc.calculate(expression)
+    assert calc.calculate("5!") == 120
+    # Long chains of powers hit the nesting limit rather than Python's recursion limit
+    with pytest.raises(LimitExceeded, match="nested"):
+        Calculator().calculate("1^" * 499 + "1")
+    # Arrays are held to the same limits
+    for expression in ["9^9^9", "x^20000", "factorial(x)"]:
+        with pytest.raises(LimitExceeded):
+            calc.evaluate_many(expression, x=[1, 200])
+    np.testing.assert_allclose(calc.evaluate_many("x^2 + factorial(x)", x=[1, 3]), [2, 15])
+    # Limits can be switched off
+    assert Calculator(limits=Limits(max_exponent=None, max_digits=None)).calculate("2^20000") == 2**20000
+
+
+def test_variables_and_functions():
+    calc = Calculator()
+    assert calc.evaluate("a = 3") == 3
+    assert calc.evaluate("a × 2") == 6
+    f = calc.evaluate("f(t) = t^2 + 1")
+    assert calc.format_output(f, "full") == "f(t) = t**2+1"
+    # Defining a function leaves x alone
+    assert calc.evaluate("x + f(2) + f(3)") == 21
+    assert calc.evaluate("g(u, v) = f(u) × v + a") is not None
+    assert calc.evaluate("g(2, 10)") == 53
+    
+    # Callers see a redefinition, including other functions
+    calc.evaluate("f(t) = t + 100")
+    assert calc.evaluate("g(2, 10)") == 1023
+    calc.evaluate("a = 0")
+    assert calc.evaluate("g(2, 10)") == 1020
+    
+    # Names that are taken keep their old meaning
+    assert calc.evaluate("x = 5") == 5
+    assert calc.evaluate("sin = 0.5") == 0.5
+    assert calc.evaluate("2 × 3 = 6") == 6
+    assert set(calc.definitions()) == {'a', 'f', 'g'}
+    
+    for expression in ["f(1, 2)", "f(t) = f(t) + 1", "h(t, t) = t", "h(2) = 3", "b + 1"]:
+        with pytest.raises(ValueError):
+            calc.calculate(expression)
+    calc.evaluate("f = 2")
+    with pytest.raises(ValueError, match="'f' is not defined"):
+        calc.calculate("g(1, 1)")
+    calc.clear_definitions()
+    assert calc.definitions() == {}
+
+
+def test_functions_cannot_recurse_through_others():
+    calc = Calculator()
+    calc.evaluate("f(t) = t")
+    calc.evaluate("g(t) = f(t) + 1")
+    calc.evaluate("h(t) = g(t) × 2")
+    with pytest.raises(ValueError, match=r"f\(\) can't call itself through g\(\)"):
+        calc.calculate("f(t) = g(t)")
+    with pytest.raises(ValueError, match=r"f\(\) can't call itself through h\(\)"):
+        calc.calculate("f(t) = h(t) - 1")
+    # The rejected definitions left f as it was
+    assert calc.evaluate("h(2)") == 6
+    # Calling the same function twice, or sharing a helper, is not a cycle
+    calc.evaluate("k(t) = g(t) + h(t) + f(t)")
+    assert calc.evaluate("k(1)") == 7
+
+
+def test_definitions_are_parsed_once(monkeypatch):
+    import scicalc.evaluator
+    parsed = []
+    parse = scicalc.evaluator.parse
+    monkeypatch.setattr(scicalc.evaluator, 'parse', lambda source, *args: parsed.append(source) or parse(source, *args))
+    
+    calc = Calculator()
+    calc.evaluate("f(t) = t^2 + 1")
+    assert calc.evaluate("f(2)+f(3)") == 15
+    assert calc.evaluate("f(2)+f(3)") == 15
+    assert calc.evaluate("f(4)") == 17
+    assert parsed == ["t**2+1", "f(2)+f(3)", "f(4)"]
+
+
+def test_definitions_in_other_number_types_and_arrays():
+    calc = Calculator(numeric='fraction')
+    calc.evaluate("h(t) = t/3")
+    assert calc.evaluate("h(1) + h(1)") == Fraction(2, 3)
+    
+    calc = Calculator()
+    calc.evaluate("a = 2")
+    calc.evaluate("k(t) = √t × a")
+    np.testing.assert_allclose(calc.evaluate_many("k(x) + a", x=[4, 9]), [6, 8])
+
+
+def test_slow_evaluations_do_not_block_other_threads():
+    import threading
+    import time
+
+    class SlowCalculator(Calculator):
+        FUNCTIONS = {**Calculator.FUNCTIONS, 'slow': lambda seconds: time.sleep(seconds) or seconds}
+
+    calc = SlowCalculator()
+    thread = threading.Thread(target=calc.evaluate, args=("slow(0.5)",))
+    thread.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    assert calc.evaluate("2+2") == 4
+    assert time.monotonic() - start < 0.3
+    thread.join()
+    # The slow evaluation finished last, so it set x
+    assert calc.evaluate("x") == 0.5
@@ -0,0 +1,65 @@
+import io
+import subprocess
+import sys
+from scicalc.calculator import Calculator
+from scicalc.cli import run_batch, run_parallel_batch
+
+
+def test_run_batch_streams_results_and_reports_errors():
+    out, err = io.StringIO(), io.StringIO()
+    lines = iter(["2+2\n", "\n", "invalid\n", "x*10\n"])
+    errors = run_batch(Calculator(), lines, "answer", out=out, err=err)
+    assert errors == 1
+    assert out.getvalue() == "4\n40\n"
+    assert err.getvalue().startswith("Line 3: invalid: Invalid expression")
+
+
+def test_run_batch_full_format():
+    out, err = io.StringIO(), io.StringIO()
+    run_batch(Calculator(), ["3*4"], "full", out=out, err=err)
+    assert out.getvalue() == "3*4 = 12\n"
+
+
+def test_run_parallel_batch_matches_sequential():
+    lines = ["2", "x*10", "invalid", "x+1", "5", "x*x", "1/0", "3!", "x+1"] * 20
+    expected_out, expected_err = io.StringIO(), io.StringIO()
+    expected_errors = run_batch(Calculator(), lines, "answer", out=expected_out, err=expected_err)
+    
+    out, err = io.StringIO(), io.StringIO()
+    errors = run_parallel_batch(lines, "answer", jobs=2, out=out, err=err, chunk_size=4)
+    assert errors == expected_errors
+    assert out.getvalue() == expected_out.getvalue()
+    assert err.getvalue() == expected_err.getvalue()
+
+
+def test_run_parallel_batch_keeps_definitions_in_order():
+    lines = ["a = 2", "f(t) = t × a", "5", "f(3)", "a = 10", "f(3)"] * 5
+    out, err = io.StringIO(), io.StringIO()
+    assert run_parallel_batch(lines, "answer", jobs=2, out=out, err=err, chunk_size=2) == 0
+    assert out.getvalue().splitlines()[:6] == ["2", "f(t) = t*a", "5", "6", "10", "30"]
+
+
+def test_run_parallel_batch_number_format():
+    out, err = io.StringIO(), io.StringIO()
+    run_parallel_batch(["1234.5", "x*2"], "answer", jobs=2, out=out, err=err, number_format='fixed:1,grouping')
+    assert out.getvalue() == "1,234.5\n2,469.0\n"
+
+
+def test_batch_keeps_logs_out_of_the_results():
+    result = subprocess.run([sys.executable, '-m', 'scicalc.cli', '--batch', '-', '--log-level', 'INFO'],
+                            input="2+2\n3*3\n", capture_output=True, text=True, check=True)
+    assert result.stdout == "2+2 = 4\n3*3 = 9\n"
+    assert "Starting batch mode" in result.stderr
+
+
+def test_single_expression_avoids_heavy_imports():
+    # Each AAC button press starts a new process, so these must stay lazy
+    code = (
+        "import sys\n"
+        "from scicalc.calculator import Calculator\n"
+        "import scicalc.cli\n"
+        "assert Calculator().evaluate('∛27+sin(30)') == 3.5\n"
+        "print(sorted(m for m in ('numpy', 'pyperclip', 'asyncio', 'concurrent.futures') if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
@@ -0,0 +1,177 @@
+import threading
+import time
+from scicalc.calculator import Calculator
+from scicalc.clipboard import ClipboardWatcher, FakeClipboard, PyperclipClipboard
+
+
+class PollingFakeClipboard(FakeClipboard):
+    """Fake clipboard without events or change tokens, like pyperclip."""
+    supports_events = False
+
+    def change_token(self):
+        return None
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_watcher_skips_reads_when_token_unchanged():
+    clipboard = FakeClipboard("2+2")
+    watcher = ClipboardWatcher(clipboard)
+    assert watcher.poll() == "2+2"
+    assert watcher.poll() is None
+    clipboard.copy("2+2")  # Same text copied again is not a new calculation
+    assert watcher.poll() is None
+    clipboard.copy("3*3")
+    assert watcher.poll() == "3*3"
+
+
+def test_watcher_backs_off_while_idle():
+    clipboard = PollingFakeClipboard("1")
+    watcher = ClipboardWatcher(clipboard, min_interval=0.001, max_interval=0.004, backoff=2)
+    stop = threading.Event()
+    changes = watcher.changes(stop)
+    assert next(changes) == "1"
+    
+    threading.Timer(0.05, clipboard.copy, args=("2",)).start()
+    assert next(changes) == "2"
+    # Idle polls grew the interval up to the cap, and the change reset it
+    assert watcher.interval == 0.001
+    stop.set()
+
+
+def test_watcher_backoff_is_capped():
+    watcher = ClipboardWatcher(PollingFakeClipboard("1"))
+    watcher.poll()
+    intervals = [watcher.next_interval() for _ in range(20)]
+    assert intervals[0] == watcher.min_interval
+    assert max(intervals) == 0.5
+
+
+def test_watcher_backs_off_with_change_tokens():
+    clipboard = FakeClipboard("1")
+    watcher = ClipboardWatcher(clipboard)
+    watcher.poll()
+    intervals = [watcher.next_interval() for _ in range(20)]
+    assert intervals[0] == watcher.min_interval
+    assert max(intervals) == watcher.max_interval
+    clipboard.copy("2")
+    assert watcher.poll() == "2"
+    assert watcher.next_interval() == watcher.min_interval
+
+
+def test_watch_pasteboard_with_fake_clipboard():
+    clipboard = FakeClipboard()
+    stop = threading.Event()
+    results = []
+    calc = Calculator()
+    thread = threading.Thread(
+        target=calc.watch_pasteboard,
+        kwargs={'callback': lambda result, line: results.append((line, result)),
+                'clipboard': clipboard, 'stop_event': stop},
+    )
+    thread.start()
+    try:
+        clipboard.copy("notes\n2+2")
+        assert wait_for(lambda: clipboard.paste() == "notes\n2+2 = 4")
+        clipboard.copy("not maths")
+        clipboard.copy("x*10")
+        assert wait_for(lambda: clipboard.paste() == "x*10 = 40")
+        assert results == [("2+2", 4), ("x*10", 40)]
+    finally:
+        stop.set()
+        clipboard.copy("")  # Wake the watcher
+        thread.join(2)
+    assert not thread.is_alive()
+
+
+def test_pyperclip_backend_has_no_change_token():
+    assert PyperclipClipboard().change_token() is None
+
+
+class SlowCalculator(Calculator):
+    FUNCTIONS = {**Calculator.FUNCTIONS, 'slow': lambda seconds: time.sleep(seconds) or seconds}
+
+
+def start_watching(calc, clipboard, **kwargs):
+    stop = threading.Event()
+    thread = threading.Thread(target=calc.watch_pasteboard,
+                              kwargs={'clipboard': clipboard, 'stop_event': stop, **kwargs})
+    thread.start()
+    
+    def finish():
+        stop.set()
+        clipboard.copy("")  # Wake the watcher
+        thread.join(2)
+        assert not thread.is_alive()
+    return finish
+
+
+def test_newer_content_cancels_stale_calculation():
+    clipboard = FakeClipboard()
+    results = []
+    calc = SlowCalculator()
+    finish = start_watching(calc, clipboard, callback=lambda result, line: results.append(line))
+    try:
+        clipboard.copy("slow(0.3)")
+        time.sleep(0.05)
+        clipboard.copy("2+2")
+        assert wait_for(lambda: clipboard.paste() == "2+2 = 4")
+        time.sleep(0.4)
+        # The slow result was discarded rather than written back
+        assert clipboard.paste() == "2+2 = 4"
+        assert results == ["2+2"]
+        assert calc._last_result == 4
+    finally:
+        finish()
+
+
+def test_slow_calculation_times_out():
+    clipboard = FakeClipboard()
+    calc = SlowCalculator()
+    finish = start_watching(calc, clipboard, timeout=0.05)
+    try:
+        clipboard.copy("slow(0.2)")
+        time.sleep(0.3)
+        assert clipboard.paste() == "slow(0.2)"
+        clipboard.copy("3*3")
+        assert wait_for(lambda: clipboard.paste() == "3*3 = 9")
+    finally:
+        finish()
+
+
+def test_timed_out_calculations_do_not_block_new_ones():
+    clipboard = FakeClipboard()
+    calc = SlowCalculator()
+    finish = start_watching(calc, clipboard, timeout=0.05)
+    try:
+        # More abandoned calculations than the pool has threads
+        for seconds in ("1", "1.01", "1.02"):
+            clipboard.copy(f"slow({seconds})")
+            time.sleep(0.15)
+        start = time.monotonic()
+        clipboard.copy("3*3")
+        assert wait_for(lambda: clipboard.paste() == "3*3 = 9", timeout=0.5)
+        assert time.monotonic() - start < 0.5
+    finally:
+        finish()
+
+
+def test_async_callback():
+    clipboard = FakeClipboard()
+    results = []
+
+    async def callback(result, line):
+        results.append(result)
+    finish = start_watching(Calculator(), clipboard, callback=callback)
+    try:
+        clipboard.copy("6*7")
+        assert wait_for(lambda: results == [42])
+    finally:
+        finish()
@@ -0,0 +1,180 @@
+import importlib.util
+import shutil
+import zipfile
+from pathlib import Path
+
+import pytest
+
+REPO = Path(__file__).resolve().parents[2]
+TEMPLATE = REPO / "resources" / "ScientificCalc.gridset"
+URL = "file:///C:/Users/A&B/AppData/Local/Ace%20Centre/calcstandalone.html?a=1&b=<2>"
+ESCAPED_PARAMETER = (b'<Parameter Key="url">file:///C:/Users/A&amp;B/AppData/Local/Ace%20Centre/'
+                     b'calcstandalone.html?a=1&amp;b=&lt;2&gt;</Parameter>')
+GRIDS = [f"Grids/{name}/grid.xml" for name in ("Start", "Functions", "Symbols", "EnterText")]
+
+spec = importlib.util.spec_from_file_location("CreateGridSet", REPO / "vanilla-html" / "CreateGridSet.py")
+CreateGridSet = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(CreateGridSet)
+
+
+def read_entries(path):
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        return {info.filename: (info, archive.read(info)) for info in archive.infolist()}
+
+
+def assert_patched(source_path, patched_path):
+    source = read_entries(source_path)
+    patched = read_entries(patched_path)
+    assert list(patched) == list(source)
+    for name, (info, data) in patched.items():
+        source_info, source_data = source[name]
+        assert info.compress_type == zipfile.ZIP_DEFLATED
+        if name in GRIDS:
+            assert CreateGridSet.URL_PLACEHOLDER not in data
+            assert ESCAPED_PARAMETER in data
+            assert data == source_data.replace(*CreateGridSet._url_parameters(URL))
+        else:
+            # Untouched entries are copied without being recompressed
+            assert data == source_data
+            assert (info.CRC, info.compress_size, info.date_time) == \
+                (source_info.CRC, source_info.compress_size, source_info.date_time)
+
+
+def test_patch_gridset(tmp_path):
+    destination = tmp_path / "out" / "ScientificCalc.gridset"
+    assert sorted(CreateGridSet.patch_gridset(TEMPLATE, destination, URL)) == sorted(GRIDS)
+    assert_patched(TEMPLATE, destination)
+
+
+def test_patch_gridset_in_place(tmp_path):
+    path = tmp_path / "ScientificCalc.gridset"
+    shutil.copy(TEMPLATE, path)
+    assert sorted(CreateGridSet.patch_gridset(path, path, URL)) == sorted(GRIDS)
+    assert_patched(TEMPLATE, path)
+    # The temporary file replaced the original rather than being left behind
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_patch_gridset_deflates_stored_entries(tmp_path):
+    source = tmp_path / "stored.gridset"
+    with zipfile.ZipFile(source, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr("Grids/Start/grid.xml", b'<Grid><Parameter Key="url">%FILEPATHTOREPLACE%</Parameter></Grid>')
+        archive.writestr("Settings0/settings.xml", b"<GridSetSettings />" * 100)
+    destination = tmp_path / "patched.gridset"
+    assert CreateGridSet.patch_gridset(source, destination, URL) == ["Grids/Start/grid.xml"]
+    entries = read_entries(destination)
+    assert entries["Settings0/settings.xml"][0].compress_type == zipfile.ZIP_DEFLATED
+    assert entries["Settings0/settings.xml"][1] == b"<GridSetSettings />" * 100
+    assert entries["Grids/Start/grid.xml"][1] == b"<Grid>" + ESCAPED_PARAMETER + b"</Grid>"
+
+
+def test_patch_gridset_failure_keeps_destination(tmp_path):
+    destination = tmp_path / "ScientificCalc.gridset"
+    destination.write_bytes(b"previous")
+    with pytest.raises(FileNotFoundError):
+        CreateGridSet.patch_gridset(tmp_path / "missing.gridset", destination, URL)
+    assert destination.read_bytes() == b"previous"
+    assert list(tmp_path.iterdir()) == [destination]
+
+
+def test_patch_gridsets(tmp_path):
+    jobs = [(TEMPLATE, tmp_path / f"{index}.gridset", URL) for index in range(4)]
+    jobs.append((tmp_path / "missing.gridset", tmp_path / "missing-out.gridset", URL))
+    results = CreateGridSet.patch_gridsets(jobs, max_workers=3)
+    for result, (_, destination, _) in zip(results[:4], jobs):
+        assert sorted(result) == sorted(GRIDS)
+        assert_patched(TEMPLATE, destination)
+    assert isinstance(results[4], FileNotFoundError)
+
+
+def write_manifest(path, text):
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def test_read_manifest(tmp_path):
+    manifest = write_manifest(tmp_path / "manifest.csv",
+                              "\ufefftarget,url,notes\n a.gridset , file:///a.html ,x\nb.gridset,file:///b.html,\n")
+    assert CreateGridSet.read_manifest(manifest) == [("a.gridset", "file:///a.html"), ("b.gridset", "file:///b.html")]
+
+
+@pytest.mark.parametrize("text, message", [
+    ("target\na.gridset\n", "missing column(s): url"),
+    ("", "missing column(s): target, url"),
+    ("target,url\na.gridset,file:///a.html\nb.gridset,\n", "line 3"),
+    ("target,url\na.gridset\n", "line 2"),
+    ("target,url\n ,file:///a.html\n", "line 2"),
+])
+def test_read_manifest_rejects_bad_rows(tmp_path, text, message):
+    with pytest.raises(ValueError, match=message.replace("(", r"\(").replace(")", r"\)")):
+        CreateGridSet.read_manifest(write_manifest(tmp_path / "manifest.csv", text))
+
+
+def test_provision(tmp_path):
+    jobs = [(str(tmp_path / f"user{index}" / "ScientificCalc.gridset"), f"{URL}&user={index}") for index in range(3)]
+    report = CreateGridSet.provision(TEMPLATE, jobs, max_workers=2)
+    assert (report["written"], report["unchanged"], report["failed"], report["errors"]) == (3, 0, 0, [])
+    assert report["bytes"] == sum(Path(target).stat().st_size for target, _ in jobs)
+    for target, url in jobs:
+        # Each copy matches what patch_gridset writes for the same URL
+        expected = tmp_path / "expected.gridset"
+        CreateGridSet.patch_gridset(TEMPLATE, expected, url)
+        assert read_entries(target).keys() == read_entries(expected).keys()
+        assert [data for _, data in read_entries(target).values()] == \
+            [data for _, data in read_entries(expected).values()]
+
+    modified = [Path(target).stat().st_mtime_ns for target, _ in jobs]
+    report = CreateGridSet.provision(TEMPLATE, jobs)
+    assert (report["written"], report["unchanged"], report["failed"], report["bytes"]) == (0, 3, 0, 0)
+    assert [Path(target).stat().st_mtime_ns for target, _ in jobs] == modified
+
+    # A changed URL rewrites only that target
+    jobs[1] = (jobs[1][0], URL)
+    report = CreateGridSet.provision(TEMPLATE, jobs)
+    assert (report["written"], report["unchanged"]) == (1, 2)
+    assert ESCAPED_PARAMETER in read_entries(jobs[1][0])["Grids/Start/grid.xml"][1]
+
+
+def test_provision_rejects_patched_templates(tmp_path):
+    # The installer patches the APPDATA copy in place for the installing user
+    patched = tmp_path / "installed.gridset"
+    CreateGridSet.patch_gridset(TEMPLATE, patched, URL)
+    target = tmp_path / "user" / "ScientificCalc.gridset"
+    with pytest.raises(ValueError, match="already have been patched"):
+        CreateGridSet.provision(patched, [(str(target), "file:///other.html")])
+    assert not target.exists()
+
+
+def test_manifest_defaults_to_the_unpatched_template(tmp_path, monkeypatch, capsys):
+    assert Path(CreateGridSet.default_template()).resolve() == TEMPLATE
+    monkeypatch.setattr(CreateGridSet, "log_path", str(tmp_path / "log.txt"))
+    monkeypatch.setenv("APPDATA", str(tmp_path))
+    target = tmp_path / "out" / "ScientificCalc.gridset"
+    manifest = write_manifest(tmp_path / "manifest.csv", f"target,url\n{target},{URL}\n")
+    assert CreateGridSet.main(["--manifest", str(manifest)]) == 0
+    assert_patched(TEMPLATE, target)
+
+
+def test_provision_reports_failures(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("not a directory")
+    jobs = [(str(blocker / "ScientificCalc.gridset"), URL), (str(tmp_path / "ok.gridset"), URL)]
+    report = CreateGridSet.provision(TEMPLATE, jobs)
+    assert (report["written"], report["failed"]) == (1, 1)
+    assert report["errors"][0][0] == jobs[0][0]
+    assert isinstance(report["errors"][0][1], OSError)
+    assert "1 written, 0 unchanged, 1 failed" in CreateGridSet.format_report(report)
+
+
+def test_main_with_manifest(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(CreateGridSet, "log_path", str(tmp_path / "log.txt"))
+    target = tmp_path / "out" / "ScientificCalc.gridset"
+    manifest = write_manifest(tmp_path / "manifest.csv", f"target,url\n{target},{URL}\n")
+    assert CreateGridSet.main(["--manifest", str(manifest), "--template", str(TEMPLATE)]) == 0
+    assert "1 written" in capsys.readouterr().out
+    assert_patched(TEMPLATE, target)
+    write_manifest(manifest, f"target,url\n{tmp_path / 'file.txt' / 'x.gridset'},{URL}\n")
+    (tmp_path / "file.txt").write_text("")
+    assert CreateGridSet.main(["--manifest", str(manifest), "--template", str(TEMPLATE)]) == 1
+    assert "Failed:" in capsys.readouterr().err
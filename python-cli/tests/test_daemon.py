@@ -0,0 +1,92 @@
+import socket
+import threading
+import pytest
+from scicalc import daemon
+
+needs_unix_sockets = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="needs Unix domain sockets")
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / 'scicalc.sock')
+    server = daemon.make_server(path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@needs_unix_sockets
+def test_request_keeps_state_between_calls(server):
+    assert daemon.request("2+2", "full", server) == "2+2 = 4"
+    assert daemon.request("x*10", "answer", server) == "40"
+    with pytest.raises(ValueError, match="division by zero"):
+        daemon.request("1/0", "answer", server)
+    # A failed calculation leaves the last result alone
+    assert daemon.request("x+1", "answer", server) == "41"
+
+
+@needs_unix_sockets
+def test_rejects_bad_requests(server):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(server)
+        sock.sendall(b'not json\n')
+        assert b'Invalid request' in sock.makefile('rb').readline()
+    with pytest.raises(ValueError, match="Invalid return format"):
+        daemon.request("2+2", "xml", server)
+
+
+@needs_unix_sockets
+def test_request_format(server):
+    assert daemon.request("2/3", "answer", server, number_format="fixed:3") == "0.667"
+    # Only that request is affected
+    assert daemon.request("x", "answer", server) == "0.6666666666666666"
+    with pytest.raises(ValueError, match="Invalid format"):
+        daemon.request("2+2", "answer", server, number_format="bogus")
+
+
+@needs_unix_sockets
+def test_refuses_to_replace_a_running_daemon(server):
+    with pytest.raises(RuntimeError, match="already listening"):
+        daemon.make_server(server)
+
+
+@needs_unix_sockets
+def test_client_falls_back_without_daemon(tmp_path, capsys):
+    missing = str(tmp_path / 'missing.sock')
+    with pytest.raises(OSError):
+        daemon.request("2+2", path=missing)
+    assert daemon.client_main(["2+2", "--return", "answer", "--socket", missing]) == 0
+    assert capsys.readouterr().out == "4\n"
+    assert daemon.client_main(["1/0", "--socket", missing]) == 1
+
+
+@needs_unix_sockets
+def test_replaces_stale_socket(tmp_path):
+    path = str(tmp_path / 'scicalc.sock')
+    # A daemon that died without removing its socket file
+    daemon.make_server(path).server_close()
+    server = daemon.make_server(path)
+    server.server_close()
+
+
+def test_without_unix_sockets(monkeypatch, capsys):
+    # As on Windows
+    monkeypatch.delattr(socket, 'AF_UNIX', raising=False)
+    with pytest.raises(OSError):
+        daemon.request("2+2")
+    assert daemon.client_main(["2+2", "--return", "answer"]) == 0
+    assert capsys.readouterr().out == "4\n"
+    with pytest.raises(RuntimeError, match="Unix domain sockets"):
+        daemon.make_server("unused.sock")
+
+    from click.testing import CliRunner
+    from scicalc.cli import main
+    result = CliRunner().invoke(main, ["--daemon"])
+    assert result.exit_code == 2
+    assert "not supported on this platform" in result.output
+    result = CliRunner().invoke(main, ["--client", "--return", "answer", "2+2"])
+    assert result.exit_code == 0
+    assert result.output.splitlines()[-1] == "4"
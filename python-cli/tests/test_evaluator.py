@@ -0,0 +1,69 @@
+import math
+import pytest
+from scicalc.evaluator import BinOp, Call, Expression, LimitExceeded, Limits, Name, Number, UnaryOp, parse
+
+FUNCTIONS = {'sqrt': math.sqrt, 'max': max, 'factorial': math.factorial, 'pow': pow}
+CONSTANTS = {'pi': math.pi}
+
+
+def test_parse_precedence():
+    assert parse("2+3*4") == BinOp('+', Number(2), BinOp('*', Number(3), Number(4)))
+    assert parse("-2**2") == UnaryOp('-', BinOp('**', Number(2), Number(2)))
+    assert parse("2**3**2") == BinOp('**', Number(2), BinOp('**', Number(3), Number(2)))
+    assert parse("max(1, x)") == Call('max', (Number(1), Name('x')))
+    assert parse("1.5e2") == Number(150.0)
+
+
+@pytest.mark.parametrize("expression", ["", "2+", "(2)(3)", "2 3", "sqrt(4", "2!", "__import__('os')"])
+def test_parse_errors(expression):
+    with pytest.raises(SyntaxError):
+        parse(expression)
+
+
+def test_expression_is_reusable():
+    expr = Expression("sqrt(x)*pi", FUNCTIONS, CONSTANTS)
+    assert expr.evaluate({'x': 4}) == pytest.approx(2 * math.pi)
+    assert expr.evaluate({'x': 9}) == pytest.approx(3 * math.pi)
+    assert Expression("max(1, 2, x)", FUNCTIONS, CONSTANTS).evaluate({'x': 5}) == 5
+
+
+def test_unknown_names():
+    with pytest.raises(NameError):
+        Expression("open(1)", FUNCTIONS, CONSTANTS)
+    with pytest.raises(NameError):
+        Expression("y+1", FUNCTIONS, CONSTANTS).evaluate({'x': 1})
+
+
+@pytest.mark.parametrize("expression, message", [
+    ("2**2**2**2**2", "Exponent"),
+    ("pow(2, 100000)", "Exponent"),
+    ("(10**60)**2", "too large"),
+    ("10**60*10**60", "too large"),
+    ("factorial(200)", "Factorial"),
+    ("1" * 101, "too large"),
+])
+def test_limits(expression, message):
+    limits = Limits(max_digits=100, max_exponent=1000, max_factorial=100)
+    with pytest.raises(LimitExceeded, match=message):
+        Expression(expression, FUNCTIONS, CONSTANTS, limits).evaluate({})
+    # Expressions within the limits are unaffected
+    assert Expression("2**100 + factorial(10)", FUNCTIONS, CONSTANTS, limits).evaluate({}) \
+        == 2**100 + math.factorial(10)
+
+
+def test_depth_limit():
+    with pytest.raises(LimitExceeded, match="nested"):
+        parse("(" * 11 + "1" + ")" * 11, max_depth=10)
+    with pytest.raises(LimitExceeded, match="nested"):
+        parse("-" * 11 + "1", max_depth=10)
+    assert parse("(" * 9 + "1" + ")" * 9, max_depth=10) == Number(1)
+    with pytest.raises(LimitExceeded, match="nested"):
+        parse("1**" * 10 + "1", max_depth=10)
+    assert parse("2**" * 8 + "1", max_depth=10).op == '**'
+
+
+def test_timeout():
+    expr = Expression("sqrt(x) + 1", FUNCTIONS, CONSTANTS, Limits(timeout=-1))
+    with pytest.raises(LimitExceeded, match="longer than"):
+        expr.evaluate({'x': 4})
+    assert Expression("x + 1", FUNCTIONS, CONSTANTS, Limits(timeout=10)).evaluate({'x': 1}) == 2
@@ -0,0 +1,102 @@
+import random
+from decimal import Decimal
+from fractions import Fraction
+
+import numpy as np
+import pytest
+from scicalc.calculator import Calculator
+from scicalc.formatting import compile_format
+
+
+@pytest.mark.parametrize("spec, value, expected", [
+    ('auto', 4.0, '4'),
+    ('auto', -0.0, '0'),
+    ('auto', 2.5, '2.5'),
+    ('auto', 1e20, '1e+20'),
+    ('auto,grouping', 1234567.5, '1,234,567.5'),
+    ('fixed:2', 4, '4.00'),
+    ('fixed:0', 2.5, '2'),
+    ('fixed:2,grouping', -1234567.891, '-1,234,567.89'),
+    ('scientific:3', 123456, '1.235e5'),
+    ('scientific:2', -0.000123, '-1.23e-4'),
+    ('engineering:4', 123456, '123.5e3'),
+    ('engineering:3', 0.0001234, '123e-6'),
+    ('engineering:1', 50000, '50e3'),
+    ('significant:4', 4.0, '4'),
+    ('significant:4', 1234567, '1235000'),
+    ('significant:4', 0.000123456, '0.0001235'),
+    ('significant:3', 9.996, '10'),
+    ('significant:3', 1e20, '1e20'),
+    ('significant:3', -1.5e-9, '-1.5e-9'),
+    ('significant:3', -0.0001, '-0.0001'),
+    ('significant:6,grouping', 1234567.8, '1,234,570'),
+    ('significant', float('inf'), 'inf'),
+    ('fixed:2,speech', -1.5, 'minus 1 point 50'),
+    ('scientific:1,speech', 25000, '2 point 5 times ten to the power 4'),
+    ('significant:3,speech', float('nan'), 'not a number'),
+    ('auto,speech', -1.5e-07, 'minus 1 point 5 times ten to the power minus 7'),
+    ('auto,speech', 1e20, '1 times ten to the power 20'),
+])
+def test_formats(spec, value, expected):
+    assert compile_format(spec)(value) == expected
+
+
+def test_other_number_types():
+    assert compile_format('significant:12')(Fraction(1, 3)) == '0.333333333333'
+    assert compile_format('fixed:2,grouping')(10 ** 24) == '1,000,000,000,000,000,000,000,000.00'
+    assert compile_format('scientific:2')(Decimal('1e500')) == '1.00e500'
+    assert compile_format('auto')(Fraction(1, 3)) == '1/3'
+    assert compile_format('auto,speech')(Fraction(1, 3)) == '1 over 3'
+
+
+def test_plus_minus_pairs():
+    assert compile_format('auto')([2, -2]) == '[2, -2]'
+    assert compile_format('fixed:1')([2, -2]) == '±2.0'
+    assert compile_format('significant,speech')([1.5, -1.5]) == 'plus or minus 1 point 5'
+
+
+def test_specs_are_compiled_once():
+    assert compile_format('fixed:2,grouping') is compile_format('fixed:2,grouping')
+    assert compile_format('SIGNIFICANT').spec == 'significant:10'
+    assert compile_format('fixed , speech , grouping').spec == 'fixed:2,grouping,speech'
+
+
+@pytest.mark.parametrize("spec", ['bogus', 'fixed:x', 'fixed:-1', 'significant:0', 'significant:16',
+                                  'auto:3', 'fixed,loud'])
+def test_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        compile_format(spec)
+
+
+@pytest.mark.parametrize("spec", ['auto,grouping', 'fixed:0', 'fixed:3,grouping', 'scientific:5',
+                                  'engineering:1', 'engineering:7', 'significant:1', 'significant:15,grouping',
+                                  'significant:4,speech', 'auto,speech'])
+def test_arrays_format_like_scalars(spec):
+    rng = random.Random(spec)
+    values = [0.0, -0.0, 1.0, 9.996, 999.9996, 1e15, 1e16, -1e-20, float('inf'), float('-inf'), float('nan')]
+    values += [rng.choice([-1, 1]) * 10 ** rng.uniform(-12, 22) * rng.random() for _ in range(500)]
+    number_format = compile_format(spec)
+    formatted = number_format.format_array(np.array(values).reshape(-1, 1))
+    assert formatted.shape == (len(values), 1)
+    assert formatted.ravel().tolist() == [number_format(value) for value in values]
+    assert number_format.format_array([]).shape == (0,)
+
+
+@pytest.mark.parametrize("digits", range(1, 16))
+@pytest.mark.parametrize("grouping", [False, True])
+def test_large_significant_arrays_format_like_scalars(digits, grouping):
+    # Values that round to the left of the point must keep exactly their significant digits
+    rng = random.Random(digits)
+    values = [-8014911915751980.0, 999999999999999.9, 1e15 - 1]
+    values += [rng.choice([-1, 1]) * 10 ** rng.uniform(digits - 1, 16) for _ in range(300)]
+    number_format = compile_format(f'significant:{digits}' + (',grouping' if grouping else ''))
+    assert number_format.format_array(values).tolist() == [number_format(value) for value in values]
+
+
+def test_calculator_number_format():
+    calc = Calculator(number_format='significant:7,grouping')
+    assert calc.format_output(calc.evaluate("sqrt(16)"), "full") == "sqrt(16) = 4"
+    assert calc.format_output(calc.evaluate("2^20")) == "1,048,576"
+    assert calc.format_many(calc.evaluate_many("x*1000", [1.5, 2])).tolist() == ['1,500', '2,000']
+    # Rounding to decimal places still happens first
+    assert Calculator(decimal_places=1, number_format='fixed:3').format_output(2 / 3) == '0.700'
@@ -0,0 +1,99 @@
+import io
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+
+import pytest
+from scicalc.calculator import Calculator
+from scicalc import gridset
+
+RESOURCES = Path(__file__).resolve().parents[2] / 'resources'
+
+
+def build(**kwargs):
+    buffer = io.BytesIO()
+    gridset.write_gridset(buffer, **kwargs)
+    return buffer.getvalue()
+
+
+def grid_roots(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return {info.filename: ET.fromstring(archive.read(info))
+                for info in archive.infolist() if info.filename.startswith('Grids/')}
+
+
+def inserted_texts(root):
+    return [parameter.find('r').text for parameter in root.iter('Parameter')
+            if parameter.get('Key') == 'text']
+
+
+def test_builds_are_identical():
+    assert build() == build()
+
+
+def test_shipped_gridset_is_up_to_date():
+    # Regenerate with the command in the README if this fails
+    shipped = (RESOURCES / 'ScientificCalc.gridset').read_bytes()
+    assert shipped == build(thumbnail=str(RESOURCES / 'logo.png'))
+
+
+def test_every_function_and_symbol_has_a_button():
+    roots = grid_roots(build())
+    assert set(roots) == {'Grids/Start/grid.xml', 'Grids/Functions/grid.xml',
+                          'Grids/Symbols/grid.xml', 'Grids/EnterText/grid.xml'}
+    functions = inserted_texts(roots['Grids/Functions/grid.xml'])
+    assert {f'{name}(' for name in Calculator.FUNCTIONS} <= set(functions)
+    symbols = inserted_texts(roots['Grids/Symbols/grid.xml'])
+    assert {'√', 'π', '±', '°', 'e'} <= set(symbols)
+    assert '×' not in symbols
+
+
+def test_grids_open_the_calculator_and_cells_do_not_overlap():
+    for name, root in grid_roots(build()).items():
+        assert root.find("Commands/Command/Parameter[@Key='url']").text == gridset.URL_PLACEHOLDER
+        columns = len(root.findall('ColumnDefinitions/ColumnDefinition'))
+        rows = len(root.findall('RowDefinitions/RowDefinition'))
+        covered = set()
+        for cell in root.iter('Cell'):
+            x, y = int(cell.get('X', 0)), int(cell.get('Y', 0))
+            for dx in range(int(cell.get('ColumnSpan', 1))):
+                for dy in range(int(cell.get('RowSpan', 1))):
+                    assert (x + dx, y + dy) not in covered, (name, x + dx, y + dy)
+                    assert x + dx < columns and y + dy < rows, (name, x + dx, y + dy)
+                    covered.add((x + dx, y + dy))
+
+
+def test_start_keys_evaluate():
+    calc = Calculator()
+    for text in inserted_texts(grid_roots(build())['Grids/Start/grid.xml']):
+        if text == 'rand(':
+            calc.calculate('rand()')
+        elif text.endswith('('):
+            calc.calculate(text + '1)')
+        else:
+            # Other keys are typed between, after or before numbers
+            assert any(evaluates(calc, context.format(text)) for context in ('2{}3', '2{}', '{}2', '(2{}')), text
+
+
+def evaluates(calc, expression):
+    try:
+        calc.calculate(expression)
+    except ValueError:
+        return False
+    return True
+
+
+def test_rejects_tables_the_calculator_does_not_know():
+    class Drifted(Calculator):
+        FUNCTION_ALIASES = dict(Calculator.FUNCTION_ALIASES, Sec='sec')
+
+    with pytest.raises(ValueError, match="'Sec'"):
+        build(calculator=Drifted)
+
+
+def test_thumbnail(tmp_path):
+    thumbnail = tmp_path / 'thumb.png'
+    thumbnail.write_bytes(b'\x89PNG fake')
+    with zipfile.ZipFile(io.BytesIO(build(thumbnail=str(thumbnail)))) as archive:
+        assert archive.read('Settings0/thumbnail.png') == b'\x89PNG fake'
+        assert b'thumbnail.png' in archive.read('FileMap.xml')
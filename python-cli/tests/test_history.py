@@ -0,0 +1,101 @@
+import itertools
+import json
+
+import pytest
+from scicalc.calculator import Calculator
+from scicalc.history import History
+
+
+def make_history(maxlen=5, path=None):
+    ticks = itertools.count()
+    history = History(maxlen, path, clock=lambda: float(next(ticks)))
+    assert history.wait_loaded(5)
+    return history
+
+
+def test_keeps_newest_entries():
+    history = make_history(maxlen=3)
+    for n in range(5):
+        history.add(f'{n}+1', f'{n}+1', n + 1)
+    assert len(history) == 3
+    assert [entry.expression for entry in history] == ['2+1', '3+1', '4+1']
+    assert [entry.result for entry in history.recent(2)] == [5, 4]
+
+
+def test_search_newest_first():
+    history = make_history(maxlen=4)
+    for expression in ['sin(1)', 'SQRT(4)', 'sin(2)', 'cos(sin(3))', 'sin(4)']:
+        history.add(expression, expression, 0)
+    # sin(1) has been evicted from the prefix index as well as the buffer
+    assert [e.expression for e in history.search('sin', prefix=True)] == ['sin(4)', 'sin(2)']
+    assert [e.expression for e in history.search('sin')] == ['sin(4)', 'cos(sin(3))', 'sin(2)']
+    assert [e.expression for e in history.search('SIN', limit=1)] == ['sin(4)']
+    assert [e.expression for e in history.search('sq', prefix=True)] == ['SQRT(4)']
+    assert history.search('tan') == []
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / 'history.jsonl')
+    history = make_history(path=path)
+    history.add('1/3', '1/3', 0.3333)
+    history.add('pm(1)', 'pm(1)', [1, -1])
+    history.close()
+
+    reloaded = make_history(path=path)
+    assert [(e.expression, e.result) for e in reloaded] == [('1/3', 0.3333), ('pm(1)', '[1, -1]')]
+
+
+def test_skips_damaged_lines(tmp_path):
+    path = tmp_path / 'history.jsonl'
+    line = json.dumps({'expression': '2+2', 'normalized': '2+2', 'result': 4, 'timestamp': 0})
+    path.write_text(line + '\n{"expression": "3+\n')
+    history = make_history(path=str(path))
+    assert [e.expression for e in history] == ['2+2']
+
+
+def test_compacts_long_files(tmp_path):
+    path = tmp_path / 'history.jsonl'
+    lines = [json.dumps({'expression': str(n), 'normalized': str(n), 'result': n, 'timestamp': n})
+             for n in range(20)]
+    path.write_text('\n'.join(lines) + '\n')
+    history = make_history(maxlen=5, path=str(path))
+    assert [e.result for e in history] == [15, 16, 17, 18, 19]
+    assert len(path.read_text().splitlines()) == 5
+
+
+def test_entries_added_while_loading_are_kept(tmp_path):
+    path = tmp_path / 'history.jsonl'
+    path.write_text(json.dumps({'expression': 'old', 'normalized': 'old', 'result': 1, 'timestamp': 0}) + '\n')
+    history = History(5, str(path))
+    history.add('new', 'new', 2)
+    assert history.wait_loaded(5)
+    assert [e.expression for e in history] == ['old', 'new']
+    history.close()
+    assert [json.loads(line)['expression'] for line in path.read_text().splitlines()] == ['old', 'new']
+
+
+def test_clear(tmp_path):
+    path = tmp_path / 'history.jsonl'
+    history = make_history(path=str(path))
+    history.add('2+2', '2+2', 4)
+    history.clear()
+    assert len(history) == 0
+    assert history.search('2', prefix=True) == []
+    assert path.read_text() == ''
+
+
+def test_rejects_empty_history():
+    with pytest.raises(ValueError):
+        History(0)
+
+
+def test_calculator_records_history():
+    history = make_history()
+    calc = Calculator(history=history)
+    calc.evaluate('2 × 3')
+    calc.evaluate('2 × 3 = x + 1')
+    with pytest.raises(ValueError):
+        calc.evaluate('1/0')
+    entries = history.recent()
+    assert [(e.expression, e.result) for e in entries] == [('2 × 3 = x + 1', 7), ('2 × 3', 6)]
+    assert entries[1].normalized == '2*3'
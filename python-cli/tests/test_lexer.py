@@ -0,0 +1,47 @@
+import pytest
+from scicalc.lexer import NAME, NUMBER, OP, Token, normalize, render, tokenize
+
+
+def clean(expression, **kwargs):
+    return render(normalize(tokenize(expression), **kwargs))
+
+
+def test_tokenize_numbers_and_operators():
+    assert tokenize("2×3.5") == [Token(NUMBER, '2'), Token(OP, '*'), Token(NUMBER, '3.5')]
+    assert tokenize("2EE3") == [Token(NUMBER, '2e3')]
+    assert tokenize("2e") == [Token(NUMBER, '2'), Token(NAME, 'e')]
+
+
+def test_tokenize_aliases_and_inverse_functions():
+    aliases = {'SIN': 'sin'}
+    assert tokenize("SIN⁻¹", aliases) == [Token(NAME, 'asin')]
+    assert tokenize("log2") == [Token(NAME, 'log2')]
+    assert tokenize("x2") == [Token(NAME, 'x'), Token(NUMBER, '2')]
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("2x3", "2*x*3"),
+    ("2π", "2*pi"),
+    ("2(3+4)", "2*(3+4)"),
+    ("(2)(3)", "(2)(3)"),
+    ("sin(cos(30", "sin(cos(30))"),
+    ("2³", "2**3"),
+    ("2⁻¹", "2**-1"),
+    ("5⁻2", "5-2"),
+    ("√16", "sqrt(16)"),
+    ("√√16", "sqrt(sqrt(16))"),
+    ("∛(x+1", "cbrt(x+1)"),
+    ("3ʸ√27", "nthroot(27, 3)"),
+    ("log₂(8)", "logbase(8, 2)"),
+    ("90°", "rad(90)"),
+    ("5″", "prime2(5)"),
+    ("±5+1", "pm(5+1)"),
+    ("50% + 50%", "50%+50%"),
+])
+def test_normalize(expression, expected):
+    assert clean(expression) == expected
+
+
+def test_normalize_group_multiplication():
+    assert clean("(2)(3)", group_multiplication=True) == "(2)*(3)"
+    assert clean("(2)3", group_multiplication=True) == "(2)*3"
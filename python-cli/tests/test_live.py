@@ -0,0 +1,109 @@
+import pytest
+from scicalc.calculator import Calculator
+from scicalc.evaluator import LimitExceeded, Limits
+from scicalc.lexer import retokenize, tokenize_with_offsets
+from scicalc.live import LiveSession, StaleRequest
+
+
+@pytest.mark.parametrize('old,new', [
+    ('2EE', '2EE3'),
+    ('log1', 'log10'),
+    ('sin', 'sin⁻¹(0.5)'),
+    ('2⁻', '2⁻¹'),
+    ('12+34', '12-34'),
+    ('√16 + 3', '√16 + 3²'),
+    ('sin(30°)', ''),
+])
+def test_retokenize_matches_tokenize(old, new):
+    tokens, offsets = tokenize_with_offsets(old)
+    assert retokenize(old, new, tokens, offsets) == tokenize_with_offsets(new)
+
+
+def test_typing_gives_calculate_results():
+    calc = Calculator()
+    live = LiveSession(calc)
+    text = ''
+    for ch in '√16 + 2³ × sin(30°)':
+        text += ch
+        try:
+            expected = calc.calculate(text)
+        except ValueError:
+            with pytest.raises(ValueError):
+                live.evaluate(text)
+        else:
+            assert live.evaluate(text) == expected
+
+
+def test_reuses_unchanged_subexpressions():
+    calls = []
+    calc = Calculator()
+    calc._backend.functions = dict(calc._backend.functions,
+                                   slow=lambda value: calls.append(value) or value * 2)
+    live = LiveSession(calc)
+    assert live.evaluate('slow(3) + 1') == 7
+    assert live.evaluate('slow(3) + 10') == 16
+    assert live.evaluate('x + slow(3)') == 6
+    assert calls == [3]
+    assert live.cache_info().hits == 2
+
+
+def test_subexpressions_using_x_are_evaluated_again():
+    calc = Calculator()
+    live = LiveSession(calc)
+    assert live.evaluate('sqrt(x + 4)') == 2
+    calc.evaluate('12')
+    assert live.evaluate('sqrt(x + 4)') == 4
+    # Live results don't change the last result
+    assert calc._last_result == 12
+
+
+def test_errors_and_limits():
+    live = LiveSession(Calculator(limits=Limits(max_factorial=10)))
+    with pytest.raises(ValueError, match='division by zero'):
+        live.evaluate('1/0')
+    with pytest.raises(ValueError, match='division by zero'):
+        live.evaluate('1/0')
+    with pytest.raises(LimitExceeded):
+        live.evaluate('factorial(20)')
+
+
+def test_stale_requests_are_dropped():
+    live = LiveSession(Calculator())
+    assert live.evaluate('1+1', seq=2) == 2
+    with pytest.raises(StaleRequest):
+        live.evaluate('1+', seq=1)
+    assert live.evaluate('1+1', seq=2) == 2
+
+
+def test_sequence_numbers_are_per_page():
+    live = LiveSession(Calculator())
+    for seq in range(1, 6):
+        assert live.evaluate('2*3', seq=seq, page='first') == 6
+    # A reloaded page (or a second tab) counts from the start again
+    assert live.evaluate('2*4', seq=1, page='reloaded') == 8
+    with pytest.raises(StaleRequest):
+        live.evaluate('2*', seq=4, page='first')
+    assert live.evaluate('2*5', seq=2, page='reloaded') == 10
+
+
+def test_other_numeric_types():
+    live = LiveSession(Calculator(numeric='fraction'))
+    assert str(live.evaluate('1/3 + 1/6')) == '1/2'
+
+
+def test_definitions_are_previewed_not_stored():
+    calc = Calculator()
+    calc.evaluate("a = 3")
+    calc.evaluate("f(t) = t + a")
+    session = calc.live()
+    assert session.evaluate("f(1)") == 4
+    assert str(session.evaluate("g(t) = f(t) × 2")) == "g(t) = f(t)*2"
+    assert session.evaluate("b = f(2)") == 5
+    assert set(calc.definitions()) == {'a', 'f'}
+    # Calls to user functions aren't remembered as constants
+    calc.evaluate("f(t) = t")
+    assert session.evaluate("f(1)") == 1
+    # Previews reject recursive definitions as Calculator does
+    calc.evaluate("g(t) = f(t) × 2")
+    with pytest.raises(ValueError, match="through g"):
+        session.evaluate("f(t) = g(t)")
@@ -0,0 +1,65 @@
+import pytest
+from scicalc.calculator import Calculator
+from scicalc.metrics import Metrics, error_category
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        # Every stage appears to take half a second
+        self.now += 0.5
+        return self.now
+
+
+def test_stage_timings():
+    metrics = Metrics(clock=FakeClock())
+    calc = Calculator(metrics=metrics)
+    calc.format_output(calc.evaluate("2+2"))
+    calc.evaluate("2+2")
+
+    stages = metrics.snapshot()['stages']
+    # The second evaluation is cached, so only eval runs twice
+    assert stages['normalize'] == {'count': 1, 'total_seconds': 0.5, 'mean_seconds': 0.5}
+    assert stages['compile']['count'] == 1
+    assert stages['eval']['count'] == 2
+    assert stages['format_output']['count'] == 1
+
+
+@pytest.mark.parametrize("expression, category", [
+    ("1/0", 'division_by_zero'),
+    ("2+*3", 'syntax'),
+    ("sqrt(-1)", 'domain'),
+    ("foo(2)", 'unknown_name'),
+    ("9^9^9", 'limit'),
+])
+def test_error_categories(expression, category):
+    calc = Calculator()
+    with calc.instrument() as metrics:
+        with pytest.raises(ValueError):
+            calc.calculate(expression)
+    assert metrics.snapshot()['errors'] == {category: 1}
+    # Nothing is recorded outside the with block
+    with pytest.raises(ValueError):
+        calc.calculate(expression)
+    assert metrics.snapshot()['errors'] == {category: 1}
+
+
+def test_error_category_fallback():
+    assert error_category(OverflowError()) == 'overflow'
+    assert error_category(TypeError()) == 'other'
+
+
+def test_prometheus_format():
+    metrics = Metrics()
+    metrics.record('eval', 0.25)
+    metrics.record('eval', 0.5)
+    metrics.record_error('syntax')
+    text = metrics.to_prometheus()
+    assert '# TYPE scicalc_stage_duration_seconds summary' in text
+    assert 'scicalc_stage_duration_seconds_sum{stage="eval"} 0.75\n' in text
+    assert 'scicalc_stage_duration_seconds_count{stage="eval"} 2\n' in text
+    assert 'scicalc_errors_total{category="syntax"} 1\n' in text
+    metrics.reset()
+    assert metrics.snapshot() == {'stages': {}, 'errors': {}}
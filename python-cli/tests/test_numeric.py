@@ -0,0 +1,74 @@
+from decimal import Decimal
+from fractions import Fraction
+import pytest
+from scicalc.calculator import Calculator
+
+
+def test_float_is_the_default():
+    assert Calculator().calculate("0.1+0.2") == 0.1 + 0.2
+
+
+def test_decimal_backend():
+    calc = Calculator(numeric='decimal')
+    assert calc.calculate("0.1+0.2") == Decimal("0.3")
+    assert calc.calculate("200+10%") == Decimal("220")
+    assert calc.calculate("√16") == 4
+    assert calc.calculate("5!") == 120
+    # Functions with no Decimal form still give Decimal results
+    assert isinstance(calc.calculate("sin(30)"), Decimal)
+    assert calc.format_output(calc.evaluate("±2"), "answer") == "[2, -2]"
+
+
+def test_decimal_precision():
+    calc = Calculator(numeric='decimal', precision=40)
+    assert str(calc.calculate("1/7")) == "0.1428571428571428571428571428571428571429"
+    assert str(calc.calculate("π")).startswith("3.141592653589793238462643383279502884197")
+
+
+def test_fraction_backend():
+    calc = Calculator(numeric='fraction')
+    assert calc.calculate("0.1+0.2") == Fraction(3, 10)
+    assert calc.calculate("1/3*3") == 1
+    assert calc.calculate("(2/3)^2") == Fraction(4, 9)
+    assert calc.calculate("√(9/4)") == Fraction(3, 2)
+    assert calc.format_output(calc.evaluate("1/3"), "answer") == "1/3"
+    # x carries the exact value
+    assert calc.evaluate("x*6") == 2
+
+
+def test_fraction_inexact_results_are_rounded_floats():
+    calc = Calculator(numeric='fraction', decimal_places=4)
+    assert calc.calculate("sqrt(2)") == 1.4142
+    assert calc.calculate("sin(90)") == 1.0
+    assert calc.calculate("π*2") == 6.2832
+    assert calc.calculate("2^0.5") == 1.4142
+    assert calc.format_output(calc.evaluate("ln(3)"), "answer") == "1.0986"
+    # Exact results are untouched by decimal places
+    assert calc.calculate("1/3") == Fraction(1, 3)
+    assert calc.calculate("√(9/4)") == Fraction(3, 2)
+
+
+@pytest.mark.parametrize("numeric", ['decimal', 'fraction'])
+@pytest.mark.parametrize("expression, message", [
+    ("1/0", "division by zero"),
+    ("sqrt(-1)", "math domain error"),
+    ("ln(0)", "math domain error"),
+])
+def test_errors_match_float(numeric, expression, message):
+    with pytest.raises(ValueError, match=message):
+        Calculator(numeric=numeric).calculate(expression)
+
+
+def test_fraction_limits():
+    with pytest.raises(ValueError, match="too large"):
+        Calculator(numeric='fraction').calculate("(3/2)^5000")
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError, match="Unknown numeric type"):
+        Calculator(numeric='complex')
+
+
+def test_evaluate_many_uses_floats():
+    calc = Calculator(numeric='decimal')
+    assert list(calc.evaluate_many("x/2", [1, 2])) == [0.5, 1.0]
@@ -0,0 +1,42 @@
+from scicalc.calculator import Calculator
+from scicalc.sessions import SessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sessions_are_isolated():
+    store = SessionStore(Calculator)
+    first, calc_a, created = store.get(None)
+    assert created
+    second, calc_b, _ = store.get(None)
+    assert first != second and calc_a is not calc_b
+    
+    calc_a.evaluate("5")
+    assert store.get(first)[1]._last_result == 5
+    assert store.get(second)[1]._last_result == 0
+    assert store.get(first)[2] is False
+
+
+def test_idle_sessions_are_evicted():
+    clock = FakeClock()
+    store = SessionStore(Calculator, idle_timeout=60, clock=clock)
+    session_id, calc, _ = store.get(None)
+    clock.now = 30
+    assert store.get(session_id)[1] is calc
+    clock.now = 100
+    new_id, new_calc, created = store.get(session_id)
+    assert created and new_id != session_id and new_calc is not calc
+    assert session_id not in store
+
+
+def test_store_is_bounded():
+    store = SessionStore(Calculator, max_sessions=2)
+    ids = [store.get(None)[0] for _ in range(3)]
+    assert len(store) == 2
+    assert ids[0] not in store and ids[2] in store
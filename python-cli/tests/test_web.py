@@ -0,0 +1,144 @@
+import pytest
+from scicalc import web
+
+
+@pytest.fixture
+def client():
+    return web.app.test_client()
+
+
+def test_calculate(client):
+    response = client.post('/calculate', json={'expression': '2+2'})
+    assert response.json == {'success': True, 'result': '4', 'expression': '2+2'}
+    assert web.SESSION_COOKIE in response.headers.get('Set-Cookie', '')
+
+
+def test_session_cookie_is_refreshed(client):
+    first = client.post('/calculate', json={'expression': '5'}).headers['Set-Cookie']
+    # An existing session's cookie is sent again, restarting its idle timeout
+    again = client.post('/calculate', json={'expression': 'x'})
+    assert again.json['result'] == '5'
+    assert again.headers['Set-Cookie'].split(';')[0] == first.split(';')[0]
+    assert f'Max-Age={web.SESSION_IDLE_TIMEOUT}' in again.headers['Set-Cookie']
+
+
+def test_only_calculator_routes_create_sessions(client):
+    before = len(web.sessions)
+    for path in ['/metrics', '/']:
+        response = client.get(path)
+        assert web.SESSION_COOKIE not in response.headers.get('Set-Cookie', '')
+    assert len(web.sessions) == before
+
+
+def test_sessions_do_not_share_state(client):
+    other = web.app.test_client()
+    client.post('/calculate', json={'expression': '5'})
+    client.post('/decimals', json={'places': 2})
+    assert client.post('/calculate', json={'expression': 'x*2'}).json['result'] == '10'
+    assert other.post('/calculate', json={'expression': 'x*2'}).json['result'] == '0'
+    assert other.post('/calculate', json={'expression': '22/7'}).json['result'] == '3.142857142857143'
+
+
+def test_calculate_live_after_reload(client):
+    for seq in range(1, 6):
+        client.post('/calculate/live', json={'expression': '3', 'seq': seq, 'page': 'before'})
+    response = client.post('/calculate/live', json={'expression': '3*3', 'seq': 1, 'page': 'after'})
+    assert response.json == {'success': True, 'result': '9', 'expression': '3*3', 'seq': 1}
+
+
+def test_calculate_batch(client):
+    response = client.post('/calculate/batch', json={
+        'expressions': ['22/7', 'x*2', 'invalid'],
+        'decimal_places': 2,
+        'return_format': 'full',
+    })
+    results = response.json['results']
+    assert [r['success'] for r in results] == [True, True, False]
+    assert results[0]['result'] == '22/7 = 3.14'
+    assert results[1]['result'] == 'x*2 = 6.28'
+    
+    # The decimal places override only applies to the batch
+    assert client.post('/calculate', json={'expression': '22/7'}).json['result'] == '3.142857142857143'
+
+
+def test_calculate_batch_items_run_in_order(client):
+    response = client.post('/calculate/batch', json={'expressions': ['3', 'x+1', '1/0', 'x*10', '']})
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [r['expression'] for r in results] == ['3', 'x+1', '1/0', 'x*10', '']
+    # A failed item reports its own error and leaves x as it was
+    assert [r.get('result') for r in results[:2]] + [results[3]['result']] == ['3', '4', '40']
+    assert results[2]['success'] is False and results[2]['error']
+    assert results[4]['success'] is False
+    assert client.post('/calculate/batch', json={'expressions': []}).json == {'success': True, 'results': []}
+
+
+def test_calculate_batch_size_limit(client, monkeypatch):
+    monkeypatch.setattr(web, 'MAX_BATCH_SIZE', 3)
+    assert len(client.post('/calculate/batch', json={'expressions': ['1'] * 3}).json['results']) == 3
+    response = client.post('/calculate/batch', json={'expressions': ['1'] * 4})
+    assert response.status_code == 400
+    assert response.json == {'success': False, 'error': "At most 3 expressions per batch"}
+
+
+@pytest.mark.parametrize("payload", [
+    {},
+    {'expressions': '2+2'},
+    {'expressions': ['2+2', 4]},
+    {'expressions': ['2+2'], 'return_format': 'bogus'},
+    {'expressions': ['2+2'], 'decimal_places': 'two'},
+    {'expressions': ['2+2'], 'format': 'fixed:x'},
+])
+def test_calculate_batch_rejects_bad_requests(client, payload):
+    response = client.post('/calculate/batch', json=payload)
+    assert response.status_code == 400
+    assert response.json['success'] is False
+
+
+def test_number_format(client):
+    assert client.post('/format', json={'format': 'bogus'}).status_code == 400
+    assert client.post('/format', json={'format': 'fixed:2,grouping'}).json == {
+        'success': True, 'format': 'fixed:2,grouping'}
+    assert client.post('/calculate', json={'expression': '1000*3'}).json['result'] == '3,000.00'
+    response = client.post('/calculate/batch', json={'expressions': ['1/7'], 'format': 'engineering:2'})
+    assert response.json['results'][0]['result'] == '140e-3'
+    assert client.post('/calculate', json={'expression': '1/7'}).json['result'] == '0.14'
+
+
+def test_calculate_reports_limits(client):
+    data = client.post('/calculate', json={'expression': '9^9^9'}).get_json()
+    assert data['success'] is False
+    assert 'Exponent is too large' in data['error']
+
+
+def test_metrics(client):
+    client.post('/calculate', json={'expression': '1/0'})
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    assert 'scicalc_stage_duration_seconds_count{stage="eval"}' in response.text
+    assert 'scicalc_errors_total{category="division_by_zero"}' in response.text
+
+
+def test_history(client):
+    for expression in ['sqrt(16)', '2+2', 'sqrt(9)']:
+        client.post('/calculate', json={'expression': expression})
+    history = client.get('/history').json['history']
+    assert [(item['expression'], item['result']) for item in history] == [
+        ('sqrt(9)', '3'), ('2+2', '4'), ('sqrt(16)', '4')]
+    matches = client.get('/history?q=SQRT&prefix=true&limit=1').json['history']
+    assert [item['expression'] for item in matches] == ['sqrt(9)']
+    assert web.app.test_client().get('/history').json['history'] == []
+    assert client.get('/history?limit=many').status_code == 400
+
+
+def test_calculate_live(client):
+    client.post('/calculate', json={'expression': '5'})
+    response = client.post('/calculate/live', json={'expression': 'x*2', 'seq': 2})
+    assert response.json == {'success': True, 'result': '10', 'expression': 'x*2', 'seq': 2}
+    assert client.post('/calculate/live', json={'expression': 'x*', 'seq': 1}).json == {
+        'success': False, 'stale': True, 'seq': 1}
+    assert client.post('/calculate/live', json={'expression': 'x*', 'seq': 3}).json['success'] is False
+    assert client.post('/calculate/live', json={'expression': 'x', 'seq': 'a'}).status_code == 400
+    assert client.post('/calculate/live', json={'expression': 'x', 'seq': 1, 'page': 7}).status_code == 400
+    # Previews don't change x
+    assert client.post('/calculate', json={'expression': 'x'}).json['result'] == '5'
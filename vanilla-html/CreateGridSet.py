@@ -1,8 +1,18 @@
-import zipfile
+import argparse
+import copy
+import csv
+import hashlib
+import io
 import os
-import re
-import shutil
+import struct
+import sys
+import tempfile
+import time
 import traceback
+import zipfile
+import zlib
+from contextlib import contextmanager
+from xml.sax.saxutils import escape as xml_escape
 
 # Consistent log file path in the desired directory
 log_path = os.path.join(
@@ -50,58 +60,348 @@ def create_folder_shortcut(target_folder, shortcut_name):
         write_log(traceback.format_exc())
 
 
+# Grid 3 command parameter that the installer points at the local calculator
+URL_PLACEHOLDER = b"%FILEPATHTOREPLACE%"
+URL_PARAMETER = '<Parameter Key="url">{}</Parameter>'
+
+# Size of the local file header before an entry's name and extra field
+LOCAL_HEADER_SIZE = 30
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def calculator_url(local_app_data_path):
+    """Return the file:/// URL of the HTML calculator installed under LOCALAPPDATA."""
+    calculator_path = os.path.join(
+        local_app_data_path,
+        "Ace Centre",
+        "Scientific Calculator",
+        "calculator",
+        "calcstandalone.html"
+    )
+
+    # Convert to proper file URL format
+    url = calculator_path.replace("\\", "/")  # Convert backslashes to forward slashes
+    url = url.replace(" ", "%20")  # Encode spaces
+    return f"file:///{url}"  # Add file:/// prefix
+
+
+def _copy_info(info, compress_type):
+    """Return a new ZipInfo with an entry's name, date and attributes."""
+    entry = zipfile.ZipInfo(info.filename, info.date_time)
+    entry.compress_type = compress_type
+    entry.create_system = info.create_system
+    entry.external_attr = info.external_attr
+    entry.comment = info.comment
+    return entry
+
+
+def _read_raw(zin, info):
+    """Yield an entry's compressed bytes from zin in chunks."""
+    # Find the data after the source's local header, whose extra field can
+    # differ from the one in the central directory
+    zin.fp.seek(info.header_offset)
+    header = zin.fp.read(LOCAL_HEADER_SIZE)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    zin.fp.seek(info.header_offset + LOCAL_HEADER_SIZE + name_length + extra_length)
+    remaining = info.compress_size
+    while remaining:
+        chunk = zin.fp.read(min(remaining, COPY_CHUNK_SIZE))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated entry in gridset: {info.filename}")
+        yield chunk
+        remaining -= len(chunk)
+
+
+def _write_raw(zout, entry, chunks):
+    """Add an entry whose CRC and sizes are set to zout from already-compressed chunks."""
+    # zipfile has no public API for writing precompressed data, so write the
+    # header and data directly and register the entry as ZipFile.close() expects
+    zip64 = max(entry.file_size, entry.compress_size) > zipfile.ZIP64_LIMIT
+    zout.fp.seek(zout.start_dir)
+    entry.header_offset = zout.fp.tell()
+    zout.fp.write(entry.FileHeader(zip64))
+    for chunk in chunks:
+        zout.fp.write(chunk)
+    zout.start_dir = zout.fp.tell()
+    zout.filelist.append(entry)
+    zout.NameToInfo[entry.filename] = entry
+    zout._didModify = True
+
+
+def _copy_raw(zin, info, zout):
+    """Copy an entry's compressed bytes from zin to zout without recompressing them."""
+    entry = _copy_info(info, info.compress_type)
+    entry.CRC = info.CRC
+    entry.compress_size = info.compress_size
+    entry.file_size = info.file_size
+    _write_raw(zout, entry, _read_raw(zin, info))
+
+
+@contextmanager
+def _replacing(destination_path):
+    """Yield a file that replaces destination_path when the with block succeeds."""
+    destination_dir = os.path.dirname(os.path.abspath(destination_path))
+    os.makedirs(destination_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix=".gridset", dir=destination_dir)
+    try:
+        with os.fdopen(fd, "wb") as out_file:
+            yield out_file
+        os.replace(temp_path, destination_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _url_parameters(url):
+    """Return the placeholder URL parameter and its replacement pointing at url, as bytes."""
+    placeholder = URL_PARAMETER.format(URL_PLACEHOLDER.decode("ascii")).encode("utf-8")
+    return placeholder, URL_PARAMETER.format(xml_escape(url)).encode("utf-8")
+
+
+def patch_gridset(source_path, destination_path, url):
+    """
+    Copy a gridset, pointing its calculator URL parameter at `url`.
+
+    Entries are streamed from the source zip to the destination one at a
+    time. Grid XML containing the URL placeholder is rewritten; every other
+    deflated entry is copied as-is without being recompressed. The output
+    is DEFLATE-compressed and written to a temporary file that replaces
+    `destination_path` at the end, so `source_path` may be the same file.
+
+    Nothing is shared between calls, so many gridsets can be patched at once
+    from different threads (see `patch_gridsets`).
+
+    Args:
+        source_path: Gridset containing the %FILEPATHTOREPLACE% placeholder
+        destination_path: Where to write the patched gridset
+        url: Calculator URL to put in place of the placeholder
+
+    Returns:
+        The names of the rewritten entries
+    """
+    placeholder, replacement = _url_parameters(url)
+    rewritten = []
+    with _replacing(destination_path) as out_file, \
+            zipfile.ZipFile(source_path, "r") as zin, \
+            zipfile.ZipFile(out_file, "w", zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            if info.filename.endswith(".xml"):
+                data = zin.read(info)
+                if URL_PLACEHOLDER in data:
+                    zout.writestr(_copy_info(info, zipfile.ZIP_DEFLATED),
+                                  data.replace(placeholder, replacement))
+                    rewritten.append(info.filename)
+                    continue
+            if info.compress_type == zipfile.ZIP_DEFLATED:
+                _copy_raw(zin, info, zout)
+            else:
+                # Stored (or otherwise compressed) entries are deflated
+                zout.writestr(_copy_info(info, zipfile.ZIP_DEFLATED), zin.read(info))
+    return rewritten
+
+
+def patch_gridsets(jobs, max_workers=None):
+    """
+    Patch many gridsets in parallel with `patch_gridset`.
+
+    zlib releases the GIL while compressing, so threads are enough.
+
+    Args:
+        jobs: Iterable of (source path, destination path, url)
+        max_workers: Thread count (defaults to ThreadPoolExecutor's)
+
+    Returns:
+        A list with, for each job in order, its list of rewritten entries
+        or the exception it raised
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(patch_gridset, *job) for job in jobs]
+    return [future.exception() or future.result() for future in futures]
+
+
+class GridsetTemplate:
+    """
+    A gridset read once and kept in memory, to write copies for many users.
+
+    Entries other than the grid XML holding the URL placeholder are kept as
+    DEFLATE-compressed bytes, so each copy only compresses its rewritten XML.
+    """
+
+    def __init__(self, path):
+        """
+        Raises:
+            ValueError: If no grid holds the URL placeholder, e.g. because the
+                gridset was already patched for one user
+        """
+        self.path = path
+        # (ZipInfo, compressed chunks) for fixed entries, (ZipInfo, XML) for grids to rewrite
+        self.entries = []
+        with zipfile.ZipFile(path, "r") as zin:
+            for info in zin.infolist():
+                if info.filename.endswith(".xml"):
+                    data = zin.read(info)
+                    if URL_PLACEHOLDER in data:
+                        self.entries.append((_copy_info(info, zipfile.ZIP_DEFLATED), data))
+                        continue
+                if info.compress_type == zipfile.ZIP_DEFLATED:
+                    entry = _copy_info(info, info.compress_type)
+                    entry.CRC = info.CRC
+                    entry.compress_size = info.compress_size
+                    entry.file_size = info.file_size
+                    chunks = list(_read_raw(zin, info))
+                else:
+                    # Deflate stored entries once here rather than for every copy
+                    data = zin.read(info)
+                    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+                    chunks = [compressor.compress(data) + compressor.flush()]
+                    entry = _copy_info(info, zipfile.ZIP_DEFLATED)
+                    entry.CRC = zlib.crc32(data)
+                    entry.compress_size = len(chunks[0])
+                    entry.file_size = len(data)
+                self.entries.append((entry, tuple(chunks)))
+        if not any(isinstance(content, bytes) for _, content in self.entries):
+            raise ValueError(
+                f"Template {path} has no {URL_PLACEHOLDER.decode('ascii')} URL parameter to "
+                "replace; it may already have been patched (use the gridset shipped with the installer)"
+            )
+
+    def render(self, url):
+        """Return the bytes of a copy of the gridset pointing at `url`."""
+        placeholder, replacement = _url_parameters(url)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zout:
+            for info, content in self.entries:
+                # Each copy needs its own ZipInfo, as writing sets its offset
+                entry = copy.copy(info)
+                if isinstance(content, bytes):
+                    zout.writestr(entry, content.replace(placeholder, replacement))
+                else:
+                    _write_raw(zout, entry, content)
+        return buffer.getvalue()
+
+
+def _file_matches(path, data):
+    """Return True if the file at path holds exactly `data`, comparing SHA-256 digests."""
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return False
+    return digest.digest() == hashlib.sha256(data).digest()
+
+
+def read_manifest(manifest_path):
+    """
+    Read a provisioning manifest: a CSV file with 'target' and 'url' columns.
+
+    Returns:
+        A list of (target path, calculator url)
+
+    Raises:
+        ValueError: If a column is missing or a row has an empty value
+    """
+    with open(manifest_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        missing = {"target", "url"} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"Manifest is missing column(s): {', '.join(sorted(missing))}")
+        jobs = []
+        for row in reader:
+            target, url = (row["target"] or "").strip(), (row["url"] or "").strip()
+            if not target or not url:
+                raise ValueError(f"Manifest line {reader.line_num} needs both a target and a url")
+            jobs.append((target, url))
+    return jobs
+
+
+def provision(template_path, jobs, max_workers=None):
+    """
+    Write a copy of a gridset for each (target path, calculator url) job.
+
+    The template is read once. Copies are written by a thread pool, and a
+    target that already holds exactly the copy it would get is left alone.
+
+    Returns:
+        A report dict: 'written', 'unchanged' and 'failed' counts, 'errors'
+        as (target, exception) pairs, 'bytes' written and 'seconds' taken
+
+    Raises:
+        ValueError: If the template has no URL placeholder to replace
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    start = time.perf_counter()
+    template = GridsetTemplate(template_path)
+
+    def provision_one(target, url):
+        data = template.render(url)
+        if _file_matches(target, data):
+            return 0
+        with _replacing(target) as out_file:
+            out_file.write(data)
+        return len(data)
+
+    report = {"written": 0, "unchanged": 0, "failed": 0, "errors": [], "bytes": 0}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(target, executor.submit(provision_one, target, url)) for target, url in jobs]
+        for target, future in futures:
+            error = future.exception()
+            if error is not None:
+                report["failed"] += 1
+                report["errors"].append((target, error))
+            elif future.result():
+                report["written"] += 1
+                report["bytes"] += future.result()
+            else:
+                report["unchanged"] += 1
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+
+def format_report(report):
+    """Summarize a `provision` report in one line."""
+    total = report["written"] + report["unchanged"] + report["failed"]
+    seconds = max(report["seconds"], 1e-9)
+    return (
+        f"Provisioned {total} gridsets in {report['seconds']:.2f}s "
+        f"({total / seconds:.1f} targets/s, {report['bytes'] / seconds / 1e6:.1f} MB/s written): "
+        f"{report['written']} written, {report['unchanged']} unchanged, {report['failed']} failed"
+    )
+
+
+def default_template():
+    """
+    Return the unpatched gridset shipped next to this script or executable,
+    falling back to the repository's resources folder when run from source.
+    """
+    if getattr(sys, "frozen", False):
+        base = os.path.dirname(sys.executable)
+    else:
+        base = os.path.dirname(os.path.abspath(__file__))
+    shipped = os.path.join(base, "ScientificCalc.gridset")
+    if os.path.exists(shipped):
+        return shipped
+    return os.path.join(base, os.pardir, "resources", "ScientificCalc.gridset")
+
+
 def modify_gridset(gridset_path, LocalAppPath):
     if not os.path.exists(gridset_path):
         write_log(f"Error: The gridset file does not exist: {gridset_path}")
         return
 
     try:
-        temp_dir = "temp_gridset"
-        os.makedirs(temp_dir, exist_ok=True)
-        write_log(f"Created temporary directory: {temp_dir}")
-
-        with zipfile.ZipFile(gridset_path, "r") as zip_ref:
-            zip_ref.extractall(temp_dir)
-        write_log(f"Extracted gridset: {gridset_path}")
-
-        for foldername, _, filenames in os.walk(temp_dir):
-            for filename in filenames:
-                if filename.endswith(".xml"):
-                    xml_path = os.path.join(foldername, filename)
-                    write_log(f"Processing XML file: {xml_path}")
-
-                    with open(xml_path, "r") as f:
-                        filedata = f.read()
-
-                    # Path to the HTML calculator
-                    local_app_data_path = os.environ.get("LOCALAPPDATA", "")
-                    calculator_path = os.path.join(
-                        local_app_data_path,
-                        "Ace Centre",
-                        "Scientific Calculator",
-                        "calculator",
-                        "calcstandalone.html"
-                    )
-                    
-                    # Convert to proper file URL format
-                    calculator_url = calculator_path.replace("\\", "/")  # Convert backslashes to forward slashes
-                    calculator_url = calculator_url.replace(" ", "%20")  # Encode spaces
-                    calculator_url = f"file:///{calculator_url}"  # Add file:/// prefix
-                    
-                    write_log(f"Searching for URL parameter to replace with: {calculator_url}")
-                    new_data = re.sub(
-                        r'<Parameter Key="url">%FILEPATHTOREPLACE%</Parameter>',
-                        f'<Parameter Key="url">{calculator_url}</Parameter>',
-                        filedata
-                    )
-
-                    if new_data == filedata:
-                        write_log("Warning: No replacements were made in the XML file")
-                    else:
-                        write_log("Successfully replaced URL parameter")
-
-                    with open(xml_path, "w") as f:
-                        f.write(new_data)
+        # Path to the HTML calculator
+        url = calculator_url(os.environ.get("LOCALAPPDATA", ""))
+        write_log(f"Replacing URL parameter with: {url}")
 
         # Updated path without AACSpeakHelper
         new_gridset_dir = os.path.join(
@@ -109,22 +409,13 @@ def modify_gridset(gridset_path, LocalAppPath):
         )
         new_gridset_path = os.path.join(new_gridset_dir, "ScientificCalc.gridset")
 
-        os.makedirs(new_gridset_dir, exist_ok=True)
-        write_log(f"Created new gridset directory: {new_gridset_dir}")
-
-        with zipfile.ZipFile(new_gridset_path, "w") as zipf:
-            for root, _, files in os.walk(temp_dir):
-                for file in files:
-                    zipf.write(
-                        os.path.join(root, file),
-                        os.path.relpath(os.path.join(root, file), temp_dir),
-                    )
+        rewritten = patch_gridset(gridset_path, new_gridset_path, url)
+        for name in rewritten:
+            write_log(f"Replaced URL parameter in: {name}")
+        if not rewritten:
+            write_log("Warning: No replacements were made in the gridset")
         write_log(f"Created new gridset file: {new_gridset_path}")
 
-        # Clean up
-        shutil.rmtree(temp_dir)
-        write_log(f"Removed temporary directory: {temp_dir}")
-
         # Prevent deleting the original file
         # os.remove(gridset_path)
         write_log(f"Retained original gridset file: {gridset_path}")
@@ -137,21 +428,51 @@ def modify_gridset(gridset_path, LocalAppPath):
         write_log(traceback.format_exc())
 
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Install the Scientific Calculator gridset for this user, "
+                    "or for every target in a manifest."
+    )
+    parser.add_argument("--manifest", help="CSV file with 'target' and 'url' columns")
+    parser.add_argument("--template", help="Gridset to copy (default: the installed one, or with "
+                                           "--manifest the unpatched one shipped with this script)")
+    parser.add_argument("--workers", type=int, help="Threads writing gridsets")
+    args = parser.parse_args(argv)
+
+    app_data_path = os.environ.get("APPDATA", "")
+    if args.manifest:
+        # The copy in APPDATA has already been patched for the installing user
+        template = args.template or default_template()
+        write_log(f"Provisioning from manifest: {args.manifest} with template {template}")
+        report = provision(template, read_manifest(args.manifest), args.workers)
+        for target, error in report["errors"]:
+            write_log(f"Failed to provision {target}: {error}")
+            print(f"Failed: {target}: {error}", file=sys.stderr)
+        summary = format_report(report)
+        write_log(summary)
+        print(summary)
+        return 1 if report["failed"] else 0
+
+    gridset_location = args.template or os.path.join(
+        app_data_path,
+        "Ace Centre",
+        "Scientific Calculator",
+        "ScientificCalc.gridset",
+    )
+
+    write_log(f"Gridset location: {gridset_location}")
+    modify_gridset(gridset_location, app_data_path)
+    write_log("Script completed successfully.")
+    return 0
+
+
 if __name__ == "__main__":
     try:
         write_log("Script started.")
-        app_data_path = os.environ.get("APPDATA", "")
-        gridset_location = os.path.join(
-            app_data_path,
-            "Ace Centre",
-            "Scientific Calculator",
-            "ScientificCalc.gridset",
-        )
-
-        write_log(f"Gridset location: {gridset_location}")
-        modify_gridset(gridset_location, app_data_path)
-        write_log("Script completed successfully.")
+        sys.exit(main())
 
     except Exception as e:
         write_log(f"Critical error in main execution: {e}")
-        write_log(traceback.format_exc())
\ No newline at end of file
+        write_log(traceback.format_exc())
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)